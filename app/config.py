@@ -11,9 +11,144 @@ class Settings:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # Limits of the OpenAI scheduler (app.services.llm_scheduler), per process.
+    # The defaults are the tier-1 limits for gpt-3.5-turbo; set them to the
+    # account's, divided by the number of processes that run the analyze stage.
+    OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 3500))
+    OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", 60000))
+    OPENAI_MAX_IN_FLIGHT = int(os.getenv("OPENAI_MAX_IN_FLIGHT", 32))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 6))
+    OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", 1.0))
+    # Documents of at most OPENAI_PACK_DOCUMENT_TOKENS tokens that arrive within
+    # OPENAI_PACK_WINDOW seconds of each other are analysed together, up to
+    # OPENAI_PACK_MAX_DOCUMENTS per request (0 or 1 disables packing).
+    OPENAI_PACK_DOCUMENT_TOKENS = int(os.getenv("OPENAI_PACK_DOCUMENT_TOKENS", 400))
+    OPENAI_PACK_MAX_DOCUMENTS = int(os.getenv("OPENAI_PACK_MAX_DOCUMENTS", 8))
+    OPENAI_PACK_WINDOW = float(os.getenv("OPENAI_PACK_WINDOW", 0.05))
+    # USD per 1000 tokens, for the cost estimates of a re-analysis dry run
+    OPENAI_PROMPT_PRICE_PER_1K = float(os.getenv("OPENAI_PROMPT_PRICE_PER_1K", 0.0005))
+    OPENAI_COMPLETION_PRICE_PER_1K = float(os.getenv("OPENAI_COMPLETION_PRICE_PER_1K", 0.0015))
+
+    # Where the application tables live: "supabase", or "sqlite" for the local
+    # stand-in on DATABASE_URL (tests, offline benchmarks)
+    DATA_BACKEND = os.getenv("DATA_BACKEND", "supabase")
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 40))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 30))
+
+    # Uploads are streamed to disk in chunks of this size and rejected with 413
+    # as soon as more than MAX_UPLOAD_SIZE bytes have been received.
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 250 * 1024 * 1024))
+    # POST /uploads/batch takes several files or ZIP / TAR archives in one
+    # request body of up to MAX_BATCH_UPLOAD_SIZE bytes; MAX_UPLOAD_SIZE still
+    # applies to each file. Archives may expand to MAX_ARCHIVE_EXPANDED_SIZE bytes.
+    MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", 2 * 1024 ** 3))
+    MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 5000))
+    MAX_ARCHIVE_EXPANDED_SIZE = int(os.getenv("MAX_ARCHIVE_EXPANDED_SIZE", 10 * 1024 ** 3))
+
+    # `python run.py --prod`: API worker processes, and seconds allowed for
+    # in-flight requests and jobs to finish on shutdown
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+
+    # Document processing job queue. WORKER_MODE=embedded drains it from a thread
+    # of the API process (the heavy work still happens in a process pool);
+    # WORKER_MODE=external leaves it to `python -m app.worker`.
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", str(BASE_DIR / "data" / "jobs.db"))
+    WORKER_MODE = os.getenv("WORKER_MODE", "embedded")
+    EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", 2))
+    ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", 4))
+    PERSIST_CONCURRENCY = int(os.getenv("PERSIST_CONCURRENCY", 2))
+    REPORT_CONCURRENCY = int(os.getenv("REPORT_CONCURRENCY", 1))
+    # A standalone worker (python -m app.worker) serves /metrics on this port; 0 disables it
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 0))
+    WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 0.5))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", 5))
+    # A running job whose lease is older than this is taken to be abandoned and
+    # queued again; workers renew the leases of their jobs every
+    # JOB_LEASE_RENEW_INTERVAL seconds and look for abandoned jobs as often
+    JOB_LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", 3600))
+    JOB_LEASE_RENEW_INTERVAL = float(os.getenv("JOB_LEASE_RENEW_INTERVAL", 60))
+    # Uploads are refused with 429 while this many interactive jobs are queued
+    # or running; batches while this many bulk (batch) jobs are
+    QUEUE_MAX_BACKLOG = int(os.getenv("QUEUE_MAX_BACKLOG", 500))
+    QUEUE_MAX_BULK_BACKLOG = int(os.getenv("QUEUE_MAX_BULK_BACKLOG", 20000))
+
+    # OCR fallback: pages are rendered and recognised one at a time on a pool of
+    # OCR_WORKERS threads, with at most OCR_MAX_IN_FLIGHT page images alive at once.
+    OCR_DPI = int(os.getenv("OCR_DPI", 200))
+    OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+    OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", 2 * (os.cpu_count() or 1)))
+    # A PDF page is OCR'd only if its text layer has fewer than OCR_MIN_PAGE_CHARS
+    # characters or looks like garbage (e.g. a broken font encoding).
+    OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", 20))
+    # Optional limits on the OCR work spent on one document (0 = unlimited)
+    OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", 0))
+    OCR_TIME_BUDGET = float(os.getenv("OCR_TIME_BUDGET", 0))
+
+    # Extracted text by source file hash and extractor version
+    EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", str(BASE_DIR / "data" / "extraction_cache.db"))
+
+    # Full-text search index over extracted report text
+    SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", str(BASE_DIR / "data" / "search.db"))
+    # Keyword counts per organization and month / quarter / year
+    KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", str(BASE_DIR / "data" / "keywords.db"))
+
+    # Near-duplicate detection: a document whose estimated Jaccard similarity
+    # to an analysed document of the same organization is at least
+    # NEAR_DUPLICATE_THRESHOLD reuses that analysis (0 disables). Documents of
+    # fewer than NEAR_DUPLICATE_MIN_WORDS words are always analysed.
+    NEAR_DUPLICATE_INDEX_PATH = os.getenv("NEAR_DUPLICATE_INDEX_PATH", str(BASE_DIR / "data" / "near_duplicates.db"))
+    NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.9))
+    NEAR_DUPLICATE_MIN_WORDS = int(os.getenv("NEAR_DUPLICATE_MIN_WORDS", 50))
+
+    # Processing events behind the status streams (GET /events/...): the API
+    # reads new events every EVENTS_POLL_INTERVAL seconds while clients are
+    # connected; progress events are sent at most once per EVENTS_PROGRESS_INTERVAL.
+    EVENTS_PATH = os.getenv("EVENTS_PATH", str(BASE_DIR / "data" / "events.db"))
+    EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", 0.25))
+    EVENTS_PROGRESS_INTERVAL = float(os.getenv("EVENTS_PROGRESS_INTERVAL", 1.0))
+    EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", 15))
+    EVENTS_SUBSCRIBER_QUEUE = int(os.getenv("EVENTS_SUBSCRIBER_QUEUE", 1000))
+    EVENTS_RETENTION = float(os.getenv("EVENTS_RETENTION", 24 * 3600))
+
+    # Cache of AI analysis results (whole documents and individual chunks)
+    ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", str(BASE_DIR / "data" / "analysis_cache.db"))
+    ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", 1024))
+    ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Extracted text is stored zlib-compressed in chunks of TEXT_CHUNK_CHARS
+    # characters (see app.services.text_store); range reads return at most
+    # TEXT_RANGE_MAX_CHARS characters
+    TEXT_CHUNK_CHARS = int(os.getenv("TEXT_CHUNK_CHARS", 64 * 1024))
+    TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", 3))
+    TEXT_RANGE_MAX_CHARS = int(os.getenv("TEXT_RANGE_MAX_CHARS", 1024 * 1024))
+
+    # "Related reports" index (see app.services.related_index): hashed TF-IDF
+    # vectors of RELATED_DIMENSIONS dimensions, memory-mapped next to the
+    # database at RELATED_INDEX_PATH; an analysis keyword weighs as much as a
+    # word seen exp(RELATED_KEYWORD_WEIGHT - 1) times. Documents scoring no
+    # more than RELATED_MIN_SCORE (cosine similarity) are never listed as related
+    RELATED_INDEX_PATH = os.getenv("RELATED_INDEX_PATH", str(BASE_DIR / "data" / "related_index.db"))
+    RELATED_DIMENSIONS = int(os.getenv("RELATED_DIMENSIONS", 512))
+    RELATED_KEYWORD_WEIGHT = float(os.getenv("RELATED_KEYWORD_WEIGHT", 3.0))
+    RELATED_MIN_SCORE = float(os.getenv("RELATED_MIN_SCORE", 0.0))
+
+    # In-process cache of organization responses: seconds an entry is served
+    # before the database is read again (0 disables the cache), and entries kept
+    ORGANIZATION_CACHE_TTL = float(os.getenv("ORGANIZATION_CACHE_TTL", 60))
+    ORGANIZATION_CACHE_ENTRIES = int(os.getenv("ORGANIZATION_CACHE_ENTRIES", 1024))
+
+    # Re-analysis of stored documents (python -m app.services.reanalysis): rows
+    # per batch, documents analysed at once, and where progress is checkpointed
+    REANALYSIS_BATCH_SIZE = int(os.getenv("REANALYSIS_BATCH_SIZE", 100))
+    REANALYSIS_CONCURRENCY = int(os.getenv("REANALYSIS_CONCURRENCY", 8))
+    REANALYSIS_CHECKPOINT_DIR = os.getenv("REANALYSIS_CHECKPOINT_DIR", str(BASE_DIR / "data" / "reanalysis"))
+
+    # Longer log messages are cut, so logging stays cheap however large the data it mentions
+    LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000))
     
 settings = Settings() 
-
-print("SUPABASE_URL:", settings.SUPABASE_URL)
-print("SUPABASE_SERVICE_KEY:", settings.SUPABASE_SERVICE_KEY)
-print("OPENAI_API_KEY:", settings.OPENAI_API_KEY) 
\ No newline at end of file
@@ -0,0 +1,221 @@
+import abc
+import time
+from functools import lru_cache, partial, wraps
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.metrics import DB_SECONDS
+
+# A filter is a (column, operator, value) tuple. Operators follow PostgREST:
+# eq, neq, gt, gte, lt, lte, in.
+Filter = Tuple[str, str, Any]
+# An ordering is a (column, descending) tuple.
+Order = Tuple[str, bool]
+# Keyset pagination: with an `order` on unique-ish columns, `after` holds the
+# values of the last row already seen, one per ordering column, and only rows
+# that sort strictly after it are returned.
+
+
+def _timed(method):
+    @wraps(method)
+    def timed(self, table, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, table, *args, **kwargs)
+        finally:
+            DB_SECONDS.observe(time.perf_counter() - started, operation=method.__name__, table=table)
+    return timed
+
+
+class TableStore(abc.ABC):
+    """
+    Blocking table operations shared by every backend. Rows go in and come out
+    as plain dicts, as with the Supabase client.
+    """
+
+    @abc.abstractmethod
+    def select(self, table: str, columns: str = "*", filters: Iterable[Filter] = (),
+               order: Sequence[Order] = (), limit: Optional[int] = None,
+               after: Optional[Sequence[Any]] = None) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def insert(self, table: str, rows) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update(self, table: str, values: dict, filters: Iterable[Filter]) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, table: str, filters: Iterable[Filter]) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove_storage_objects(self, bucket: str, paths: List[str]):
+        raise NotImplementedError
+
+
+class SupabaseStore(TableStore):
+    def __init__(self, client=None):
+        if client is None:
+            from app.database import get_supabase
+            client = get_supabase()
+        self.client = client
+
+    @staticmethod
+    def _apply_filters(query, filters: Iterable[Filter]):
+        for column, op, value in filters:
+            query = query.in_(column, value) if op == "in" else getattr(query, op)(column, value)
+        return query
+
+    @staticmethod
+    def _keyset_condition(order: Sequence[Order], after: Sequence[Any]) -> str:
+        from postgrest.utils import sanitize_param
+        # (a, b) > (x, y)  ==  a > x or (a = x and b > y)
+        terms = []
+        for i, (column, descending) in enumerate(order):
+            equal = [f"{c}.eq.{sanitize_param(v)}" for (c, _), v in zip(order[:i], after[:i])]
+            strict = f"{column}.{'lt' if descending else 'gt'}.{sanitize_param(after[i])}"
+            terms.append(f"and({','.join(equal + [strict])})" if equal else strict)
+        return f"({','.join(terms)})"
+
+    @_timed
+    def select(self, table, columns="*", filters=(), order=(), limit=None, after=None):
+        query = self._apply_filters(self.client.table(table).select(columns), filters)
+        if after is not None:
+            query.params = query.params.add("or", self._keyset_condition(order, after))
+        for column, descending in order:
+            query = query.order(column, desc=descending)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.execute().data or []
+
+    @_timed
+    def insert(self, table, rows):
+        return self.client.table(table).insert(rows).execute().data or []
+
+    @_timed
+    def update(self, table, values, filters):
+        return self._apply_filters(self.client.table(table).update(values), filters).execute().data or []
+
+    @_timed
+    def delete(self, table, filters):
+        return self._apply_filters(self.client.table(table).delete(), filters).execute().data or []
+
+    def remove_storage_objects(self, bucket, paths):
+        self.client.storage.from_(bucket).remove(paths)
+
+
+class SQLiteStore(TableStore):
+    """The application tables on the SQLAlchemy engine from app.database."""
+
+    def __init__(self, engine=None):
+        from app.database import engine as default_engine, metadata
+        self.engine = engine or default_engine
+        self.tables = metadata.tables
+        metadata.create_all(self.engine)
+
+    def _where(self, statement, table, filters: Iterable[Filter]):
+        for column, op, value in filters:
+            col = table.c[column]
+            condition = {
+                "eq": lambda: col == value,
+                "neq": lambda: col != value,
+                "gt": lambda: col > value,
+                "gte": lambda: col >= value,
+                "lt": lambda: col < value,
+                "lte": lambda: col <= value,
+                "in": lambda: col.in_(list(value)),
+            }[op]()
+            statement = statement.where(condition)
+        return statement
+
+    def _columns(self, table, columns: str):
+        if columns.strip() == "*":
+            return [table]
+        return [table.c[name.strip()] for name in columns.split(",")]
+
+    @_timed
+    def select(self, table, columns="*", filters=(), order=(), limit=None, after=None):
+        from sqlalchemy import and_, or_, select
+        t = self.tables[table]
+        statement = self._where(select(*self._columns(t, columns)), t, filters)
+        if after is not None:
+            terms = []
+            for i, (column, descending) in enumerate(order):
+                equal = [t.c[c] == v for (c, _), v in zip(order[:i], after[:i])]
+                strict = t.c[column] < after[i] if descending else t.c[column] > after[i]
+                terms.append(and_(*equal, strict))
+            statement = statement.where(or_(*terms))
+        for column, descending in order:
+            statement = statement.order_by(t.c[column].desc() if descending else t.c[column])
+        if limit is not None:
+            statement = statement.limit(limit)
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(statement)]
+
+    @_timed
+    def insert(self, table, rows):
+        t = self.tables[table]
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        with self.engine.begin() as conn:
+            return [dict(conn.execute(t.insert().values(**row).returning(t)).one()._mapping) for row in rows]
+
+    @_timed
+    def update(self, table, values, filters):
+        t = self.tables[table]
+        with self.engine.begin() as conn:
+            result = conn.execute(self._where(t.update().values(**values), t, filters).returning(t))
+            return [dict(row._mapping) for row in result]
+
+    @_timed
+    def delete(self, table, filters):
+        t = self.tables[table]
+        with self.engine.begin() as conn:
+            result = conn.execute(self._where(t.delete(), t, filters).returning(t))
+            return [dict(row._mapping) for row in result]
+
+    def remove_storage_objects(self, bucket, paths):
+        # There is no object storage behind the local stand-in
+        pass
+
+
+class AsyncStore:
+    """
+    The async face of a TableStore for the routers: every call runs on the
+    thread pool, so a slow database never blocks the event loop.
+    """
+
+    def __init__(self, store: TableStore):
+        self.store = store
+
+    async def select(self, table: str, **kwargs) -> List[dict]:
+        return await run_in_threadpool(partial(self.store.select, table, **kwargs))
+
+    async def insert(self, table: str, rows) -> List[dict]:
+        return await run_in_threadpool(self.store.insert, table, rows)
+
+    async def update(self, table: str, values: dict, filters: Iterable[Filter]) -> List[dict]:
+        return await run_in_threadpool(self.store.update, table, values, filters)
+
+    async def delete(self, table: str, filters: Iterable[Filter]) -> List[dict]:
+        return await run_in_threadpool(self.store.delete, table, filters)
+
+    async def remove_storage_objects(self, bucket: str, paths: List[str]):
+        return await run_in_threadpool(self.store.remove_storage_objects, bucket, paths)
+
+
+@lru_cache(maxsize=None)
+def get_table_store() -> TableStore:
+    """The process-wide store for DATA_BACKEND."""
+    if settings.DATA_BACKEND == "sqlite":
+        return SQLiteStore()
+    return SupabaseStore()
+
+
+def get_store() -> AsyncStore:
+    """FastAPI dependency for the routers."""
+    return AsyncStore(get_table_store())
@@ -1,12 +1,21 @@
-from supabase import create_client, Client
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+from typing import TYPE_CHECKING
+
+import httpx
 from app.config import settings
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 # --- SQLAlchemy setup ---
-from sqlalchemy import create_engine
+from sqlalchemy import JSON, BigInteger, Column, Integer, MetaData, String, Table, Text, create_engine
 from sqlalchemy.orm import sessionmaker, Session
 
-DATABASE_URL = "sqlite:///./test.db"  # Change this to your actual DB URL if needed
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = settings.DATABASE_URL
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -16,6 +25,130 @@ def get_db():
     finally:
         db.close()
 
+# --- Local stand-in for the Supabase tables ---
+# Mirrors the columns the application reads and writes, so the whole API can
+# run against SQLite (DATA_BACKEND=sqlite) for tests and offline benchmarks.
+def _new_id():
+    return str(uuid.uuid4())
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+metadata = MetaData()
+
+organizations_table = Table(
+    "organizations", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("name", String, nullable=False),
+    Column("created_at", String, default=_now),
+)
+
+file_uploads_table = Table(
+    "file_uploads", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("filename", String),
+    Column("file_size", BigInteger),
+    Column("file_type", String),
+    Column("content_type", String),
+    Column("upload_path", String),
+    Column("status", String, default="pending"),
+    Column("user_id", String),
+    Column("organization_id", String, index=True),
+    Column("content_hash", String, index=True),
+    Column("batch_id", String, index=True),
+    Column("upload_timestamp", String, default=_now),
+)
+
+upload_batches_table = Table(
+    "upload_batches", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("organization_id", String, index=True),
+    Column("user_id", String),
+    Column("file_count", Integer, nullable=False, default=0),
+    Column("duplicate_count", Integer, nullable=False, default=0),
+    Column("skipped", JSON),
+    Column("created_at", String, default=_now),
+)
+
+report_content_table = Table(
+    "report_content", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("file_id", String, index=True),
+    # Null once the text is stored in report_content_chunks (see app.services.text_store)
+    Column("extracted_text", Text),
+    Column("extraction_date", String),
+    Column("text_length", Integer),
+    Column("word_count", Integer),
+    Column("page_spans", JSON),
+    Column("chunk_chars", Integer),
+    Column("compression", String),
+)
+
+report_content_chunks_table = Table(
+    "report_content_chunks", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("file_id", String, index=True),
+    Column("chunk_index", Integer),
+    Column("char_start", Integer),
+    Column("char_count", Integer),
+    Column("data", Text),
+)
+
+ai_analysis_results_table = Table(
+    "ai_analysis_results", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("file_id", String, index=True),
+    Column("summary", Text),
+    Column("keywords", JSON),
+    Column("prompt_version", String),
+    Column("model", String),
+    Column("duplicate_of", String),
+    Column("created_at", String, default=_now),
+)
+
+reports_table = Table(
+    "reports", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("title", String, nullable=False),
+    Column("description", Text),
+    Column("organization_id", String, index=True),
+    Column("status", String, default="draft"),
+    Column("content", JSON),
+    Column("error", Text),
+    Column("created_at", String, default=_now),
+    Column("updated_at", String, default=_now),
+    Column("generated_at", String),
+)
+
+report_file_aggregates_table = Table(
+    "report_file_aggregates", metadata,
+    Column("id", String, primary_key=True, default=_new_id),
+    Column("report_id", String, index=True),
+    Column("file_id", String),
+    Column("fingerprint", String),
+    Column("aggregate", JSON),
+    Column("updated_at", String, default=_now),
+)
+
 # --- Supabase setup ---
-def get_supabase() -> Client:
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY) 
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_supabase() -> "Client":
+    """
+    One client per process. Its PostgREST session is an httpx connection pool,
+    so requests reuse keep-alive connections instead of opening new ones.
+    """
+    from supabase import create_client
+    client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    postgrest = client.postgrest
+    postgrest.session.close()
+    postgrest.session = type(postgrest.session)(
+        base_url=postgrest.session.base_url,
+        headers=postgrest.session.headers,
+        timeout=postgrest.session.timeout,
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_MAX_CONNECTIONS,
+            keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+    )
+    return client
@@ -1,8 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import organizations, uploads, reports
+from fastapi.responses import Response
+from app import metrics
+from app.config import settings
+from app.middleware import MetricsMiddleware, UploadSizeLimitMiddleware
+from app.routers import organizations, uploads, reports, search, keywords, events, duplicates
 
-app = FastAPI(title="Market Intelligence Platform", version="1.0.0")
+metrics.install_log_bounds()
+
+worker = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the job worker inside the API process when WORKER_MODE is "embedded"."""
+    global worker
+    if settings.WORKER_MODE == "embedded":
+        from app.worker import Worker
+        worker = Worker()
+        worker.start()
+    try:
+        yield
+    finally:
+        if worker is not None:
+            worker.stop(drain=True)
+            worker = None
+
+app = FastAPI(title="Market Intelligence Platform", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,11 +35,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_prefix="/api/v1/uploads",
+    overrides={"/api/v1/uploads/batch": settings.MAX_BATCH_UPLOAD_SIZE + 64 * 1024},
+)
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(organizations.router, prefix="/api/v1")
 app.include_router(uploads.router, prefix="/api/v1")
 app.include_router(reports.router, prefix="/api/v1")
+app.include_router(search.router, prefix="/api/v1")
+app.include_router(keywords.router, prefix="/api/v1")
+app.include_router(events.router, prefix="/api/v1")
+app.include_router(duplicates.router, prefix="/api/v1")
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text format: pipeline step and stage timings, queue depth, job outcomes, HTTP latency."""
+    return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
 
 @app.get("/")
 async def root():
@@ -0,0 +1,290 @@
+import os
+import abc
+import time
+import bisect
+import socket
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+# A small in-process metrics registry rendered in the Prometheus text format.
+# The extract stage runs in child processes whose registries nobody scrapes,
+# so step timings taken there are captured and handed back to the worker with
+# the stage's result (see capture_steps / observe_steps).
+#
+# Every other process keeps its own registry: each API worker started by
+# `run.py --prod` (WEB_CONCURRENCY) and each standalone worker. A scrape only
+# sees the process that answered it, so every sample carries a worker label
+# (host:pid, as in the job queue) that keeps the series of different
+# processes apart; sum them without it for totals across a deployment. With
+# several API workers behind one port, a scrape reaches one of them at random,
+# so their series are only refreshed when it is their turn to answer. Values
+# read from shared state (job_queue_jobs) are the same in every process:
+# aggregate them with max, not sum.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_registry: List["Metric"] = []
+
+
+_hostname = socket.gethostname()
+
+
+def _worker_label() -> str:
+    # Read at render time: API workers are forked after this module is imported
+    return f'worker="{_escape(f"{_hostname}:{os.getpid()}")}"'
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    pairs.append(_worker_label())
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Gauge(Metric):
+    """A value that is set, or read from `collect` (returning {label values: value}) at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect: Optional[Callable[[], dict]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.collect is not None:
+            try:
+                values = self.collect()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Could not collect {self.name}: {e}")
+                values = {}
+        else:
+            with _lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with _lock:
+            values = {key: ([*counts], total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    with _lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# --- Pipeline metrics ---
+
+STEP_SECONDS = Histogram(
+    "pipeline_step_seconds",
+    "Duration of individual processing steps (temp write, PDF text layer, OCR page, AI request, ...)",
+    ["step"],
+)
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Duration of a job stage", ["stage", "outcome"])
+JOBS_TOTAL = Counter("pipeline_jobs_total", "Finished job stages by outcome (done, retry, failed)", ["stage", "outcome"])
+DB_SECONDS = Histogram("db_request_seconds", "Duration of table store requests", ["operation", "table"])
+HTTP_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by router", ["router", "method", "status"]
+)
+
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds", "Time OpenAI requests waited for the rate limits and higher-priority requests",
+    ["priority"],
+)
+LLM_REQUESTS = Counter("llm_requests_total", "OpenAI requests by outcome (ok, retry, failed)", ["outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "OpenAI tokens used (prompt, completion)", ["kind"])
+LLM_TOKENS_PER_SEC = Gauge("llm_tokens_per_second", "OpenAI tokens per second over the last minute")
+READ_CACHE_REQUESTS = Counter("read_cache_requests_total", "Read-through cache lookups by outcome (hit, miss)",
+                              ["cache", "outcome"])
+READ_CACHE_SAVED_ROUND_TRIPS = Counter(
+    "read_cache_saved_round_trips_total", "Database round trips avoided by read-through caches", ["cache"]
+)
+NEAR_DUPLICATE_CHECKS = Counter(
+    "near_duplicate_checks_total", "Near-duplicate lookups before analysis by outcome (reused, no_match)", ["outcome"]
+)
+
+# Step timings taken while capturing, instead of being observed here
+_captured: Optional[List[Tuple[str, float]]] = None
+
+
+def observe_step(step: str, seconds: float):
+    captured = _captured
+    if captured is not None:
+        captured.append((step, seconds))
+    else:
+        STEP_SECONDS.observe(seconds, step=step)
+
+
+@contextmanager
+def timed_step(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_step(step, time.perf_counter() - started)
+
+
+@contextmanager
+def capture_steps():
+    """
+    In a worker child process, collects the step timings of the job being run
+    (one job at a time per process) so they can be returned to the parent.
+    Elsewhere it records them directly and yields an empty list.
+    """
+    global _captured
+    if multiprocessing.parent_process() is None:
+        yield []
+        return
+    _captured = captured = []
+    try:
+        yield captured
+    finally:
+        _captured = None
+
+
+def observe_steps(steps: List[Tuple[str, float]]):
+    for step, seconds in steps:
+        STEP_SECONDS.observe(seconds, step=step)
+
+
+def _queue_depth() -> dict:
+    from app.services.job_queue import get_job_queue
+    return {
+        (stage, status): count
+        for stage, statuses in get_job_queue().stats().items()
+        for status, count in statuses.items()
+    }
+
+
+QUEUE_JOBS = Gauge("job_queue_jobs", "Jobs in the queue by stage and status", ["stage", "status"], collect=_queue_depth)
+IN_FLIGHT = Gauge("worker_in_flight_jobs", "Jobs currently running in this process's worker", ["stage"])
+
+
+# --- Bounded logging ---
+
+def truncate(value, limit: int = 200) -> str:
+    """str(value), cut to `limit` characters with a note of how much was left out."""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def install_log_bounds(limit: int = None):
+    """Caps the message of every log record, so no log line can carry a whole document."""
+    limit = limit or settings.LOG_MAX_MESSAGE_CHARS
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "bounded", False):
+        return
+
+    def bounded_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        if not record.args:
+            if isinstance(record.msg, str) and len(record.msg) > limit:
+                record.msg = truncate(record.msg, limit)
+            return record
+        # %-style arguments can be as large as the message itself: bound the formatted text
+        try:
+            message = record.getMessage()
+        except Exception:
+            return record  # reported by the handler, as without the bound
+        if len(message) > limit:
+            record.msg, record.args = truncate(message, limit), None
+        return record
+
+    bounded_factory.bounded = True
+    logging.setLogRecordFactory(bounded_factory)
@@ -0,0 +1,121 @@
+import time
+from typing import Dict
+
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.metrics import HTTP_SECONDS
+
+
+class RequestTooLarge(HTTPException):
+    # An HTTPException so that FastAPI's body parsing re-raises it as a 413
+    # instead of wrapping it into a generic 400 "error parsing the body".
+    def __init__(self):
+        super().__init__(status_code=413, detail="Request body too large")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects request bodies larger than `max_body_size` with 413 while they are
+    still being received, instead of after Starlette has spooled the whole
+    multipart body to disk. `overrides` maps longer path prefixes to limits of
+    their own (the longest matching prefix wins).
+    """
+
+    def __init__(self, app: ASGIApp, path_prefix: str = "/api/v1/uploads", max_body_size: int = None,
+                 overrides: Dict[str, int] = None):
+        self.app = app
+        self.path_prefix = path_prefix
+        # Leave some headroom for the multipart boundaries and part headers;
+        # the exact per-file limit is enforced while the file is written out.
+        self.max_body_size = max_body_size or settings.MAX_UPLOAD_SIZE + 64 * 1024
+        self.overrides = sorted((overrides or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit(self, path: str) -> int:
+        for prefix, limit in self.overrides:
+            if path.startswith(prefix):
+                return limit
+        return self.max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = self._limit(scope["path"])
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_body_size:
+            await self._reject(send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise RequestTooLarge()
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestTooLarge:
+            if not response_started:
+                await self._reject(send)
+
+    async def _reject(self, send: Send):
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every HTTP request, until its last body chunk is
+    sent, labelled with the router (the route's first tag) rather than the
+    path so that ids in URLs do not multiply the series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def recording_send(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            route = scope.get("route")
+            tags = getattr(route, "tags", None)
+            router = tags[0] if tags else getattr(route, "path", "unmatched")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started, router=router, method=scope["method"], status=status
+            )
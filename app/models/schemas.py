@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class OrganizationCreate(BaseModel):
@@ -16,6 +16,7 @@ class FileUploadCreate(BaseModel):
     content_type: str
     status: str = "pending"
     user_id: Optional[str] = None
+    organization_id: Optional[str] = None
 
 class FileUploadResponse(BaseModel):
     id: str
@@ -24,9 +25,80 @@ class FileUploadResponse(BaseModel):
     content_type: str
     status: str
     user_id: Optional[str] = None
+    organization_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    batch_id: Optional[str] = None
     upload_timestamp: Optional[datetime] = None
 
+class SkippedFile(BaseModel):
+    name: str
+    reason: str
+
+class BatchUploadResponse(BaseModel):
+    batch_id: str
+    # New uploads registered by this batch, queued for processing
+    file_count: int
+    # Files identical to an earlier upload; `files` lists that upload instead
+    duplicate_count: int
+    skipped: List[SkippedFile] = []
+    files: List[FileUploadResponse] = []
+
+class BatchStatus(BaseModel):
+    id: str
+    organization_id: Optional[str] = None
+    user_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    # processing -> completed (or completed_with_errors once every file is done)
+    status: str
+    file_count: int
+    duplicate_count: int
+    skipped: List[SkippedFile] = []
+    # Uploads of this batch by status (pending, processed, error)
+    counts: Dict[str, int]
+    progress: float
+
 class ReportContentCreate(BaseModel):
     file_id: str
-    extracted_text: str
-    extraction_date: datetime 
\ No newline at end of file
+    # None when the text is stored in chunks (see app.services.text_store)
+    extracted_text: Optional[str] = None
+    extraction_date: datetime
+
+class SearchResult(BaseModel):
+    file_id: str
+    filename: Optional[str] = None
+    organization_id: Optional[str] = None
+    uploaded_at: Optional[datetime] = None
+    keywords: List[str] = []
+    score: float
+    snippet: str
+    filename_highlight: Optional[str] = None
+
+class KeywordCount(BaseModel):
+    keyword: str
+    label: str
+    count: int
+
+class KeywordTrend(KeywordCount):
+    previous_count: int
+    change: int 
+
+class DuplicateFile(BaseModel):
+    file_id: str
+    filename: Optional[str] = None
+    uploaded_at: Optional[datetime] = None
+    # Estimated Jaccard similarity to the file it was matched with; None for the first file
+    similarity: Optional[float] = None
+
+class DuplicateCluster(BaseModel):
+    cluster_id: str
+    size: int
+    files: List[DuplicateFile]
+
+class TextRange(BaseModel):
+    file_id: str
+    # Character span [start, end) of the text returned
+    start: int
+    end: int
+    text_length: int
+    page_count: Optional[int] = None
+    text: str
\ No newline at end of file
@@ -0,0 +1,135 @@
+import json
+import base64
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from app.data_access import AsyncStore, Filter, Order
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """
+    Validates a comma-separated `fields=` projection. Without one, all of
+    `allowed` (the response model's fields), so that columns the model does
+    not expose never reach the client.
+    """
+    if not fields:
+        return list(allowed)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+@lru_cache(maxsize=256)
+def page_adapter(model: Type[BaseModel], fields: Tuple[str, ...]) -> TypeAdapter:
+    """
+    Validates and serialises a page of rows projected onto `fields` exactly
+    as `model` would render them (datetimes, optional values), without
+    requiring the fields that were left out.
+    """
+    if set(fields) != set(model.model_fields):
+        model = create_model(model.__name__, **{name: (model.model_fields[name].annotation, model.model_fields[name])
+                                                for name in fields})
+    return TypeAdapter(List[model])
+
+
+class KeysetQuery:
+    """
+    A filtered, projected listing of one table in a fixed order, read page by
+    page with keyset cursors so that every page costs the same no matter how
+    deep into the table it is.
+    """
+
+    def __init__(self, store: AsyncStore, table: str, model: Type[BaseModel], order: Sequence[Order],
+                 filters: Sequence[Filter] = (), fields: Optional[List[str]] = None):
+        self.store = store
+        self.table = table
+        # Response model every row is rendered through, as on the endpoints that return one row
+        self.model = model
+        self.order = list(order)
+        self.filters = list(filters)
+        self.fields = fields
+        key_columns = [column for column, _ in self.order]
+        # The cursor is built from the ordering columns, so they are always read
+        self.columns = "*" if fields is None else ",".join(dict.fromkeys(fields + key_columns))
+
+    def _project(self, rows: List[dict]) -> List[dict]:
+        if self.fields is None:
+            return rows
+        return [{name: row.get(name) for name in self.fields} for row in rows]
+
+    def _cursor_after(self, row: dict) -> str:
+        return encode_cursor([row[column] for column, _ in self.order])
+
+    async def page(self, limit: int, cursor: Optional[str] = None):
+        """Returns (rows, next_cursor); next_cursor is None on the last page."""
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and len(after) != len(self.order):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Ask for one extra row to learn whether there is a next page
+        rows = await self.store.select(
+            self.table, columns=self.columns, filters=self.filters,
+            order=self.order, limit=limit + 1, after=after,
+        )
+        next_cursor = self._cursor_after(rows[limit - 1]) if len(rows) > limit else None
+        return self._project(rows[:limit]), next_cursor
+
+    async def iter_pages(self, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+        cursor = None
+        while True:
+            rows, cursor = await self.page(batch_size, cursor)
+            yield rows
+            if cursor is None:
+                break
+
+    def adapter(self) -> TypeAdapter:
+        return page_adapter(self.model, tuple(self.fields) if self.fields is not None else tuple(self.model.model_fields))
+
+    def render(self, rows: List[dict]) -> bytes:
+        """A page of rows as the JSON array the response model gives."""
+        adapter = self.adapter()
+        return adapter.dump_json(adapter.validate_python(rows))
+
+    async def response(self, limit: int, cursor: Optional[str], output_format: str):
+        """
+        json: one page as a JSON array, with the cursor of the next page in
+        the X-Next-Cursor header. ndjson: every matching row streamed as
+        newline-delimited JSON, one batch in memory at a time.
+        """
+        if output_format == "ndjson":
+            adapter = self.adapter()
+
+            async def lines():
+                async for rows in self.iter_pages():
+                    for item in adapter.validate_python(rows):
+                        yield item.model_dump_json() + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+        if output_format != "json":
+            raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+        rows, next_cursor = await self.page(limit, cursor)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return Response(content=self.render(rows), media_type="application/json", headers=headers)
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.data_access import AsyncStore, get_store
+from app.models.schemas import DuplicateCluster
+from app.pagination import decode_cursor, encode_cursor
+from app.services.near_duplicates import get_near_duplicate_index
+
+router = APIRouter(prefix="/duplicates", tags=["duplicates"])
+
+async def _with_filenames(store: AsyncStore, clusters: List[dict]) -> List[dict]:
+    file_ids = [file["file_id"] for cluster in clusters for file in cluster["files"]]
+    uploads = {
+        row["id"]: row
+        for row in await store.select("file_uploads", columns="id,filename,upload_timestamp",
+                                      filters=[("id", "in", file_ids)])
+    } if file_ids else {}
+    for cluster in clusters:
+        for file in cluster["files"]:
+            upload = uploads.get(file["file_id"], {})
+            file["filename"] = upload.get("filename")
+            file["uploaded_at"] = upload.get("upload_timestamp")
+        cluster["size"] = len(cluster["files"])
+    return clusters
+
+@router.get("/clusters", response_model=List[DuplicateCluster])
+async def list_clusters(
+    response: Response,
+    organization_id: Optional[str] = Query(None, description="Defaults to every organization"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    store: AsyncStore = Depends(get_store)
+):
+    """
+    Groups of near-duplicate files that share one analysis, oldest file first
+    in each group. Paginated with keyset cursors in the X-Next-Cursor header.
+    """
+    after = decode_cursor(cursor)[0] if cursor else None
+    clusters = await run_in_threadpool(get_near_duplicate_index().clusters, organization_id, limit + 1, after)
+    if len(clusters) > limit:
+        clusters = clusters[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([clusters[-1]["cluster_id"]])
+    return await _with_filenames(store, clusters)
+
+@router.get("/files/{file_id}", response_model=DuplicateCluster)
+async def file_cluster(file_id: str, store: AsyncStore = Depends(get_store)):
+    """The near-duplicate group of one file (just the file itself if it has no near-duplicates)."""
+    cluster = await run_in_threadpool(get_near_duplicate_index().cluster_of, file_id)
+    if cluster is None:
+        raise HTTPException(status_code=404, detail="File has no signature (not processed, or too short)")
+    return (await _with_filenames(store, [cluster]))[0]
@@ -0,0 +1,127 @@
+import json
+import asyncio
+from typing import AsyncIterator, Callable, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.data_access import AsyncStore, get_store
+from app.routers.uploads import load_batch_status
+from app.services.events import FINAL_STATUSES, Subscription, get_event_broker, get_event_log
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# Server-Sent Events streams of processing status, replacing polling of
+# GET /uploads/. Each stream starts with a `snapshot` of the current state,
+# then relays `stage`, `progress` and `status` events (see app.services.events)
+# as they happen, and ends with an `end` event once there is nothing left to
+# wait for; EventSource clients should close on `end` rather than reconnect.
+# A client that reconnects with Last-Event-ID is first sent what it missed.
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data, event_id: int = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+def _public(event: dict) -> dict:
+    return {"file_id": event["file_id"], "batch_id": event["batch_id"], **event["data"]}
+
+async def _relay(subscription: Subscription, snapshot: dict, finished: Callable[[dict], bool], done: bool,
+                 resume: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Yields the events after `resume` (a Last-Event-ID) from the log, the
+    snapshot, then live events until `finished` returns True for one of them
+    (or right away if `done`). Unsubscribes when the client goes away.
+    """
+    broker = get_event_broker()
+    log = get_event_log()
+    try:
+        yield "retry: 1000\n\n"
+        last_sent = 0
+        while resume is not None:
+            history = await run_in_threadpool(log.history, resume, subscription.file_id, subscription.batch_id)
+            for event in history:
+                yield _sse(event["type"], _public(event), event["id"])
+                last_sent = event["id"]
+            resume = history[-1]["id"] if len(history) == 1000 else None
+        yield _sse("snapshot", snapshot)
+        while not done:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscription.overflowed:
+                # Too far behind to catch up live: the client reconnects with
+                # Last-Event-ID and gets the rest from the log
+                return
+            if event["id"] <= last_sent:
+                continue
+            yield _sse(event["type"], _public(event), event["id"])
+            last_sent = event["id"]
+            done = finished(event)
+        yield _sse("end", {})
+    finally:
+        broker.unsubscribe(subscription)
+
+def _resume_from(last_event_id: Optional[str]) -> Optional[int]:
+    return int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+@router.get("/files/{file_id}")
+async def file_events(
+    file_id: str,
+    last_event_id: Optional[str] = Header(None),
+    store: AsyncStore = Depends(get_store)
+):
+    """Processing events of one upload, until it is processed or has failed."""
+    # Subscribe before reading the current state, so nothing published in between is lost
+    subscription = get_event_broker().subscribe(file_id=file_id)
+    try:
+        rows = await store.select("file_uploads", columns="id,status,batch_id", filters=[("id", "eq", file_id)])
+        if not rows:
+            raise HTTPException(status_code=404, detail="File not found")
+    except BaseException:
+        get_event_broker().unsubscribe(subscription)
+        raise
+    snapshot = {"file_id": file_id, "batch_id": rows[0].get("batch_id"), "status": rows[0]["status"]}
+    return StreamingResponse(
+        _relay(
+            subscription, snapshot,
+            finished=lambda event: event["type"] == "status",
+            done=rows[0]["status"] in FINAL_STATUSES,
+            resume=_resume_from(last_event_id),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+@router.get("/batches/{batch_id}")
+async def batch_events(
+    batch_id: str,
+    last_event_id: Optional[str] = Header(None),
+    store: AsyncStore = Depends(get_store)
+):
+    """Processing events of every upload in a batch, until none of them is pending."""
+    subscription = get_event_broker().subscribe(batch_id=batch_id)
+    try:
+        batch_status, pending = await load_batch_status(store, batch_id)
+    except BaseException:
+        get_event_broker().unsubscribe(subscription)
+        raise
+
+    def finished(event: dict) -> bool:
+        if event["type"] == "status":
+            pending.discard(event["file_id"])
+        return not pending
+
+    return StreamingResponse(
+        _relay(
+            subscription, batch_status.model_dump(mode="json"), finished,
+            done=not pending,
+            resume=_resume_from(last_event_id),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
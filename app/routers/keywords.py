@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from app.models.schemas import KeywordCount, KeywordTrend
+from app.services.keyword_index import PERIODS, current_bucket, get_keyword_index, parse_bucket
+
+router = APIRouter(prefix="/keywords", tags=["keywords"])
+
+def _resolve_bucket(period: str, bucket: Optional[str]) -> str:
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(PERIODS)}")
+    if bucket is None:
+        return current_bucket(period)
+    try:
+        return parse_bucket(bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/top", response_model=List[KeywordCount])
+def top_keywords(
+    organization_id: Optional[str] = Query(None, description="Defaults to every organization"),
+    period: str = Query("quarter", description="month, quarter or year"),
+    bucket: Optional[str] = Query(None, description="e.g. 2026-03, 2026-Q1 or 2026; defaults to the current one"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Keywords found in the most files of the bucket."""
+    return get_keyword_index().top(organization_id, _resolve_bucket(period, bucket), limit)
+
+@router.get("/rising", response_model=List[KeywordTrend])
+def rising_keywords(
+    organization_id: Optional[str] = Query(None, description="Defaults to every organization"),
+    period: str = Query("quarter", description="month, quarter or year"),
+    bucket: Optional[str] = Query(None, description="e.g. 2026-03, 2026-Q1 or 2026; defaults to the current one"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Keywords that gained the most files compared with the previous bucket."""
+    return get_keyword_index().rising(organization_id, _resolve_bucket(period, bucket), limit)
@@ -1,41 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from app.database import get_supabase
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import List, Optional
+from app.data_access import AsyncStore, get_store
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KeysetQuery, parse_fields
 from app.models.schemas import Organization, OrganizationCreate
+from app.services.read_cache import CachedResponse, get_organization_cache
 
 router = APIRouter(prefix="/organizations", tags=["organizations"])
 
+# Reads are served through the organization cache (see app.services.read_cache)
+# with ETags; the writes below invalidate what they change.
+
+def _invalidate(organization_id: Optional[str] = None):
+    # Any write can change any page of the listing
+    get_organization_cache().invalidate(
+        lambda key: key[0] == "list" or (organization_id is not None and key == ("organization", organization_id))
+    )
+
 @router.get("/", response_model=List[Organization])
-async def list_organizations(supabase = Depends(get_supabase)):
-    result = supabase.table("organizations").select("*").execute()
-    if not result.data:
-        return []
-    return [Organization(**org) for org in result.data]
+async def list_organizations(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    output_format: str = Query("json", alias="format", description="'json' for one page, 'ndjson' to stream every organization"),
+    if_none_match: Optional[str] = Header(None),
+    store: AsyncStore = Depends(get_store)
+):
+    """Organizations in creation order, paginated with keyset cursors."""
+    columns = parse_fields(fields, list(Organization.model_fields))
+    query = KeysetQuery(store, "organizations", Organization, order=[("created_at", False), ("id", False)],
+                        fields=columns)
+    if output_format != "json":
+        return await query.response(limit, cursor, output_format)
+    cache = get_organization_cache()
+    key = ("list", limit, cursor, tuple(columns))
+    cached = cache.get(key)
+    if cached is None:
+        generation = cache.generation
+        rows, next_cursor = await query.page(limit, cursor)
+        cached = CachedResponse(query.render(rows), {"X-Next-Cursor": next_cursor} if next_cursor else {})
+        cache.put(key, cached, generation)
+    return cached.response(if_none_match)
 
 @router.post("/", response_model=Organization)
-async def create_organization(org: OrganizationCreate, supabase = Depends(get_supabase)):
-    result = supabase.table("organizations").insert({"name": org.name}).execute()
-    if not result.data:
+async def create_organization(org: OrganizationCreate, store: AsyncStore = Depends(get_store)):
+    rows = await store.insert("organizations", {"name": org.name})
+    if not rows:
         raise HTTPException(status_code=400, detail="Failed to create organization")
-    return Organization(**result.data[0])
+    _invalidate()
+    return Organization(**rows[0])
 
 @router.get("/{organization_id}", response_model=Organization)
-async def get_organization(organization_id: str, supabase = Depends(get_supabase)):
-    response = supabase.table("organizations").select("*").eq("id", organization_id).execute()
-    if not response.data:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return Organization(**response.data[0])
+async def get_organization(
+    organization_id: str,
+    if_none_match: Optional[str] = Header(None),
+    store: AsyncStore = Depends(get_store)
+):
+    cache = get_organization_cache()
+    key = ("organization", organization_id)
+    cached = cache.get(key)
+    if cached is None:
+        generation = cache.generation
+        rows = await store.select("organizations", filters=[("id", "eq", organization_id)])
+        if not rows:
+            raise HTTPException(status_code=404, detail="Organization not found")
+        cached = CachedResponse(Organization(**rows[0]).model_dump_json().encode())
+        cache.put(key, cached, generation)
+    return cached.response(if_none_match)
 
 @router.put("/{organization_id}", response_model=Organization)
-async def update_organization(organization_id: str, organization: OrganizationCreate, supabase = Depends(get_supabase)):
-    response = supabase.table("organizations").update(organization.dict()).eq("id", organization_id).execute()
-    if not response.data:
+async def update_organization(organization_id: str, organization: OrganizationCreate, store: AsyncStore = Depends(get_store)):
+    rows = await store.update("organizations", organization.dict(), [("id", "eq", organization_id)])
+    _invalidate(organization_id)
+    if not rows:
         raise HTTPException(status_code=404, detail="Organization not found")
-    return Organization(**response.data[0])
+    return Organization(**rows[0])
 
 @router.delete("/{organization_id}")
-async def delete_organization(organization_id: str, supabase = Depends(get_supabase)):
-    response = supabase.table("organizations").delete().eq("id", organization_id).execute()
-    if not response.data:
+async def delete_organization(organization_id: str, store: AsyncStore = Depends(get_store)):
+    rows = await store.delete("organizations", [("id", "eq", organization_id)])
+    _invalidate(organization_id)
+    if not rows:
         raise HTTPException(status_code=404, detail="Organization not found")
-    return {"message": "Organization deleted successfully"} 
\ No newline at end of file
+    return {"message": "Organization deleted successfully"}
@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timezone
+from app.config import settings
+from app.data_access import AsyncStore, get_store
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KeysetQuery, parse_fields
+from app.services.job_queue import get_job_queue
+from app.services.pipeline import GENERATE_REPORT
+from app.services.related_index import get_related_index
+from app.services.report_engine import reset_aggregates
 
 router = APIRouter(tags=["reports"])
 
+class ReportCreate(BaseModel):
+    title: str
+    description: Optional[str] = None
+    organization_id: str
+
 class Report(BaseModel):
     id: Optional[str] = None
     title: str
@@ -12,35 +25,121 @@ class Report(BaseModel):
     organization_id: str
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    generated_at: Optional[datetime] = None
+    # draft -> generating -> ready (or failed, with `error` set)
     status: str = "draft"
+    error: Optional[str] = None
     content: Optional[dict] = None
 
+class RelatedReport(BaseModel):
+    file_id: str
+    filename: Optional[str] = None
+    # Cosine similarity of the hashed TF-IDF vectors, 0..1
+    score: float
+
+async def _get_report_row(store: AsyncStore, report_id: str) -> dict:
+    rows = await store.select("reports", filters=[("id", "eq", report_id)])
+    if not rows:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return rows[0]
+
+def _generation_stale(report: dict) -> bool:
+    """
+    True if a report has been 'generating' for longer than a job lease, i.e.
+    its job was lost (e.g. the queue was reset) and will never finish it.
+    """
+    updated_at = report.get("updated_at")
+    if not updated_at:
+        return True
+    if isinstance(updated_at, str):
+        updated_at = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.utcnow() - updated_at).total_seconds() > settings.JOB_LEASE_TIMEOUT
+
 @router.get("/reports", response_model=List[Report])
-async def get_reports():
-    # TODO: Implement database query
-    return []
+async def get_reports(
+    organization_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,title,status"),
+    output_format: str = Query("json", alias="format", description="'json' for one page, 'ndjson' to stream every report"),
+    store: AsyncStore = Depends(get_store)
+):
+    filters = []
+    if organization_id:
+        filters.append(("organization_id", "eq", organization_id))
+    if status:
+        filters.append(("status", "eq", status))
+    query = KeysetQuery(
+        store, "reports", Report,
+        order=[("created_at", False), ("id", False)],
+        filters=filters,
+        fields=parse_fields(fields, list(Report.model_fields)),
+    )
+    return await query.response(limit, cursor, output_format)
 
 @router.post("/reports", response_model=Report)
-async def create_report(report: Report):
-    # TODO: Implement database creation
-    return report
+async def create_report(report: ReportCreate, store: AsyncStore = Depends(get_store)):
+    rows = await store.insert("reports", {**report.dict(), "status": "draft"})
+    if not rows:
+        raise HTTPException(status_code=400, detail="Failed to create report")
+    return Report(**rows[0])
 
 @router.get("/reports/{report_id}", response_model=Report)
-async def get_report(report_id: str):
-    # TODO: Implement database query
-    raise HTTPException(status_code=404, detail="Report not found")
+async def get_report(report_id: str, store: AsyncStore = Depends(get_store)):
+    """Cheap to poll while a report is generating."""
+    return Report(**await _get_report_row(store, report_id))
 
 @router.put("/reports/{report_id}", response_model=Report)
-async def update_report(report_id: str, report: Report):
-    # TODO: Implement database update
-    raise HTTPException(status_code=404, detail="Report not found")
+async def update_report(report_id: str, report: ReportCreate, store: AsyncStore = Depends(get_store)):
+    existing = await _get_report_row(store, report_id)
+    if report.organization_id != existing["organization_id"]:
+        # The stored aggregates describe another organization's files
+        await run_in_threadpool(reset_aggregates, store.store, report_id)
+    rows = await store.update(
+        "reports", {**report.dict(), "updated_at": datetime.utcnow().isoformat()}, [("id", "eq", report_id)]
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return Report(**rows[0])
 
 @router.delete("/reports/{report_id}")
-async def delete_report(report_id: str):
-    # TODO: Implement database deletion
-    raise HTTPException(status_code=404, detail="Report not found")
-
-@router.post("/reports/{report_id}/generate")
-async def generate_report(report_id: str):
-    # TODO: Implement report generation logic
-    raise HTTPException(status_code=404, detail="Report not found") 
\ No newline at end of file
+async def delete_report(report_id: str, store: AsyncStore = Depends(get_store)):
+    await store.delete("report_file_aggregates", [("report_id", "eq", report_id)])
+    rows = await store.delete("reports", [("id", "eq", report_id)])
+    if not rows:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return {"message": "Report deleted successfully"}
+
+@router.post("/reports/{report_id}/generate", response_model=Report, status_code=202)
+async def generate_report(report_id: str, store: AsyncStore = Depends(get_store)):
+    """
+    Queues the report for (re)generation and returns at once with status
+    'generating'; poll GET /reports/{report_id} until it is 'ready'. Only files
+    added or changed since the last run are aggregated again.
+    """
+    report = await _get_report_row(store, report_id)
+    if report.get("status") == "generating" and not _generation_stale(report):
+        return Report(**report)
+    rows = await store.update(
+        "reports",
+        {"status": "generating", "error": None, "updated_at": datetime.utcnow().isoformat()},
+        [("id", "eq", report_id)],
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="Report not found")
+    await run_in_threadpool(get_job_queue().enqueue, GENERATE_REPORT, "report", {"report_id": report_id})
+    return Report(**rows[0])
+
+@router.get("/reports/{file_id}/related", response_model=List[RelatedReport])
+async def get_related_reports(file_id: str, limit: int = Query(10, ge=1, le=100)):
+    """
+    Processed uploads of the same organization whose text and keywords are
+    most similar to those of the file `file_id`, most similar first.
+    """
+    related = await run_in_threadpool(get_related_index().related, file_id, limit)
+    if related is None:
+        raise HTTPException(status_code=404, detail="File not found in the related reports index")
+    return related
@@ -0,0 +1,31 @@
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from app.models.schemas import SearchResult
+from app.services.search_index import InvalidQuery, get_search_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("/", response_model=List[SearchResult])
+def search_reports(
+    q: str = Query(..., min_length=1, description='Words that must all appear; "quoted phrases" and prefix* allowed'),
+    organization_id: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    keyword: Optional[str] = Query(None, description="Only reports whose AI keywords match this"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Full-text search over extracted report text, best BM25 matches first."""
+    try:
+        return get_search_index().search(
+            q,
+            organization_id=organization_id,
+            uploaded_after=uploaded_after.isoformat() if uploaded_after else None,
+            uploaded_before=uploaded_before.isoformat() if uploaded_before else None,
+            keyword=keyword,
+            limit=limit,
+            offset=offset,
+        )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
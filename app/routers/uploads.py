@@ -1,12 +1,30 @@
 import os
+import zlib
+import uuid
+import hashlib
 import logging
+import tarfile
+import zipfile
+import mimetypes
+from collections import Counter
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, Depends
-from typing import List
-from app.models.schemas import FileUploadResponse
-from app.database import get_supabase
-from app.services.document_processor import extract_text_from_file
-from app.services.ai_analyzer import analyze_text_with_openai
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
+from app.config import settings
+from app.metrics import timed_step, truncate
+from app.models.schemas import BatchStatus, BatchUploadResponse, FileUploadResponse, TextRange
+from app.data_access import AsyncStore, get_store
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KeysetQuery, parse_fields
+from app.services.archive import ArchiveError, is_archive, iter_archive
+from app.services.document_processor import extractor_for
+from app.services.job_queue import PRIORITY_BULK, PRIORITY_INTERACTIVE, get_job_queue
+from app.services.search_index import get_search_index
+from app.services.keyword_index import get_keyword_index
+from app.services.near_duplicates import get_near_duplicate_index
+from app.services.related_index import get_related_index
+from app.services.pipeline import PROCESS_FILE
+from app.services import text_store
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
@@ -18,130 +36,453 @@ def ensure_temp_dir():
         os.makedirs(TEMP_UPLOAD_DIR)
         logger.info(f"Created temporary upload directory: {TEMP_UPLOAD_DIR}")
 
-def process_file_in_background(
-    file_id: str,
-    temp_file_path: str,
-    original_filename: str,
-    supabase
-):
-    logger.info(f"=== Starting background task for file_id: {file_id} ===")
+def _safe_extension(filename: str) -> str:
+    _, ext = os.path.splitext(filename or "")
+    ext = ext.lower()
+    return ext if ext[1:].isalnum() else ""
+
+class FileTooLarge(ValueError):
+    pass
+
+class TempFileWriter:
+    """
+    Writes one file to TEMP_UPLOAD_DIR chunk by chunk, hashing it on the way,
+    and stores it under its SHA-256 (keeping the extension, which the
+    extractors dispatch on). Raises FileTooLarge as soon as MAX_UPLOAD_SIZE is
+    exceeded. Use as a context manager: the partial file is removed unless
+    commit() was reached.
+    """
+
+    def __init__(self):
+        ensure_temp_dir()
+        self.partial_path = os.path.join(TEMP_UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.partial_path, "wb")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > settings.MAX_UPLOAD_SIZE:
+            raise FileTooLarge(f"File exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes")
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+
+    def copy_from(self, stream):
+        while True:
+            chunk = stream.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            self.write(chunk)
+
+    def commit(self, filename: str):
+        """Returns (stored_path, content_hash, size)."""
+        self.file.close()
+        content_hash = self.sha256.hexdigest()
+        stored_path = temp_path_for(content_hash, filename)
+        if not os.path.exists(stored_path):
+            os.replace(self.partial_path, stored_path)
+        return stored_path, content_hash, self.size
+
+async def save_upload_to_disk(file: UploadFile):
+    """
+    Streams an upload to TEMP_UPLOAD_DIR in UPLOAD_CHUNK_SIZE chunks (see
+    TempFileWriter). Raises 413 as soon as MAX_UPLOAD_SIZE is exceeded.
+    Returns (stored_path, content_hash, size).
+    """
     try:
-        if not os.path.exists(temp_file_path):
-            raise FileNotFoundError(f"Temporary file not found: {temp_file_path}")
-        logger.info(f"Starting text extraction for file: {original_filename}")
-        extracted_text = extract_text_from_file(temp_file_path, original_filename)
-        logger.info(f"Text extraction completed. Extracted {len(extracted_text)} characters")
-        # --- AI Analysis Step ---
-        try:
-            logger.info("Starting AI analysis...")
-            ai_result = analyze_text_with_openai(extracted_text)
-            summary = ai_result.get("summary", "")
-            keywords = ai_result.get("keywords", [])
-            logger.info(f"AI analysis completed. Summary length: {len(summary)}, Keywords: {keywords}")
-            # Insert into ai_analysis_results
-            logger.info("Inserting AI analysis results into database...")
-            result = supabase.table("ai_analysis_results").insert({
-                "file_id": file_id,
-                "summary": summary,
-                "keywords": keywords
-            }).execute()
-            logger.info(f"Database insert result: {result}")
-        except Exception as ai_error:
-            logger.error(f"Error during AI analysis: {str(ai_error)}", exc_info=True)
-        # Save to report_content table
-        logger.info("Saving extracted text to report_content table...")
-        report_content = {
-            "file_id": file_id,
-            "extracted_text": extracted_text,
-            "extraction_date": datetime.utcnow().isoformat()
-        }
-        result = supabase.table("report_content").insert(report_content).execute()
-        logger.info(f"Report content insert result: {result}")
-        # Update file status
-        logger.info("Updating file status to 'processed'...")
-        result = supabase.table("file_uploads").update({"status": "processed"}).eq("id", file_id).execute()
-        logger.info(f"Status update result: {result}")
-    except Exception as e:
-        logger.error(f"Error in background task: {str(e)}", exc_info=True)
-        try:
-            supabase.table("file_uploads").update({"status": "error"}).eq("id", file_id).execute()
-        except Exception as db_error:
-            logger.error(f"Failed to update error status: {str(db_error)}")
-    finally:
-        # Clean up temporary file
-        try:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
-        except Exception as cleanup_error:
-            logger.error(f"Failed to clean up temporary file: {str(cleanup_error)}")
-    logger.info(f"=== Completed background task for file_id: {file_id} ===")
+        with TempFileWriter() as writer:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(writer.write, chunk)
+            return writer.commit(file.filename)
+    except FileTooLarge:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {settings.MAX_UPLOAD_SIZE} bytes")
+
+def temp_path_for(content_hash: str, filename: str) -> str:
+    return os.path.join(TEMP_UPLOAD_DIR, content_hash + _safe_extension(filename))
+
+def remove_unused_temp_files(paths, existing_uploads):
+    """
+    Deletes stored files that duplicate an earlier upload, except where the
+    earlier upload is still pending and its job reads that very file.
+    """
+    in_use = {
+        temp_path_for(row["content_hash"], row["filename"])
+        for row in existing_uploads if row.get("status") == "pending"
+    }
+    for path in set(paths) - in_use:
+        if os.path.exists(path):
+            os.remove(path)
+
+async def find_existing_upload(store: AsyncStore, content_hash: str, organization_id: Optional[str]):
+    """
+    Returns the most recent usable file_uploads row of the organization with
+    the same content hash, if any. Another organization's copy is never
+    reused: its row, listings and indexes belong to that organization (its
+    processing is still cheap, through the extraction and analysis caches).
+    """
+    rows = await store.select("file_uploads", filters=[("content_hash", "eq", content_hash)],
+                              order=[("upload_timestamp", True)])
+    for row in rows:
+        # Compared here rather than filtered on, so that uploads without an organization match too
+        if row.get("organization_id") == organization_id and row.get("status") != "error":
+            return row
+    return None
 
 @router.post("/", response_model=FileUploadResponse)
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_id: str = None,
-    supabase = Depends(get_supabase)
+    organization_id: str = None,
+    store: AsyncStore = Depends(get_store)
 ):
     logger.info(f"=== Starting file upload for: {file.filename} ===")
+    job_queue = get_job_queue()
+    if await run_in_threadpool(job_queue.backlog, PRIORITY_INTERACTIVE) >= settings.QUEUE_MAX_BACKLOG:
+        raise HTTPException(
+            status_code=429,
+            detail="Processing backlog is full, retry later",
+            headers={"Retry-After": "30"}
+        )
     try:
-        ensure_temp_dir()
-        temp_file_path = os.path.join(TEMP_UPLOAD_DIR, file.filename)
-        # Save file to temp directory
-        logger.info(f"Saving file to temporary location: {temp_file_path}")
-        with open(temp_file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        logger.info(f"File saved successfully. Size: {len(content)} bytes")
+        # Stream file to temp directory, stored under its content hash
+        with timed_step("temp_write"):
+            temp_file_path, content_hash, file_size = await save_upload_to_disk(file)
+        logger.info(f"File saved to {temp_file_path}. Size: {file_size} bytes, sha256: {content_hash}")
+        # A byte-identical file was uploaded before: reuse its rows and results
+        existing = await find_existing_upload(store, content_hash, organization_id)
+        if existing:
+            logger.info(f"Duplicate of file {existing['id']}, skipping processing")
+            remove_unused_temp_files([temp_file_path], [existing])
+            return FileUploadResponse(**existing)
         # Create file_uploads record
         file_upload = {
             "filename": file.filename,
-            "file_size": len(content),
+            "file_size": file_size,
+            "content_hash": content_hash,
             "file_type": file.content_type,
             "content_type": file.content_type,
             "upload_path": f"uploads/{file.filename}",  # For DB
             "status": "pending",
             "user_id": user_id,
+            "organization_id": organization_id,
             "upload_timestamp": datetime.utcnow().isoformat()
         }
         logger.info("Creating file_uploads record...")
-        db_response = supabase.table("file_uploads").insert(file_upload).execute()
-        if not db_response.data:
+        rows = await store.insert("file_uploads", file_upload)
+        if not rows:
             raise HTTPException(status_code=400, detail="Failed to create file record")
-        file_id = db_response.data[0]["id"]
+        file_id = rows[0]["id"]
         logger.info(f"File record created with ID: {file_id}")
-        # Start background task
-        logger.info("Adding background task...")
-        background_tasks.add_task(
-            process_file_in_background,
-            file_id,
-            temp_file_path,
-            file.filename,
-            supabase
+        # Queue processing; the worker picks it up from the durable job queue
+        job_id = await run_in_threadpool(job_queue.enqueue, PROCESS_FILE, "extract", {
+            "file_id": file_id,
+            "temp_file_path": os.path.abspath(temp_file_path),
+            "content_hash": content_hash,
+            "original_filename": file.filename,
+            "organization_id": organization_id,
+            "upload_timestamp": rows[0].get("upload_timestamp")
+        })
+        logger.info(f"Queued processing job {job_id}")
+        return FileUploadResponse(**rows[0])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in upload endpoint: {truncate(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=truncate(e))
+
+def _store_batch_files(files: List[UploadFile]):
+    """
+    Blocking: writes each file of a batch, and each entry of the archives among
+    them, to TEMP_UPLOAD_DIR. Archive entries are copied straight out of the
+    uploaded archive one at a time. Returns (stored, skipped): a dict per file
+    written, and a {"name", "reason"} dict per file left out.
+    """
+    stored, skipped = [], []
+
+    def add(name: str, stream, content_type: Optional[str]):
+        filename = os.path.basename(name.replace("\\", "/"))
+        # By extension: archives carry all sorts of stray files, which are not worth sniffing
+        if extractor_for(filename, sniff=False) is None:
+            skipped.append({"name": name, "reason": "Unsupported file type"})
+            return
+        if len(stored) >= settings.MAX_BATCH_FILES:
+            skipped.append({"name": name, "reason": f"Batch has more than {settings.MAX_BATCH_FILES} files"})
+            return
+        try:
+            with TempFileWriter() as writer:
+                writer.copy_from(stream)
+                path, content_hash, size = writer.commit(filename)
+        except FileTooLarge as e:
+            skipped.append({"name": name, "reason": str(e)})
+            return
+        stored.append({
+            "filename": filename,
+            "path": path,
+            "content_hash": content_hash,
+            "file_size": size,
+            "content_type": content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        })
+
+    for file in files:
+        if not is_archive(file.filename):
+            add(file.filename, file.file, file.content_type)
+            continue
+        try:
+            entries = iter_archive(file.file, file.filename, settings.MAX_BATCH_FILES,
+                                   settings.MAX_ARCHIVE_EXPANDED_SIZE)
+            for entry_name, stream in entries:
+                name = f"{file.filename}/{entry_name}"
+                if stream is None:
+                    skipped.append({"name": name, "reason": "Encrypted or compressed with an unsupported method"})
+                    continue
+                try:
+                    add(name, stream, None)
+                except (zipfile.BadZipFile, zlib.error, EOFError, tarfile.TarError) as e:
+                    # A damaged entry; the rest of a ZIP is still readable
+                    skipped.append({"name": name, "reason": f"Could not read: {e}"})
+        except ArchiveError as e:
+            # Whatever was read before the archive broke off is kept
+            skipped.append({"name": file.filename, "reason": str(e)})
+    return stored, skipped
+
+async def find_existing_uploads(store: AsyncStore, content_hashes: List[str],
+                                organization_id: Optional[str]) -> Dict[str, dict]:
+    """Like find_existing_upload for many hashes at once: {content hash: usable row}."""
+    existing = {}
+    for start in range(0, len(content_hashes), 200):
+        rows = await store.select(
+            "file_uploads", filters=[("content_hash", "in", content_hashes[start:start + 200])],
+            order=[("upload_timestamp", True)],
         )
-        logger.info("Background task added successfully")
-        return FileUploadResponse(**db_response.data[0])
+        for row in rows:
+            if row.get("organization_id") == organization_id and row.get("status") != "error":
+                existing.setdefault(row["content_hash"], row)
+    return existing
+
+@router.post("/batch", response_model=BatchUploadResponse, status_code=202)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = None,
+    organization_id: str = None,
+    store: AsyncStore = Depends(get_store)
+):
+    """
+    Registers many files in one request: any mix of files and ZIP / TAR
+    archives. New uploads are created with one bulk insert and queued at bulk
+    priority, so single uploads are still processed first. Follow progress at
+    GET /uploads/batches/{batch_id}.
+    """
+    job_queue = get_job_queue()
+    if await run_in_threadpool(job_queue.backlog, PRIORITY_BULK) >= settings.QUEUE_MAX_BULK_BACKLOG:
+        raise HTTPException(
+            status_code=429,
+            detail="Batch processing backlog is full, retry later",
+            headers={"Retry-After": "300"}
+        )
+    try:
+        with timed_step("batch_temp_write"):
+            stored, skipped = await run_in_threadpool(_store_batch_files, files)
+        logger.info(f"Batch of {len(files)} upload(s): {len(stored)} file(s) stored, {len(skipped)} skipped")
+        # One upload per content hash; a byte-identical earlier upload is reused
+        unique = {}
+        for item in stored:
+            unique.setdefault(item["content_hash"], item)
+        existing = await find_existing_uploads(store, list(unique), organization_id)
+        new = [item for content_hash, item in unique.items() if content_hash not in existing]
+
+        batch_rows = await store.insert("upload_batches", {
+            "organization_id": organization_id,
+            "user_id": user_id,
+            "file_count": len(new),
+            "duplicate_count": len(stored) - len(new),
+            "skipped": skipped,
+        })
+        if not batch_rows:
+            raise HTTPException(status_code=400, detail="Failed to create batch record")
+        batch_id = batch_rows[0]["id"]
+        upload_timestamp = datetime.utcnow().isoformat()
+        rows = await store.insert("file_uploads", [
+            {
+                "filename": item["filename"],
+                "file_size": item["file_size"],
+                "content_hash": item["content_hash"],
+                "file_type": item["content_type"],
+                "content_type": item["content_type"],
+                "upload_path": f"uploads/{item['filename']}",
+                "status": "pending",
+                "user_id": user_id,
+                "organization_id": organization_id,
+                "batch_id": batch_id,
+                "upload_timestamp": upload_timestamp
+            }
+            for item in new
+        ]) if new else []
+        created = {row["content_hash"]: row for row in rows}
+        job_ids = await run_in_threadpool(job_queue.enqueue_many, PROCESS_FILE, "extract", [
+            {
+                "file_id": row["id"],
+                "temp_file_path": os.path.abspath(unique[content_hash]["path"]),
+                "content_hash": content_hash,
+                "original_filename": row["filename"],
+                "organization_id": organization_id,
+                "batch_id": batch_id,
+                "upload_timestamp": row.get("upload_timestamp")
+            }
+            for content_hash, row in created.items()
+        ], PRIORITY_BULK)
+        logger.info(f"Batch {batch_id}: queued {len(job_ids)} processing job(s)")
+        # Copies of files that are already uploaded are not needed again
+        new_paths = {item["path"] for item in new}
+        remove_unused_temp_files(
+            [item["path"] for item in stored if item["path"] not in new_paths], existing.values()
+        )
+        return BatchUploadResponse(
+            batch_id=batch_id,
+            file_count=len(new),
+            duplicate_count=len(stored) - len(new),
+            skipped=skipped,
+            files=[created.get(item["content_hash"]) or existing[item["content_hash"]] for item in stored],
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in upload endpoint: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"Error in batch upload endpoint: {truncate(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=truncate(e))
+
+async def load_batch_status(store: AsyncStore, batch_id: str):
+    """Returns (BatchStatus, ids of the batch's uploads still pending); raises 404 for an unknown batch."""
+    rows = await store.select("upload_batches", filters=[("id", "eq", batch_id)])
+    if not rows:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch = rows[0]
+    counts = Counter()
+    pending_ids = set()
+    after = None
+    while True:
+        page = await store.select(
+            "file_uploads", columns="id,status", filters=[("batch_id", "eq", batch_id)],
+            order=[("id", False)], limit=1000, after=after
+        )
+        counts.update(row["status"] for row in page)
+        pending_ids.update(row["id"] for row in page if row["status"] == "pending")
+        if len(page) < 1000:
+            break
+        after = [page[-1]["id"]]
+    total = sum(counts.values())
+    pending = counts.get("pending", 0)
+    if pending:
+        status = "processing"
+    else:
+        status = "completed_with_errors" if counts.get("error") else "completed"
+    batch_status = BatchStatus(
+        **batch,
+        status=status,
+        counts=dict(counts),
+        progress=round((total - pending) / total, 4) if total else 1.0,
+    )
+    return batch_status, pending_ids
+
+@router.get("/batches/{batch_id}", response_model=BatchStatus)
+async def get_batch(batch_id: str, store: AsyncStore = Depends(get_store)):
+    """Aggregate progress of a batch upload. GET /events/batches/{batch_id} streams it instead."""
+    batch_status, _ = await load_batch_status(store, batch_id)
+    return batch_status
 
 @router.get("/", response_model=List[FileUploadResponse])
-async def list_uploads(supabase = Depends(get_supabase)):
-    response = supabase.table("file_uploads").select("*").execute()
-    return [FileUploadResponse(**upload) for upload in response.data]
+async def list_uploads(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    organization_id: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    output_format: str = Query("json", alias="format", description="'json' for one page, 'ndjson' to stream every matching row"),
+    store: AsyncStore = Depends(get_store)
+):
+    """Newest uploads first, paginated with keyset cursors."""
+    filters = []
+    if status:
+        filters.append(("status", "eq", status))
+    if user_id:
+        filters.append(("user_id", "eq", user_id))
+    if organization_id:
+        filters.append(("organization_id", "eq", organization_id))
+    if batch_id:
+        filters.append(("batch_id", "eq", batch_id))
+    if uploaded_after:
+        filters.append(("upload_timestamp", "gte", uploaded_after.isoformat()))
+    if uploaded_before:
+        filters.append(("upload_timestamp", "lt", uploaded_before.isoformat()))
+    query = KeysetQuery(
+        store, "file_uploads", FileUploadResponse,
+        order=[("upload_timestamp", True), ("id", True)],
+        filters=filters,
+        fields=parse_fields(fields, list(FileUploadResponse.model_fields)),
+    )
+    return await query.response(limit, cursor, output_format)
+
+@router.get("/{file_id}/text", response_model=TextRange)
+async def get_text(
+    file_id: str,
+    start: int = Query(0, ge=0, description="First character"),
+    end: Optional[int] = Query(None, ge=0, description="Character after the last one (default: the end)"),
+    first_page: Optional[int] = Query(None, ge=1, description="First page (1-based); overrides start and end"),
+    last_page: Optional[int] = Query(None, ge=1, description="Last page (default: first_page); needs first_page"),
+    store: AsyncStore = Depends(get_store)
+):
+    """
+    A character or page range of a processed file's extracted text. At most
+    TEXT_RANGE_MAX_CHARS characters are returned; `end` tells where the
+    returned text stops.
+    """
+    if last_page is not None and first_page is None:
+        raise HTTPException(status_code=400, detail="last_page requires first_page")
+    content = await run_in_threadpool(text_store.get_content, store.store, file_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="No extracted text for this file")
+    length = text_store.text_length(content)
+    if first_page is not None:
+        try:
+            start, end = text_store.page_range(content, first_page, last_page or first_page)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    end = min(length if end is None else end, length, start + settings.TEXT_RANGE_MAX_CHARS)
+    end = max(start, end)
+    text = await run_in_threadpool(text_store.read_range, store.store, content, start, end)
+    spans = content.get("page_spans")
+    return TextRange(file_id=file_id, start=start, end=start + len(text), text_length=length,
+                     page_count=len(spans) if spans else None, text=text)
 
 @router.delete("/{file_id}")
-async def delete_upload(file_id: str, supabase = Depends(get_supabase)):
-    file_response = supabase.table("file_uploads").select("*").eq("id", file_id).execute()
-    if not file_response.data:
+async def delete_upload(file_id: str, store: AsyncStore = Depends(get_store)):
+    rows = await store.select("file_uploads", filters=[("id", "eq", file_id)])
+    if not rows:
         raise HTTPException(status_code=404, detail="File not found")
-    file_record = file_response.data[0]
+    file_record = rows[0]
     try:
         # Delete from storage
-        supabase.storage.from_("uploads").remove([f"uploads/{file_record['filename']}"])
+        await store.remove_storage_objects("uploads", [f"uploads/{file_record['filename']}"])
         # Delete from database
-        supabase.table("file_uploads").delete().eq("id", file_id).execute()
+        await store.delete("file_uploads", [("id", "eq", file_id)])
+        await run_in_threadpool(get_search_index().remove_document, file_id)
+        await run_in_threadpool(get_keyword_index().remove_file, file_id)
+        await run_in_threadpool(get_near_duplicate_index().remove, file_id)
+        await run_in_threadpool(get_related_index().remove, file_id)
         return {"message": "File deleted successfully"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
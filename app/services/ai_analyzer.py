@@ -1,69 +1,423 @@
 import os
+import re
+import json
+import asyncio
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
 from dotenv import load_dotenv
-from openai import OpenAI, APIError
+
+from app.config import settings
+from app.metrics import truncate
+from app.services.analysis_cache import cache_key, get_analysis_cache
+from app.services.job_queue import PRIORITY_INTERACTIVE
+from app.services.llm_scheduler import LLMScheduler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 # Load environment variables from .env
 load_dotenv()
 
-# The OpenAI client will automatically use the OPENAI_API_KEY from the environment
-client = OpenAI()
+logger = logging.getLogger(__name__)
+
+MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# Bump whenever the instructions below change; cached results are keyed on it
+PROMPT_VERSION = os.getenv("ANALYSIS_PROMPT_VERSION", "1")
+REQUEST_PARAMS = {"max_tokens": 512, "temperature": 0.5}
+# Long texts are split into chunks of at most this many tokens, which leaves
+# room in gpt-3.5-turbo's 4k context for the instructions and the reply.
+CHUNK_TOKENS = int(os.getenv("OPENAI_CHUNK_TOKENS", 2500))
+# Maximum number of chat completion requests in flight for one document
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 8))
+MAX_KEYWORDS = 7
+# For estimate_usage(): typical length of a reply, and the tokens the chat
+# format adds to each request besides the instructions and the text
+ESTIMATED_REPLY_TOKENS = 150
+MESSAGE_OVERHEAD_TOKENS = 20
+
+ANALYSIS_INSTRUCTIONS = (
+    "You are an expert document analyst. "
+    "Given the following text, do two things:\n"
+    "1. Generate a concise summary of the text.\n"
+    "2. Extract a list of the 5-7 most important keywords or key phrases from the text.\n"
+    "Return your response as a JSON object with two fields: 'summary' (string) and 'keywords' (list of strings).\n"
+)
+
+PACKED_INSTRUCTIONS = (
+    "You are an expert document analyst. "
+    "The following are several independent documents, each introduced by a line '### Document <number>'. "
+    "For each document separately, do two things:\n"
+    "1. Generate a concise summary of the document.\n"
+    "2. Extract a list of the 5-7 most important keywords or key phrases from the document.\n"
+    "Return your response as a JSON object with one field: 'results', a list with one object per document, "
+    "in order, each with the fields 'document' (its number), 'summary' (string) and 'keywords' (list of strings).\n"
+)
+# Completion tokens allowed per document of a packed request
+PACKED_TOKENS_PER_DOCUMENT = 160
+
+COMBINE_INSTRUCTIONS = (
+    "You are an expert document analyst. "
+    "The following are summaries of consecutive parts of one document. "
+    "Combine them into a single concise summary of the whole document.\n"
+    "Return your response as a JSON object with one field: 'summary' (string).\n"
+)
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # Loaded on first use: only processes that analyse text pay for the vocabulary
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(MODEL)
+    except Exception:
+        # tiktoken is missing or cannot fetch its vocabulary (offline): estimate instead
+        return None
+
+
+def create_client() -> "AsyncOpenAI":
+    # The SDK is imported here rather than at module level, so API processes
+    # that only enqueue work never load it. Retries are left to the scheduler.
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(max_retries=0)
+
+
+_scheduler = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        # Looked up on every call so that tests and benchmarks can swap create_client
+        _scheduler = LLMScheduler(client_factory=lambda: create_client())
+    return _scheduler
+
+
+def count_tokens(text: str) -> int:
+    _encoding = _get_encoding()
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Roughly 4 characters per token for English prose
+    return (len(text) + 3) // 4
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    _encoding = _get_encoding()
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        return [_encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+    step = max_tokens * 4
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
 
-def analyze_text_with_openai(text_content: str) -> dict:
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
     """
-    Analyzes the given text using OpenAI's chat completion API (v1+ syntax).
-    Returns a dictionary with a summary and a list of keywords.
+    Splits text into chunks of at most `max_tokens` tokens, breaking on
+    paragraph boundaries where possible.
     """
-    prompt = (
-        "You are an expert document analyst. "
-        "Given the following text, do two things:\n"
-        "1. Generate a concise summary of the text.\n"
-        "2. Extract a list of the 5-7 most important keywords or key phrases from the text.\n"
-        "Return your response as a JSON object with two fields: 'summary' (string) and 'keywords' (list of strings).\n"
-        f"\nText to analyze:\n{text_content}"
-    )
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            pieces = _split_oversized(paragraph, max_tokens)
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _result(summary, keywords) -> dict:
+    if isinstance(keywords, str):
+        keywords = [k.strip() for k in keywords.split(",") if k.strip()]
+    return {
+        "summary": summary,
+        "keywords": keywords
+    }
+
+
+def _parse_reply(reply: str) -> dict:
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=512,
-            temperature=0.5,
-        )
-        reply = response.choices[0].message.content
-        import json
+        result = json.loads(reply)
+        summary = result.get("summary", "")
+        keywords = result.get("keywords", [])
+    except Exception:
+        # Fallback: try to extract summary and keywords from plain text
+        summary = ""
+        keywords = []
+        lines = reply.splitlines()
+        for line in lines:
+            if line.lower().startswith("summary"):
+                summary = line.split(":", 1)[-1].strip()
+            elif line.lower().startswith("keywords"):
+                kw_str = line.split(":", 1)[-1].strip()
+                keywords = [k.strip() for k in kw_str.split(",") if k.strip()]
+    return _result(summary, keywords)
+
+
+def _split_packed_reply(reply: str, count: int) -> Dict[int, dict]:
+    """{document number: result} for the documents a packed reply got right; the others are left out."""
+    try:
+        data = json.loads(reply)
+    except Exception:
+        return {}
+    items = data.get("results") if isinstance(data, dict) else data
+    results = {}
+    for position, item in enumerate(items if isinstance(items, list) else [], start=1):
+        if not isinstance(item, dict) or not item.get("summary"):
+            continue
         try:
-            result = json.loads(reply)
-            summary = result.get("summary", "")
-            keywords = result.get("keywords", [])
-        except Exception:
-            # Fallback: try to extract summary and keywords from plain text
-            summary = ""
-            keywords = []
-            lines = reply.splitlines()
-            for line in lines:
-                if line.lower().startswith("summary"):
-                    summary = line.split(":", 1)[-1].strip()
-                elif line.lower().startswith("keywords"):
-                    kw_str = line.split(":", 1)[-1].strip()
-                    keywords = [k.strip() for k in kw_str.split(",") if k.strip()]
-        return {
+            number = int(item.get("document", position))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count:
+            results[number] = _result(item["summary"], item.get("keywords", []))
+    return results
+
+
+def merge_keywords(keyword_lists: List[List[str]], limit: int = MAX_KEYWORDS) -> List[str]:
+    """
+    Deduplicates keywords case- and whitespace-insensitively and keeps the ones
+    mentioned by the most chunks (first mention wins ties and spelling).
+    """
+    counts = Counter()
+    spelling = {}
+    for keywords in keyword_lists:
+        for keyword in keywords:
+            key = " ".join(str(keyword).lower().split())
+            if not key:
+                continue
+            counts[key] += 1
+            spelling.setdefault(key, str(keyword).strip())
+    order = {key: index for index, key in enumerate(spelling)}
+    ranked = sorted(counts, key=lambda key: (-counts[key], order[key]))
+    return [spelling[key] for key in ranked[:limit]]
+
+
+def _prompt(instructions: str, label: str, body: str) -> str:
+    return f"{instructions}\n{label}:\n{body}"
+
+
+async def _request(prompt: str, prompt_tokens: int, priority: int, **params) -> str:
+    """One chat completion through the scheduler; returns the reply text. Runs on the scheduler's loop."""
+    response = await get_scheduler().complete(
+        [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        MODEL, priority, prompt_tokens, **{**REQUEST_PARAMS, **params},
+    )
+    return response.choices[0].message.content
+
+
+class _Packer:
+    """
+    Collects short texts to analyse that arrive within OPENAI_PACK_WINDOW of
+    each other (from any document being analysed in this process) and sends
+    them as one request, splitting the structured reply. Texts the reply does
+    not cover are analysed on their own. Lives on the scheduler's loop.
+    Resolves to (result, whether it came from a packed reply).
+    """
+
+    def __init__(self):
+        # priority -> [(body, tokens, future)] waiting to be sent
+        self.groups = {}
+
+    async def analyze(self, body: str, tokens: int, priority: int) -> Tuple[dict, bool]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        group = self.groups.get(priority)
+        if group and sum(t for _, t, _ in group) + tokens > CHUNK_TOKENS:
+            self._flush(priority, group)
+            group = None
+        if group is None:
+            group = self.groups[priority] = []
+            loop.call_later(settings.OPENAI_PACK_WINDOW, self._flush, priority, group)
+        group.append((body, tokens, future))
+        if len(group) >= settings.OPENAI_PACK_MAX_DOCUMENTS:
+            self._flush(priority, group)
+        return await future
+
+    def _flush(self, priority: int, group: list):
+        if self.groups.get(priority) is not group:
+            return  # already sent
+        del self.groups[priority]
+        asyncio.ensure_future(self._send(priority, group))
+
+    async def _send(self, priority: int, group: list):
+        results = {}
+        if len(group) > 1:
+            documents = "\n\n".join(f"### Document {number}\n{body}" for number, (body, _, _) in enumerate(group, 1))
+            prompt = _prompt(PACKED_INSTRUCTIONS, "Documents", documents)
+            try:
+                reply = await _request(prompt, count_tokens(prompt), priority,
+                                       max_tokens=PACKED_TOKENS_PER_DOCUMENT * len(group) + 100)
+                results = _split_packed_reply(reply, len(group))
+            except Exception as e:
+                logger.warning(f"Packed analysis of {len(group)} texts failed, analysing them one by one: {truncate(e)}")
+            if len(results) < len(group):
+                logger.info(f"Packed reply covered {len(results)} of {len(group)} texts")
+        for number, (body, _, future) in enumerate(group, 1):
+            if number in results:
+                future.set_result((results[number], True))
+            else:
+                asyncio.ensure_future(self._send_one(body, priority, future))
+
+    async def _send_one(self, body: str, priority: int, future: asyncio.Future):
+        prompt = _prompt(ANALYSIS_INSTRUCTIONS, "Text to analyze", body)
+        try:
+            future.set_result((_parse_reply(await _request(prompt, count_tokens(prompt), priority)), False))
+        except Exception as e:
+            future.set_exception(e)
+
+
+_packer = None
+
+
+def _get_packer() -> _Packer:
+    global _packer
+    if _packer is None:
+        _packer = _Packer()
+    return _packer
+
+
+async def _analyze_packed(body: str, tokens: int, priority: int) -> Tuple[dict, bool]:
+    # The packer is only ever touched from the scheduler's loop
+    return await _get_packer().analyze(body, tokens, priority)
+
+
+async def _complete(semaphore: asyncio.Semaphore, step: str, instructions: str, body: str,
+                    priority: int) -> Tuple[dict, bool]:
+    """
+    One analysis through the cache. Runs on the caller's loop; only the
+    requests themselves are handed to the scheduler's loop. Returns the
+    result and whether it came from a packed reply.
+    """
+    cache = get_analysis_cache()
+    key = cache_key(body, MODEL, PROMPT_VERSION, {"step": step, **REQUEST_PARAMS})
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, False
+    tokens = count_tokens(body) if step == "chunk" and settings.OPENAI_PACK_MAX_DOCUMENTS > 1 else None
+    if tokens is not None and tokens <= settings.OPENAI_PACK_DOCUMENT_TOKENS:
+        # A share of a packed reply is cached apart from replies about the text alone
+        packed_key = cache_key(body, MODEL, PROMPT_VERSION,
+                               {"step": step, **REQUEST_PARAMS, "max_tokens": PACKED_TOKENS_PER_DOCUMENT, "packed": True})
+        cached = cache.get(packed_key)
+        if cached is not None:
+            return cached, True
+        result, packed = await get_scheduler().on_loop(_analyze_packed(body, tokens, priority))
+        cache.put(packed_key if packed else key, PROMPT_VERSION, result)
+        return result, packed
+    prompt = _prompt(instructions, "Summaries" if step == "combine" else "Text to analyze", body)
+    tokens = count_tokens(prompt)
+    async with semaphore:
+        result = _parse_reply(await get_scheduler().on_loop(_request(prompt, tokens, priority)))
+    cache.put(key, PROMPT_VERSION, result)
+    return result, False
+
+
+async def _combine_summaries(semaphore: asyncio.Semaphore, summaries: List[str], priority: int) -> str:
+    # Reduce in groups that fit in one request, level by level, until one summary is left
+    while len(summaries) > 1:
+        groups = chunk_text("\n\n".join(summaries), CHUNK_TOKENS)
+        if len(groups) >= len(summaries):
+            # Summaries are individually too long to be grouped; merge pairwise instead
+            groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        results = await asyncio.gather(*[
+            _complete(semaphore, "combine", COMBINE_INSTRUCTIONS, group, priority) for group in groups
+        ])
+        summaries = [result["summary"] for result, _ in results]
+    return summaries[0] if summaries else ""
+
+
+async def analyze_text_async(text_content: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """
+    Map-reduce analysis: the text is split into token-bounded chunks that are
+    analysed concurrently (at most MAX_CONCURRENCY requests at a time), then the
+    chunk summaries are combined and the keywords deduplicated.
+    Whole-document and per-chunk results are cached, so re-analysing known
+    text (or the unchanged parts of an edited document) skips those requests.
+    Runs on the caller's event loop, which does the chunking, hashing and
+    cache reads and writes; only the requests go to the scheduler's loop,
+    queued at `priority`. Short chunks may share a request with others.
+    """
+    cache = get_analysis_cache()
+    document_key = cache_key(text_content, MODEL, PROMPT_VERSION, {"step": "document", "chunk_tokens": CHUNK_TOKENS})
+    cached = cache.get(document_key)
+    if cached is not None:
+        return cached
+    chunks = chunk_text(text_content) or [""]
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    completed = await asyncio.gather(*[
+        _complete(semaphore, "chunk", ANALYSIS_INSTRUCTIONS, chunk, priority) for chunk in chunks
+    ])
+    results = [result for result, _ in completed]
+    if len(results) == 1:
+        result = results[0]
+    else:
+        logger.info(f"Analysed {len(chunks)} chunks, combining summaries")
+        summary = await _combine_summaries(semaphore, [r["summary"] for r in results if r["summary"]], priority)
+        result = {
             "summary": summary,
-            "keywords": keywords
-        }
-    except APIError as e:
-        return {
-            "summary": "",
-            "keywords": [],
-            "error": f"OpenAI API error: {e}"
+            "keywords": merge_keywords([r["keywords"] for r in results])
         }
+    if not any(packed for _, packed in completed):
+        # Otherwise it is found again through the packed replies' own entries
+        cache.put(document_key, PROMPT_VERSION, result)
+    return result
+
+
+def analyze_text_with_openai(text_content: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """
+    Analyzes the given text using OpenAI's chat completion API (v1+ syntax).
+    Returns a dictionary with a summary and a list of keywords. Safe to call
+    from many threads at once: they share the process's LLMScheduler.
+    """
+    try:
+        return asyncio.run(analyze_text_async(text_content, priority))
     except Exception as e:
+        from openai import APIError
         return {
             "summary": "",
             "keywords": [],
-            "error": str(e)
+            "error": f"OpenAI API error: {truncate(e, 500)}" if isinstance(e, APIError) else truncate(e, 500)
         }
 
-# Note: For very long texts that may exceed OpenAI's token limits, consider splitting the text into smaller chunks,
-# summarizing each chunk, and then summarizing the summaries. This can be implemented as a future improvement. 
\ No newline at end of file
+
+def estimate_usage(text_content: str, reply_tokens: int = ESTIMATED_REPLY_TOKENS) -> dict:
+    """
+    Requests and tokens that analysing `text_content` from scratch would take,
+    following the same chunking and combining as analyze_text_async and
+    assuming replies of `reply_tokens`. Packing and the cache are ignored,
+    so this is an upper estimate.
+    """
+    chunks = chunk_text(text_content) or [""]
+    overhead = count_tokens(ANALYSIS_INSTRUCTIONS) + MESSAGE_OVERHEAD_TOKENS
+    requests = len(chunks)
+    prompt_tokens = sum(count_tokens(chunk) for chunk in chunks) + overhead * len(chunks)
+    completion_tokens = reply_tokens * len(chunks)
+    summaries = len(chunks)
+    combine_overhead = count_tokens(COMBINE_INSTRUCTIONS) + MESSAGE_OVERHEAD_TOKENS
+    while summaries > 1:
+        groups = max(1, -(-summaries * reply_tokens // CHUNK_TOKENS))
+        if groups >= summaries:
+            groups = -(-summaries // 2)
+        requests += groups
+        prompt_tokens += summaries * reply_tokens + combine_overhead * groups
+        completion_tokens += reply_tokens * groups
+        summaries = groups
+    return {"requests": requests, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
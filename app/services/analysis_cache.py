@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    prompt_version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_cache_version_idx ON analysis_cache (prompt_version);
+CREATE INDEX IF NOT EXISTS analysis_cache_access_idx ON analysis_cache (last_access);
+-- Running total of analysis_cache.size, kept by the triggers below so that
+-- eviction does not have to sum the table on every put
+CREATE TABLE IF NOT EXISTS analysis_cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_size INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS analysis_cache_size_insert AFTER INSERT ON analysis_cache BEGIN
+    UPDATE analysis_cache_meta SET total_size = total_size + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS analysis_cache_size_update AFTER UPDATE OF size ON analysis_cache BEGIN
+    UPDATE analysis_cache_meta SET total_size = total_size + NEW.size - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS analysis_cache_size_delete AFTER DELETE ON analysis_cache BEGIN
+    UPDATE analysis_cache_meta SET total_size = total_size - OLD.size WHERE id = 1;
+END;
+-- Seeded once, for cache files written before the total was kept
+INSERT OR IGNORE INTO analysis_cache_meta (id, total_size)
+    SELECT 1, COALESCE(SUM(size), 0) FROM analysis_cache;
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Text that only differs in Unicode form or whitespace gets the same key."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text: str, model: str, prompt_version: str, params: dict) -> str:
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    material = json.dumps([text_hash, model, prompt_version, params], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for model outputs: an in-memory LRU in front of a SQLite
+    file shared by every process on the host. The disk tier is kept under
+    `max_bytes` by evicting the least recently used entries.
+    """
+
+    def __init__(self, path: str = None, memory_entries: int = None, max_bytes: int = None):
+        self.path = path or settings.ANALYSIS_CACHE_PATH
+        self.memory_entries = memory_entries if memory_entries is not None else settings.ANALYSIS_CACHE_MEMORY_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ANALYSIS_CACHE_MAX_BYTES
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # One transaction: no entry may be written between the triggers and the seed
+            conn.executescript(f"BEGIN IMMEDIATE;{SCHEMA}COMMIT;")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key: str, prompt_version: str, value: dict):
+        with self._lock:
+            self._memory[key] = (prompt_version, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[1]
+        with self._connect() as conn:
+            row = conn.execute("SELECT prompt_version, value FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        value = json.loads(row[1])
+        self._remember(key, row[0], value)
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, prompt_version: str, value: dict):
+        data = json.dumps(value)
+        now = time.time()
+        with self._connect() as conn:
+            # An upsert rather than INSERT OR REPLACE: a replaced row fires no delete trigger
+            conn.execute(
+                "INSERT INTO analysis_cache (key, prompt_version, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET prompt_version = excluded.prompt_version, "
+                "value = excluded.value, size = excluded.size, created_at = excluded.created_at, "
+                "last_access = excluded.last_access",
+                (key, prompt_version, data, len(data), now, now),
+            )
+            self._evict(conn)
+        self._remember(key, prompt_version, value)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT total_size FROM analysis_cache_meta WHERE id = 1").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Free down to 90% so that eviction does not run on every insert
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM analysis_cache ORDER BY last_access"):
+            keys.append(key)
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM analysis_cache WHERE key = ?", [(key,) for key in keys])
+        with self._lock:
+            self.evictions += len(keys)
+            for key in keys:
+                self._memory.pop(key, None)
+
+    def invalidate_prompt_version(self, prompt_version: str) -> int:
+        """Drops every entry produced under `prompt_version`. Returns the number of disk entries removed."""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM analysis_cache WHERE prompt_version = ?", (prompt_version,))
+        with self._lock:
+            for key in [k for k, (version, _) in self._memory.items() if version == prompt_version]:
+                del self._memory[key]
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+            }
+
+    def size(self) -> int:
+        """Bytes held by the disk tier."""
+        with self._connect() as conn:
+            return conn.execute("SELECT total_size FROM analysis_cache_meta WHERE id = 1").fetchone()[0]
+
+
+_cache = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    global _cache
+    if _cache is None:
+        _cache = AnalysisCache()
+    return _cache
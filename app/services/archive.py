@@ -0,0 +1,89 @@
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# Archives accepted by POST /uploads/batch. Their entries are read one at a
+# time straight out of the uploaded archive; nothing is unpacked up front.
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# Files that archiving tools add alongside the real content
+_IGNORED_NAMES = {".DS_Store", "Thumbs.db", "desktop.ini"}
+
+
+class ArchiveError(ValueError):
+    """The archive is unreadable, or expands to more than it is allowed to."""
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _ignored(path: str) -> bool:
+    parts = path.replace("\\", "/").split("/")
+    return parts[0] == "__MACOSX" or parts[-1] in _IGNORED_NAMES or parts[-1].startswith("._")
+
+
+class _BoundedReader:
+    """
+    Counts the bytes actually read from an entry against the archive's budget:
+    the sizes recorded in an archive's headers can be forged.
+    """
+
+    def __init__(self, stream: BinaryIO, budget: list, max_expanded_size: int):
+        self.stream = stream
+        self.budget = budget
+        self.max_expanded_size = max_expanded_size
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.budget[0] += len(chunk)
+        if self.budget[0] > self.max_expanded_size:
+            raise ArchiveError(f"Archive expands to more than {self.max_expanded_size} bytes")
+        return chunk
+
+
+def iter_archive(fileobj: BinaryIO, filename: str, max_entries: int,
+                 max_expanded_size: int) -> Iterator[Tuple[str, Optional[BinaryIO]]]:
+    """
+    Yields (name, stream) for each regular file in a ZIP or TAR archive, in
+    archive order. A stream is only valid until the next entry is requested,
+    and is None for an entry that cannot be decrypted or decompressed.
+    Directories, links and OS metadata files are left out. Raises ArchiveError
+    if the archive is corrupt, has more than `max_entries` files or expands to
+    more than `max_expanded_size` bytes; entries yielded before that are unaffected.
+    """
+    budget = [0]
+    count = 0
+    try:
+        if filename.lower().endswith(".zip"):
+            # ZIP keeps its directory at the end, so it needs a seekable file
+            # (an UploadFile is spooled to disk); each entry is still decompressed
+            # as it is read.
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or _ignored(info.filename):
+                        continue
+                    count += 1
+                    if count > max_entries:
+                        raise ArchiveError(f"Archive has more than {max_entries} files")
+                    try:
+                        stream = archive.open(info)
+                    except (RuntimeError, NotImplementedError):
+                        # Encrypted, or compressed with a method zipfile lacks
+                        yield info.filename, None
+                        continue
+                    with stream:
+                        yield info.filename, _BoundedReader(stream, budget, max_expanded_size)
+        else:
+            # "r|*" reads the (possibly compressed) tar strictly front to back
+            with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile() or _ignored(member.name):
+                        continue
+                    count += 1
+                    if count > max_entries:
+                        raise ArchiveError(f"Archive has more than {max_entries} files")
+                    yield member.name, _BoundedReader(archive.extractfile(member), budget, max_expanded_size)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        raise ArchiveError(f"Could not read archive '{os.path.basename(filename)}': {e}")
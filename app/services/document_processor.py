@@ -1,69 +1,259 @@
 import os
-from typing import Optional
+import sys
+import time
+import logging
+import resource
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-import PyPDF2
-import docx
-from pdf2image import convert_from_path
-import pytesseract
+from app.config import settings
+from app.metrics import timed_step
+from app.services.extraction_cache import get_extraction_cache, join_pages
+from app.services.events import report_progress
+from app.services.extractors import EXTRACTORS, register, resolve
 
-def extract_text_from_file(file_path: str, original_filename: str) -> str:
+logger = logging.getLogger(__name__)
+
+# PDF is registered here next to its OCR machinery; the other formats live in
+# app.services.extractors.
+@register("pdf", 2, extensions=(".pdf",), mime_types=("application/pdf",))
+def _iter_pdf_pages(file_path: str) -> Iterator[str]:
+    yield from _extract_pdf_pages(file_path)[0]
+
+# Version of every registered extractor; cached extractions made by other
+# versions of an extractor are ignored and purged.
+EXTRACTOR_VERSIONS = {name: extractor.version for name, extractor in EXTRACTORS.items()}
+
+def extractor_for(file_path: str, sniff: bool = True) -> Optional[str]:
+    """Name of the extractor for a file (see extractors.resolve), or None if its type is unsupported."""
+    extractor = resolve(file_path, sniff=sniff)
+    return extractor.name if extractor else None
+
+def extract_text_from_file(file_path: str, original_filename: str, content_hash: Optional[str] = None) -> str:
     """
-    Extract text from a PDF or DOCX file. Uses OCR fallback for PDFs if needed.
+    Extract text from any supported file (PDF, Word, PowerPoint, Excel, CSV,
+    Markdown, plain text). Uses OCR fallback for PDFs if needed.
     Args:
         file_path (str): The path to the file on disk.
-        original_filename (str): The original filename (for logging or future use).
+        original_filename (str): The original filename, whose extension is used when the content is not conclusive.
+        content_hash (str, optional): SHA-256 of the file; enables the extraction cache.
     Returns:
         str: The extracted text.
     Raises:
         ValueError: If the file type is unsupported or extraction fails.
     """
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lower()
+    text, _ = join_pages(extract_pages_from_file(file_path, original_filename, content_hash))
+    return text
 
+def iter_pages_from_file(file_path: str, original_filename: str) -> Iterator[str]:
+    """
+    Yields the text units of a file (pages, slides, sheets or sections) as
+    they are read, without going through the extraction cache.
+    """
+    extractor = resolve(file_path, original_filename)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type for '{original_filename}': {os.path.splitext(original_filename)[1]}")
     try:
-        if ext == ".pdf":
-            text = _extract_text_from_pdf(file_path)
-            if not text.strip():
-                # Fallback to OCR if PyPDF2 extraction is empty
-                text = _extract_text_from_pdf_ocr(file_path)
-            return text
-        elif ext == ".docx":
-            return _extract_text_from_docx(file_path)
-        else:
-            raise ValueError(f"Unsupported file type for '{original_filename}': {ext}")
+        yield from extractor.iter_units(file_path)
     except Exception as e:
         raise ValueError(f"Failed to extract text from '{original_filename}': {e}")
 
-def _extract_text_from_pdf(file_path: str) -> str:
-    text = []
+def extract_pages_from_file(file_path: str, original_filename: str, content_hash: Optional[str] = None) -> List[str]:
+    """
+    Like extract_text_from_file, but returns the text of each unit (page,
+    slide, sheet or section) separately. With a content_hash, results are
+    served from and stored in the extraction cache.
+    """
+    extractor = resolve(file_path, original_filename)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type for '{original_filename}': {os.path.splitext(original_filename)[1]}")
+    if content_hash:
+        cached = get_extraction_cache().get_pages(content_hash, extractor.name, extractor.version)
+        if cached is not None:
+            logger.info(f"Serving extracted text of '{original_filename}' from cache")
+            return cached
+
+    complete = True
+    if extractor.name == "pdf":
+        # Times its text layer and OCR steps itself, and tells whether OCR covered every page
+        try:
+            pages, complete = _extract_pdf_pages(file_path)
+        except Exception as e:
+            raise ValueError(f"Failed to extract text from '{original_filename}': {e}")
+    else:
+        with timed_step(f"{extractor.name}_text"):
+            pages = list(iter_pages_from_file(file_path, original_filename))
+
+    # A partial extraction (OCR failed or ran out of budget) is not cached, so
+    # that a retry or a re-upload gets another chance at the missing pages
+    if content_hash and complete:
+        get_extraction_cache().put_pages(content_hash, extractor.name, extractor.version, pages)
+    elif content_hash:
+        logger.info(f"Not caching the extracted text of '{original_filename}': some pages were not recognised")
+    return pages
+
+def get_cached_pages(content_hash: str, file_path: str, original_filename: str) -> Optional[List[str]]:
+    """The pages of an already extracted file, or None if it is not cached. The file itself need not exist."""
+    extractor = resolve(file_path, original_filename)
+    if extractor is None or not content_hash:
+        return None
+    return get_extraction_cache().get_pages(content_hash, extractor.name, extractor.version)
+
+def get_cached_page_range(content_hash: str, file_path: str, first_page: int, last_page: int) -> Optional[Dict[int, str]]:
+    """Pages first_page..last_page (1-based, inclusive) of an already extracted file, or None if it is not cached."""
+    extractor = resolve(file_path)
+    if extractor is None:
+        return None
+    return get_extraction_cache().get_page_range(content_hash, extractor.name, extractor.version, first_page, last_page)
+
+# PyPDF2, pdf2image and pytesseract are imported inside the
+# functions that use them: only worker processes that extract text load them.
+
+def _extract_pdf_text_layer(file_path: str) -> List[str]:
+    import PyPDF2
+    pages = []
     try:
         with open(file_path, "rb") as f:
             reader = PyPDF2.PdfReader(f)
             for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text.append(page_text)
+                pages.append(page.extract_text() or "")
     except Exception as e:
         raise ValueError(f"Error reading PDF file: {e}")
-    return "\n".join(text)
+    return pages
 
-def _extract_text_from_pdf_ocr(file_path: str) -> str:
+def _has_usable_text(page_text: str) -> bool:
+    """False for pages without a text layer or whose text is mostly not words (e.g. a broken font encoding)."""
+    chars = [c for c in page_text if not c.isspace()]
+    if len(chars) < settings.OCR_MIN_PAGE_CHARS:
+        return False
+    if page_text.count("\ufffd") + page_text.count("(cid:") * 6 > len(chars) * 0.1:
+        return False
+    return sum(c.isalnum() for c in chars) / len(chars) >= 0.5
+
+def _extract_pdf_pages(file_path: str) -> Tuple[List[str], bool]:
+    """
+    Returns the text of every page of a PDF, and whether every page that
+    needed OCR got it. Pages with a usable text layer are read with PyPDF2;
+    only the remaining ones are OCR'd, within the optional OCR_MAX_PAGES /
+    OCR_TIME_BUDGET limits. Pages left out by the budget, or by an OCR
+    failure, keep whatever text layer they had; a ValueError is raised only
+    if OCR fails and no page has any text at all.
+    """
     try:
-        images = convert_from_path(file_path)
-        text = []
-        for image in images:
-            text.append(pytesseract.image_to_string(image))
-        return "\n".join(text)
+        with timed_step("pdf_text"):
+            pages = _extract_pdf_text_layer(file_path)
+    except ValueError as e:
+        # PyPDF2 could not parse the file at all; poppler may still be able to render it
+        logger.warning(f"{e}; falling back to OCR for every page")
+        from pdf2image import pdfinfo_from_path
+        pages = [""] * pdfinfo_from_path(file_path)["Pages"]
+    to_ocr = [number for number, text in enumerate(pages, start=1) if not _has_usable_text(text)]
+    if not to_ocr:
+        return pages, True
+    budgeted = to_ocr[:settings.OCR_MAX_PAGES] if settings.OCR_MAX_PAGES > 0 else to_ocr
+    deadline = time.monotonic() + settings.OCR_TIME_BUDGET if settings.OCR_TIME_BUDGET > 0 else None
+    try:
+        texts, stats = _ocr_pdf_pages(file_path, budgeted, deadline)
     except Exception as e:
-        raise ValueError(f"Error during OCR extraction: {e}")
+        if not any(text.strip() for text in pages):
+            raise ValueError(f"Error during OCR extraction: {e}")
+        logger.warning(f"OCR of {os.path.basename(file_path)} failed, keeping the text layer of {len(to_ocr)} page(s): {e}")
+        return pages, False
+    if stats["failed_pages"] and not texts and not any(text.strip() for text in pages):
+        raise ValueError("Error during OCR extraction: every page failed")
+    for number, text in texts.items():
+        pages[number - 1] = text
+    logger.info(
+        f"OCR of {os.path.basename(file_path)}: {stats['pages']} of {len(pages)} pages recognised, "
+        f"{len(stats['failed_pages'])} failed, "
+        f"{len(to_ocr) - stats['pages'] - len(stats['failed_pages'])} skipped by budget, in {stats['seconds']:.1f}s "
+        f"({stats['pages_per_sec']:.2f} pages/s), peak RSS {stats['peak_rss_mb']:.0f} MB "
+        f"(largest OCR subprocess over the process lifetime {stats['peak_child_rss_mb']:.0f} MB)"
+    )
+    return pages, stats["pages"] == len(to_ocr)
+
+def _maxrss_mb(who: int) -> float:
+    """Process-lifetime peak RSS of getrusage(who), which is in bytes on macOS and KB elsewhere."""
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
 
-def _extract_text_from_docx(file_path: str) -> str:
-    text = []
+def _current_rss_mb() -> float:
     try:
-        doc = docx.Document(file_path)
-        for para in doc.paragraphs:
-            if para.text:
-                text.append(para.text)
-    except Exception as e:
-        raise ValueError(f"Error reading DOCX file: {e}")
-    return "\n".join(text) 
\ No newline at end of file
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # No procfs: fall back to the process-lifetime peak
+        return _maxrss_mb(resource.RUSAGE_SELF)
+
+def _ocr_page(file_path: str, page_number: int) -> Tuple[str, float]:
+    """Renders and recognises a single page. Returns its text and the RSS measured while its image was alive."""
+    from pdf2image import convert_from_path
+    import pytesseract
+    with timed_step("ocr_render"):
+        images = convert_from_path(
+            file_path,
+            dpi=settings.OCR_DPI,
+            grayscale=settings.OCR_GRAYSCALE,
+            first_page=page_number,
+            last_page=page_number,
+        )
+    try:
+        rss_mb = _current_rss_mb()
+        with timed_step("ocr_recognize"):
+            return "\n".join(pytesseract.image_to_string(image) for image in images), rss_mb
+    finally:
+        for image in images:
+            image.close()
+
+def _ocr_pdf_pages(file_path: str, page_numbers: Iterable[int], deadline: float = None) -> Tuple[Dict[int, str], dict]:
+    """
+    OCRs the given 1-based pages over a pool of OCR_WORKERS threads (pdftoppm and
+    tesseract run as subprocesses, so threads are enough to use every core).
+    At most OCR_MAX_IN_FLIGHT pages are rendered or being recognised at any
+    time, which bounds memory regardless of the document length. No new page
+    is started after `deadline` (a time.monotonic() value). A page that fails
+    is logged and left out of the result, without stopping the others; its
+    number is listed in stats["failed_pages"]. Inside a progress scope, each
+    finished page is reported as OCR progress.
+    Returns ({page_number: text}, stats).
+    """
+    started = time.monotonic()
+    peak_rss_mb = _current_rss_mb()
+    texts = {}
+    failed = []
+    page_numbers = list(page_numbers)
+    pending = iter(page_numbers)
+    in_flight = {}
+    max_in_flight = max(settings.OCR_MAX_IN_FLIGHT, 1)
+    with ThreadPoolExecutor(max_workers=max(settings.OCR_WORKERS, 1), thread_name_prefix="ocr") as executor:
+        while True:
+            while len(in_flight) < max_in_flight and (deadline is None or time.monotonic() < deadline):
+                page_number = next(pending, None)
+                if page_number is None:
+                    break
+                in_flight[executor.submit(_ocr_page, file_path, page_number)] = page_number
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page_number = in_flight.pop(future)
+                try:
+                    texts[page_number], rss_mb = future.result()
+                    peak_rss_mb = max(peak_rss_mb, rss_mb)
+                except Exception as e:
+                    logger.warning(f"OCR of page {page_number} of {os.path.basename(file_path)} failed: {e}")
+                    failed.append(page_number)
+                report_progress("ocr", len(texts) + len(failed), len(page_numbers))
+    seconds = time.monotonic() - started
+    # tesseract / pdftoppm run as child processes: the largest child this
+    # process ever waited for, not only those of this document
+    children_peak_mb = _maxrss_mb(resource.RUSAGE_CHILDREN)
+    stats = {
+        "pages": len(texts),
+        "failed_pages": sorted(failed),
+        "seconds": seconds,
+        "pages_per_sec": len(texts) / seconds if seconds > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "peak_child_rss_mb": children_peak_mb,
+    }
+    return texts, stats
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Processing events for the status streams (GET /events/...). Workers, and the
+# extract stage's child processes, append them to an SQLite log; every API
+# process runs one EventBroker that tails the log and fans new events out to
+# its connected clients, so the database sees one query per poll interval per
+# process, however many clients are listening.
+#
+# Event types:
+#   status    {"status": "processed" | "error", "error"?}    a file reached a final status
+#   stage     {"stage", "state": "started" | "done" | "retry", "attempt"}
+#   progress  {"stage", "step", "done", "total"}            e.g. OCR page 12 of 40
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    file_id TEXT,
+    batch_id TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_file_idx ON events (file_id, id);
+CREATE INDEX IF NOT EXISTS events_batch_idx ON events (batch_id, id);
+CREATE INDEX IF NOT EXISTS events_created_idx ON events (created_at);
+"""
+
+FINAL_STATUSES = ("processed", "error")
+
+
+def _row_to_event(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "type": row["type"],
+        "file_id": row["file_id"],
+        "batch_id": row["batch_id"],
+        "data": json.loads(row["data"]),
+        "created_at": row["created_at"],
+    }
+
+
+class EventLog:
+    """Append-only log of processing events, shared by all processes on the host."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.EVENTS_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def publish(self, type: str, file_id: str = None, batch_id: str = None, **data) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO events (type, file_id, batch_id, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (type, file_id, batch_id, json.dumps(data), time.time()),
+            )
+        return cursor.lastrowid
+
+    def last_id(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def read_after(self, after_id: int, limit: int = 1000) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM events WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+            ).fetchall()
+        return [_row_to_event(row) for row in rows]
+
+    def history(self, after_id: int, file_id: str = None, batch_id: str = None, limit: int = 1000) -> List[dict]:
+        """Events of one file or batch after `after_id`, e.g. to resume from a client's Last-Event-ID."""
+        column, value = ("file_id", file_id) if file_id else ("batch_id", batch_id)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM events WHERE {column} = ? AND id > ? ORDER BY id LIMIT ?", (value, after_id, limit)
+            ).fetchall()
+        return [_row_to_event(row) for row in rows]
+
+    def prune(self, older_than: float = None) -> int:
+        older_than = older_than if older_than is not None else settings.EVENTS_RETENTION
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - older_than,))
+        return cursor.rowcount
+
+
+_log = None
+
+
+def get_event_log() -> EventLog:
+    global _log
+    if _log is None:
+        _log = EventLog()
+    return _log
+
+
+def publish(type: str, file_id: str = None, batch_id: str = None, **data):
+    """Records an event; never raises, since a lost event must not fail the job that emitted it."""
+    try:
+        get_event_log().publish(type, file_id, batch_id, **data)
+    except Exception as e:
+        logger.warning(f"Could not publish {type} event for file {file_id}: {e}")
+
+
+# --- Progress reporting from inside a stage ---
+
+_progress_target: ContextVar[Optional[dict]] = ContextVar("progress_target", default=None)
+
+
+@contextmanager
+def progress_scope(stage: str, file_id: str, batch_id: str = None):
+    """Makes report_progress() calls on this thread publish progress events for the given file."""
+    token = _progress_target.set({"stage": stage, "file_id": file_id, "batch_id": batch_id, "last": 0.0})
+    try:
+        yield
+    finally:
+        _progress_target.reset(token)
+
+
+def report_progress(step: str, done: int, total: int):
+    """
+    Publishes "done of total" for the current progress scope, if any, at most
+    once per EVENTS_PROGRESS_INTERVAL seconds (the last step is always sent).
+    """
+    target = _progress_target.get()
+    if target is None:
+        return
+    now = time.monotonic()
+    if done < total and now - target["last"] < settings.EVENTS_PROGRESS_INTERVAL:
+        return
+    target["last"] = now
+    publish("progress", target["file_id"], target["batch_id"], stage=target["stage"], step=step,
+            done=done, total=total)
+
+
+# --- Fan-out to subscribers in this process ---
+
+class Subscription:
+    """Events for one file or one batch, delivered to an asyncio queue on the subscriber's loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, file_id: str = None, batch_id: str = None):
+        self.loop = loop
+        self.file_id = file_id
+        self.batch_id = batch_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_SUBSCRIBER_QUEUE)
+        # Set when the subscriber fell too far behind and events were dropped
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.file_id is not None:
+            return event["file_id"] == self.file_id
+        return event["batch_id"] == self.batch_id
+
+    def _put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, event: dict):
+        # Called on the broker thread
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # the subscriber's loop is closed
+
+
+class EventBroker:
+    """
+    Tails the event log on a background thread, only while someone is
+    subscribed, and hands each new event to the matching subscriptions.
+    """
+
+    def __init__(self, log: EventLog = None, poll_interval: float = None):
+        self.log = log or get_event_log()
+        self.poll_interval = poll_interval if poll_interval is not None else settings.EVENTS_POLL_INTERVAL
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_id = 0
+
+    def subscribe(self, file_id: str = None, batch_id: str = None) -> Subscription:
+        """Must be called from the subscriber's event loop."""
+        subscription = Subscription(asyncio.get_running_loop(), file_id, batch_id)
+        with self._lock:
+            if not self._subscriptions:
+                # Nobody was listening: start from the current end of the log
+                self._last_id = self.log.last_id()
+            self._subscriptions.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-broker", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._subscriptions
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Error while reading the event log: {e}")
+            time.sleep(self.poll_interval)
+
+    def poll_once(self) -> int:
+        events = self.log.read_after(self._last_id)
+        if not events:
+            return 0
+        self._last_id = events[-1]["id"]
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for event in events:
+            for subscription in subscriptions:
+                if subscription.matches(event):
+                    subscription.deliver(event)
+        return len(events)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = EventBroker()
+    return _broker
@@ -0,0 +1,165 @@
+import os
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# One row per (file, extractor version) plus one row per page, so a page range
+# can be served by reading just those pages.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    page_count INTEGER NOT NULL,
+    char_count INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (file_hash, extractor, extractor_version)
+);
+CREATE TABLE IF NOT EXISTS extraction_pages (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    extractor_version INTEGER NOT NULL,
+    page_number INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (file_hash, extractor, extractor_version, page_number)
+);
+"""
+
+
+def join_pages(pages: List[str]) -> Tuple[str, List[int]]:
+    """
+    Joins page texts the way extract_text_from_file does (empty pages are left
+    out) and returns the text with the character offset each page starts at.
+    """
+    parts = []
+    offsets = []
+    position = 0
+    for page in pages:
+        if page and parts:
+            position += 1  # the newline separating it from the previous page
+        offsets.append(position)
+        if page:
+            parts.append(page)
+            position += len(page)
+    return "\n".join(parts), offsets
+
+
+class ExtractionCache:
+    """Extracted text keyed by the source file's SHA-256 and the version of the extractor that produced it."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.EXTRACTION_CACHE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_pages(self, file_hash: str, extractor: str, version: int) -> Optional[List[str]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT text FROM extraction_pages WHERE file_hash = ? AND extractor = ? AND extractor_version = ? "
+                "ORDER BY page_number",
+                (file_hash, extractor, version),
+            ).fetchall()
+            if not rows:
+                # Either not cached, or cached with zero pages
+                found = conn.execute(
+                    "SELECT 1 FROM extractions WHERE file_hash = ? AND extractor = ? AND extractor_version = ?",
+                    (file_hash, extractor, version),
+                ).fetchone()
+                return [] if found else None
+        return [row[0] for row in rows]
+
+    def get_page_range(self, file_hash: str, extractor: str, version: int,
+                       first_page: int, last_page: int) -> Optional[Dict[int, str]]:
+        """Returns {page_number: text} for the 1-based inclusive range, or None if the file is not cached."""
+        with self._connect() as conn:
+            found = conn.execute(
+                "SELECT page_count FROM extractions WHERE file_hash = ? AND extractor = ? AND extractor_version = ?",
+                (file_hash, extractor, version),
+            ).fetchone()
+            if not found:
+                return None
+            rows = conn.execute(
+                "SELECT page_number, text FROM extraction_pages WHERE file_hash = ? AND extractor = ? "
+                "AND extractor_version = ? AND page_number BETWEEN ? AND ? ORDER BY page_number",
+                (file_hash, extractor, version, first_page, last_page),
+            ).fetchall()
+        return {number: text for number, text in rows}
+
+    def get_offsets(self, file_hash: str, extractor: str, version: int) -> Optional[List[int]]:
+        """Character offset of each page in the joined text, without loading any page text."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT start_offset FROM extraction_pages WHERE file_hash = ? AND extractor = ? "
+                "AND extractor_version = ? ORDER BY page_number",
+                (file_hash, extractor, version),
+            ).fetchall()
+        return [row[0] for row in rows] if rows else None
+
+    def put_pages(self, file_hash: str, extractor: str, version: int, pages: List[str]):
+        text, offsets = join_pages(pages)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM extraction_pages WHERE file_hash = ? AND extractor = ? AND extractor_version = ?",
+                (file_hash, extractor, version),
+            )
+            conn.executemany(
+                "INSERT INTO extraction_pages (file_hash, extractor, extractor_version, page_number, start_offset, text) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_hash, extractor, version, number, offset, page)
+                 for number, (offset, page) in enumerate(zip(offsets, pages), start=1)],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions (file_hash, extractor, extractor_version, page_count, char_count, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_hash, extractor, version, len(pages), len(text), time.time()),
+            )
+            conn.execute("COMMIT")
+
+    def purge_stale(self, current_versions: Dict[str, int]) -> int:
+        """
+        Deletes entries made by an older (or newer) version of an extractor, leaving
+        the entries of every extractor whose version did not change untouched.
+        Returns the number of files removed.
+        """
+        removed = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for extractor, version in current_versions.items():
+                conn.execute(
+                    "DELETE FROM extraction_pages WHERE extractor = ? AND extractor_version != ?",
+                    (extractor, version),
+                )
+                cursor = conn.execute(
+                    "DELETE FROM extractions WHERE extractor = ? AND extractor_version != ?",
+                    (extractor, version),
+                )
+                removed += cursor.rowcount
+            conn.execute("COMMIT")
+        return removed
+
+
+_cache = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
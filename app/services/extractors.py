@@ -0,0 +1,505 @@
+import os
+import re
+import csv
+import codecs
+import zipfile
+import posixpath
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from xml.etree.ElementTree import iterparse
+
+# Text extractors by format. Each one is a generator over a file's text units
+# (pages, slides, sheets or sections, in document order), so that a document
+# is never held as a parsed object model: Office files are read with
+# iterparse straight out of the ZIP container and plain-text formats line by
+# line, freeing what has been consumed as they go.
+#
+# A file is matched by the MIME type sniffed from its first bytes, so that a
+# PDF saved as .txt is still read as a PDF, and otherwise by its extension.
+# Register new formats with @register.
+
+# Units are cut at the next line or paragraph boundary once they reach this
+# many characters, for formats without pages (and Word files that have never
+# been laid out)
+MAX_UNIT_CHARS = 20000
+# Plain text and CSV are cut into units of about a printed page
+TEXT_UNIT_CHARS = 4000
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class Extractor:
+    def __init__(self, name: str, version: int, iter_units: Callable[[str], Iterator[str]],
+                 extensions: Iterable[str], mime_types: Iterable[str], text: bool):
+        self.name = name
+        # Bump whenever the output changes; cached extractions of other versions are then ignored
+        self.version = version
+        self.iter_units = iter_units
+        self.extensions = tuple(extensions)
+        self.mime_types = tuple(mime_types)
+        # A plain-text format, which content sniffing cannot tell apart from the others
+        self.text = text
+
+    def __repr__(self):
+        return f"Extractor({self.name!r}, version={self.version})"
+
+
+EXTRACTORS: Dict[str, Extractor] = {}
+_by_extension: Dict[str, Extractor] = {}
+_by_mime: Dict[str, Extractor] = {}
+
+
+def register(name: str, version: int, extensions: Iterable[str] = (), mime_types: Iterable[str] = (),
+             text: bool = False):
+    """Registers the decorated generator function as the extractor `name`."""
+    def decorator(iter_units: Callable[[str], Iterator[str]]):
+        extractor = Extractor(name, version, iter_units, extensions, mime_types, text)
+        EXTRACTORS[name] = extractor
+        for extension in extractor.extensions:
+            _by_extension[extension] = extractor
+        for mime_type in extractor.mime_types:
+            _by_mime[mime_type] = extractor
+        return iter_units
+    return decorator
+
+
+def _extension(filename: str) -> str:
+    return os.path.splitext(filename or "")[1].lower()
+
+
+def _sniff_zip(file_path: str) -> str:
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return "application/zip"
+    if "word/document.xml" in names:
+        return DOCX_MIME
+    if "ppt/presentation.xml" in names:
+        return PPTX_MIME
+    if "xl/workbook.xml" in names:
+        return XLSX_MIME
+    return "application/zip"
+
+
+def sniff_mime(file_path: str) -> Optional[str]:
+    """The MIME type of a file judging by its content, or None if it is not recognised."""
+    with open(file_path, "rb") as f:
+        sample = f.read(8192)
+    if sample.startswith(b"%PDF-"):
+        return "application/pdf"
+    if sample.startswith(b"PK\x03\x04"):
+        return _sniff_zip(file_path)
+    if sample.startswith((codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "text/plain"
+    if b"\0" in sample:
+        return None
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "text/plain"
+    except UnicodeDecodeError:
+        pass
+    # Legacy 8-bit text (e.g. Windows-1252) is mostly printable
+    printable = sum(32 <= byte < 127 or byte in b"\t\r\n" or byte >= 160 for byte in sample)
+    return "text/plain" if sample and printable / len(sample) > 0.95 else None
+
+
+def resolve(file_path: str, filename: str = None, sniff: bool = True) -> Optional[Extractor]:
+    """
+    The extractor for a file: by sniffed content where that is conclusive,
+    otherwise by the extension of `filename` (default: of the path). Without
+    `sniff`, or if the file does not exist, by extension only.
+    """
+    by_extension = _by_extension.get(_extension(filename or file_path))
+    mime = sniff_mime(file_path) if sniff and os.path.isfile(file_path) else None
+    if mime == "text/plain":
+        # All text looks alike; the extension tells CSV or Markdown from plain text
+        return by_extension if by_extension is not None and by_extension.text else EXTRACTORS.get("txt")
+    return _by_mime.get(mime) or by_extension
+
+
+def supported_extensions() -> List[str]:
+    return sorted(_by_extension)
+
+
+# --- Helpers ---
+
+def _local(tag: str) -> str:
+    # Element names without their namespace, which also covers Strict OOXML
+    return tag.rsplit("}", 1)[-1]
+
+
+def _units(lines: Iterable[str], max_chars: int, boundary: Callable[[str, int], bool] = None) -> Iterator[str]:
+    """
+    Groups lines into units of about `max_chars` characters; `boundary(line,
+    size)` may start a new unit before a line (e.g. a Markdown heading).
+    Units with no text are left out.
+    """
+    current, size = [], 0
+    for line in lines:
+        if current and (size >= max_chars or (boundary is not None and boundary(line, size))):
+            text = "\n".join(current)
+            if text.strip():
+                yield text
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    text = "\n".join(current)
+    if text.strip():
+        yield text
+
+
+def _part_path(base: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, tuple]:
+    """{relationship id: (type, part path)} of a part of an OPC package (DOCX, PPTX, XLSX)."""
+    rels = posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+    if rels not in archive.namelist():
+        return {}
+    relationships = {}
+    with archive.open(rels) as f:
+        for _, elem in iterparse(f):
+            if _local(elem.tag) == "Relationship" and elem.get("TargetMode") != "External":
+                relationships[elem.get("Id")] = (elem.get("Type", "").rsplit("/", 1)[-1],
+                                                 _part_path(part, elem.get("Target", "")))
+    return relationships
+
+
+def _relationship_id(elem) -> Optional[str]:
+    for key, value in elem.attrib.items():
+        if _local(key) == "id" and key.startswith("{"):
+            return value
+    return None
+
+
+# --- Plain text, Markdown, CSV ---
+
+def _text_encoding(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        sample = f.read(65536)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _text_lines(file_path: str) -> Iterator[str]:
+    # Undecodable bytes further into the file become U+FFFD rather than failing the extraction
+    with open(file_path, encoding=_text_encoding(file_path), errors="replace", newline="") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+@register("txt", 1, extensions=(".txt", ".text", ".log"), mime_types=("text/plain",), text=True)
+def iter_text_units(file_path: str) -> Iterator[str]:
+    yield from _units(_text_lines(file_path), TEXT_UNIT_CHARS)
+
+
+@register("md", 1, extensions=(".md", ".markdown"), mime_types=("text/markdown",), text=True)
+def iter_markdown_units(file_path: str) -> Iterator[str]:
+    # Sections start at headings, once the current unit has some substance
+    def heading(line: str, size: int) -> bool:
+        return line.startswith("#") and size >= TEXT_UNIT_CHARS // 4
+
+    yield from _units(_text_lines(file_path), TEXT_UNIT_CHARS, heading)
+
+
+@register("csv", 1, extensions=(".csv", ".tsv"), mime_types=("text/csv", "text/tab-separated-values"), text=True)
+def iter_csv_units(file_path: str) -> Iterator[str]:
+    encoding = _text_encoding(file_path)
+    with open(file_path, encoding=encoding, errors="replace", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel_tab if file_path.lower().endswith(".tsv") else csv.excel
+        rows = ("\t".join(cell.strip() for cell in row) for row in csv.reader(f, dialect))
+        yield from _units((row for row in rows if row.strip()), TEXT_UNIT_CHARS)
+
+
+# --- DOCX ---
+
+def _docx_part_units(stream, split_pages: bool) -> Iterator[str]:
+    """
+    Text of one WordprocessingML part (document, header, footnotes...) in
+    bounded memory: each top-level block is dropped from the tree once read.
+    Paragraphs are lines; table rows are lines of tab-separated cells. With
+    `split_pages`, a unit ends at every page break Word rendered or was told
+    to insert, and at section breaks.
+    """
+    lines: List[str] = []
+    size = 0
+    paragraphs: List[List[str]] = []  # open paragraphs (text boxes nest them)
+    rows: List[List[str]] = []  # open table rows (tables nest)
+    cells: List[List[str]] = []  # open table cells
+    in_run = in_fallback = in_deleted = 0
+    depth = 0
+    container = None
+    page_break = False
+
+    def flush():
+        nonlocal lines, size
+        text = "\n".join(line for line in lines if line.strip())
+        lines, size = [], 0
+        return text
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        name = _local(elem.tag)
+        if event == "start":
+            depth += 1
+            if name in ("body", "hdr", "ftr", "footnotes", "endnotes", "comments"):
+                container = elem
+            elif name == "p":
+                paragraphs.append([])
+            elif name == "tr":
+                rows.append([])
+            elif name == "tc":
+                cells.append([])
+            elif name == "r":
+                in_run += 1
+            elif name == "Fallback":
+                # mc:AlternateContent repeats a text box in its fallback; read it once
+                in_fallback += 1
+            elif name in ("del", "moveFrom"):
+                in_deleted += 1
+            continue
+
+        depth -= 1
+        if name == "t" and paragraphs and not in_fallback and not in_deleted:
+            paragraphs[-1].append(elem.text or "")
+        elif name == "tab" and in_run and paragraphs:
+            paragraphs[-1].append("\t")
+        elif name in ("br", "cr") and in_run and paragraphs:
+            if split_pages and elem.get(next((k for k in elem.attrib if _local(k) == "type"), "")) == "page":
+                page_break = True
+            else:
+                paragraphs[-1].append("\n")
+        elif name == "lastRenderedPageBreak" and split_pages and not cells:
+            page_break = True
+        elif name == "sectPr" and split_pages and paragraphs:
+            page_break = True
+        elif name == "r":
+            in_run -= 1
+        elif name == "Fallback":
+            in_fallback -= 1
+        elif name in ("del", "moveFrom"):
+            in_deleted -= 1
+        elif name == "p":
+            text = "".join(paragraphs.pop())
+            if cells:
+                cells[-1].append(text)
+            elif text.strip():
+                lines.append(text)
+                size += len(text) + 1
+        elif name == "tc":
+            cell = " ".join(" ".join(part for part in cells.pop() if part.strip()).split())
+            if rows:
+                rows[-1].append(cell)
+        elif name == "tr":
+            row = "\t".join(rows.pop())
+            if cells:
+                cells[-1].append(row)
+            elif row.strip():
+                lines.append(row)
+                size += len(row) + 1
+
+        if depth == 2 and container is not None and not paragraphs and not cells:
+            # A top-level block is complete: the page ends here if a break was
+            # seen inside it, and its elements are no longer needed
+            container.clear()
+            if (page_break and split_pages) or size >= MAX_UNIT_CHARS:
+                text = flush()
+                if text:
+                    yield text
+            page_break = False
+    text = flush()
+    if text:
+        yield text
+
+
+@register("docx", 2, extensions=(".docx", ".docm"), mime_types=(DOCX_MIME,))
+def iter_docx_units(file_path: str) -> Iterator[str]:
+    """
+    The body page by page (as last laid out by Word), tables included, then
+    the text of the headers and footers (each distinct line once), then the
+    footnotes and endnotes.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        names = archive.namelist()
+        with archive.open("word/document.xml") as f:
+            yield from _docx_part_units(f, split_pages=True)
+        header_lines = {}
+        for name in sorted(n for n in names if re.fullmatch(r"word/(header|footer)\d*\.xml", n)):
+            with archive.open(name) as f:
+                for unit in _docx_part_units(f, split_pages=False):
+                    header_lines.update(dict.fromkeys(unit.splitlines()))
+        if header_lines:
+            yield "\n".join(header_lines)
+        for name in ("word/footnotes.xml", "word/endnotes.xml"):
+            if name in names:
+                with archive.open(name) as f:
+                    yield from _docx_part_units(f, split_pages=False)
+
+
+# --- PPTX ---
+
+def _drawing_lines(archive: zipfile.ZipFile, part: str) -> List[str]:
+    """Paragraphs of DrawingML text (shapes, tables, notes) in a slide-like part."""
+    lines = []
+    paragraph = None
+    with archive.open(part) as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            name = _local(elem.tag)
+            if event == "start":
+                if name == "p":
+                    paragraph = []
+                continue
+            if name == "t" and paragraph is not None:
+                paragraph.append(elem.text or "")
+            elif name == "br" and paragraph is not None:
+                paragraph.append("\n")
+            elif name == "p" and paragraph is not None:
+                text = "".join(paragraph)
+                if text.strip():
+                    lines.append(text)
+                paragraph = None
+                elem.clear()
+    return lines
+
+
+def _pptx_slides(archive: zipfile.ZipFile) -> List[str]:
+    """Slide parts in presentation order."""
+    relationships = _relationships(archive, "ppt/presentation.xml")
+    slides = []
+    with archive.open("ppt/presentation.xml") as f:
+        for _, elem in iterparse(f):
+            if _local(elem.tag) == "sldId":
+                relationship = relationships.get(_relationship_id(elem))
+                if relationship:
+                    slides.append(relationship[1])
+    if not slides:
+        numbered = [n for n in archive.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", n)]
+        slides = sorted(numbered, key=lambda n: int(re.search(r"(\d+)\.xml$", n).group(1)))
+    return [slide for slide in slides if slide in archive.namelist()]
+
+
+@register("pptx", 1, extensions=(".pptx", ".pptm"), mime_types=(PPTX_MIME,))
+def iter_pptx_units(file_path: str) -> Iterator[str]:
+    """One unit per slide: its text, then its speaker notes."""
+    with zipfile.ZipFile(file_path) as archive:
+        for slide in _pptx_slides(archive):
+            lines = _drawing_lines(archive, slide)
+            for kind, part in _relationships(archive, slide).values():
+                if kind == "notesSlide" and part in archive.namelist():
+                    notes = _drawing_lines(archive, part)
+                    if notes:
+                        lines.append("Notes: " + "\n".join(notes))
+            yield "\n".join(lines)
+
+
+# --- XLSX ---
+
+def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    parts, in_phonetic = [], 0
+    with archive.open("xl/sharedStrings.xml") as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            name = _local(elem.tag)
+            if event == "start":
+                if name == "rPh":
+                    in_phonetic += 1
+                continue
+            if name == "rPh":
+                in_phonetic -= 1
+            elif name == "t" and not in_phonetic:
+                parts.append(elem.text or "")
+            elif name == "si":
+                strings.append("".join(parts))
+                parts = []
+                elem.clear()
+    return strings
+
+
+# Columns of a worksheet (A to XFD); a reference beyond them is forged
+XLSX_MAX_COLUMNS = 16384
+
+
+def _column_index(reference: Optional[str]) -> Optional[int]:
+    """0-based column of a cell reference ("C7" -> 2), or None if there is none."""
+    index = 0
+    for char in reference or "":
+        if not "A" <= char <= "Z":
+            break
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1 if index else None
+
+
+def _sheet_rows(archive: zipfile.ZipFile, part: str, strings: List[str]) -> Iterator[str]:
+    sheet_data = None
+    row: List[str] = []
+    with archive.open(part) as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            name = _local(elem.tag)
+            if event == "start":
+                if name == "sheetData":
+                    sheet_data = elem
+                continue
+            if name == "c":
+                kind = elem.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in elem.iter() if _local(t.tag) == "t")
+                else:
+                    value = next((v.text or "" for v in elem if _local(v.tag) == "v"), "")
+                    if kind == "s" and value:
+                        value = strings[int(value)] if int(value) < len(strings) else ""
+                    elif kind == "b":
+                        value = "TRUE" if value == "1" else "FALSE"
+                # Empty cells are left out of the XML; their reference keeps the columns aligned
+                column = _column_index(elem.get("r"))
+                if column is not None and len(row) < column < XLSX_MAX_COLUMNS:
+                    row.extend([""] * (column - len(row)))
+                row.append(value.strip())
+            elif name == "row":
+                if any(row):
+                    yield "\t".join(row).rstrip("\t")
+                row = []
+                # Finished rows are dropped, so a sheet is read in constant memory
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+
+@register("xlsx", 2, extensions=(".xlsx", ".xlsm"), mime_types=(XLSX_MIME,))
+def iter_xlsx_units(file_path: str) -> Iterator[str]:
+    """
+    Each worksheet as lines of tab-separated cell values (formulas as their
+    last computed value), headed by its name and cut into units of about
+    TEXT_UNIT_CHARS characters.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        strings = _shared_strings(archive)
+        relationships = _relationships(archive, "xl/workbook.xml")
+        sheets = []
+        with archive.open("xl/workbook.xml") as f:
+            for _, elem in iterparse(f):
+                if _local(elem.tag) == "sheet":
+                    relationship = relationships.get(_relationship_id(elem))
+                    if relationship:
+                        sheets.append((elem.get("name"), relationship[1]))
+        for sheet_name, part in sheets:
+            if part not in archive.namelist():
+                continue
+            for number, unit in enumerate(_units(_sheet_rows(archive, part, strings), TEXT_UNIT_CHARS)):
+                yield f"Sheet: {sheet_name}\n{unit}" if number == 0 else unit
@@ -0,0 +1,284 @@
+import os
+import json
+import time
+import random
+import socket
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Optional
+
+from app.config import settings
+from app.metrics import truncate
+
+# Job lifecycle: queued -> running -> (queued at the next stage | done | failed).
+# A job moves through the stages of its pipeline one at a time; the output of
+# each finished stage is kept in `state` so a crash resumes at the stage that
+# was interrupted instead of starting over.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    locked_at REAL,
+    locked_by TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (status, stage, priority, available_at);
+CREATE INDEX IF NOT EXISTS jobs_backlog_idx ON jobs (status, priority);
+"""
+
+# Lower values are claimed first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class Job:
+    def __init__(self, row: sqlite3.Row):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.stage = row["stage"]
+        self.status = row["status"]
+        self.payload = json.loads(row["payload"])
+        self.state = json.loads(row["state"])
+        self.priority = row["priority"]
+        self.attempts = row["attempts"]
+        self.max_attempts = row["max_attempts"]
+        self.last_error = row["last_error"]
+
+    def __repr__(self):
+        return f"Job(id={self.id}, kind={self.kind!r}, stage={self.stage!r}, status={self.status!r})"
+
+
+def worker_identity() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    A small durable job queue on top of SQLite. Safe to share between the API
+    processes (which enqueue) and worker processes (which claim), since every
+    state change happens in its own short write transaction.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.JOB_QUEUE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, kind: str, stage: str, payload: dict, priority: int = PRIORITY_INTERACTIVE,
+                max_attempts: int = None) -> int:
+        return self.enqueue_many(kind, stage, [payload], priority, max_attempts)[0]
+
+    def enqueue_many(self, kind: str, stage: str, payloads: List[dict], priority: int = PRIORITY_INTERACTIVE,
+                     max_attempts: int = None) -> List[int]:
+        now = time.time()
+        max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        ids = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for payload in payloads:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (kind, stage, payload, priority, max_attempts, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (kind, stage, json.dumps(payload), priority, max_attempts, now, now, now),
+                )
+                ids.append(cursor.lastrowid)
+            conn.execute("COMMIT")
+        return ids
+
+    def claim(self, stage: str, limit: int) -> List[Job]:
+        """Atomically marks up to `limit` ready jobs of a stage as running and returns them."""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND stage = ? AND available_at <= ? "
+                "ORDER BY priority, available_at, id LIMIT ?",
+                (stage, now, limit),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_at = ?, locked_by = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    [(now, worker_identity(), now, row["id"]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        jobs = [Job(row) for row in rows]
+        for job in jobs:
+            job.status = "running"
+            job.attempts += 1
+        return jobs
+
+    def advance(self, job_id: int, next_stage: str, state: dict):
+        """Stores a finished stage's output and queues the job for its next stage."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, state = ?, status = 'queued', attempts = 0, available_at = ?, "
+                "locked_at = NULL, locked_by = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+                (next_stage, json.dumps(state), now, now, job_id),
+            )
+
+    def renew(self, job_ids: List[int]) -> int:
+        """Extends the leases of running jobs claimed by this process. Returns the number renewed."""
+        if not job_ids:
+            return 0
+        now = time.time()
+        placeholders = ",".join("?" * len(job_ids))
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET locked_at = ?, updated_at = ? WHERE status = 'running' AND locked_by = ? "
+                f"AND id IN ({placeholders})",
+                (now, now, worker_identity(), *job_ids),
+            )
+        return cursor.rowcount
+
+    def release(self, job_id: int):
+        """Returns a claimed job to the queue without counting the attempt (e.g. on shutdown)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), locked_at = NULL, "
+                "locked_by = NULL, updated_at = ? WHERE id = ? AND status = 'running'",
+                (now, job_id),
+            )
+
+    def complete(self, job_id: int):
+        now = time.time()
+        with self._connect() as conn:
+            # The stage outputs are no longer needed once the job is done.
+            conn.execute(
+                "UPDATE jobs SET status = 'done', state = '{}', locked_at = NULL, locked_by = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (now, job_id),
+            )
+
+    def fail(self, job: Job, error: str, retryable: bool = True) -> bool:
+        """
+        Records a failed attempt. Schedules a retry with exponential backoff and
+        jitter while attempts remain; returns False once the job is given up on.
+        """
+        now = time.time()
+        retry = retryable and job.attempts < job.max_attempts
+        error = truncate(error, settings.LOG_MAX_MESSAGE_CHARS)
+        with self._connect() as conn:
+            if retry:
+                delay = settings.JOB_RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+                delay += random.uniform(0, delay / 10)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', available_at = ?, last_error = ?, locked_at = NULL, "
+                    "locked_by = NULL, updated_at = ? WHERE id = ?",
+                    (now + delay, error, now, job.id),
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = ?, locked_at = NULL, locked_by = NULL, "
+                    "updated_at = ? WHERE id = ?",
+                    (error, now, job.id),
+                )
+        return retry
+
+    def recover(self, lease_timeout: float = None) -> int:
+        """
+        Puts jobs that were running when their worker died back in the queue:
+        jobs locked by a process of this host that no longer exists, and any job
+        whose lease is older than `lease_timeout` seconds.
+        """
+        lease_timeout = lease_timeout if lease_timeout is not None else settings.JOB_LEASE_TIMEOUT
+        now = time.time()
+        hostname = socket.gethostname()
+        recovered = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, locked_by, locked_at FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                host, _, pid = (row["locked_by"] or "").rpartition(":")
+                orphaned = host == hostname and pid.isdigit() and not _pid_alive(int(pid))
+                expired = (row["locked_at"] or 0) < now - lease_timeout
+                if orphaned or expired:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', available_at = ?, locked_at = NULL, locked_by = NULL, "
+                        "updated_at = ? WHERE id = ?",
+                        (now, now, row["id"]),
+                    )
+                    recovered += 1
+            conn.execute("COMMIT")
+        return recovered
+
+    def backlog(self, priority: int = None) -> int:
+        """Number of jobs that are waiting or being worked on, optionally of one priority only."""
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        params = ()
+        if priority is not None:
+            query += " AND priority = ?"
+            params = (priority,)
+        with self._connect() as conn:
+            row = conn.execute(query, params).fetchone()
+        return row[0]
+
+    def stats(self) -> dict:
+        """Job counts by stage and status, e.g. {"extract": {"queued": 3, "running": 2}}."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT stage, status, COUNT(*) AS n FROM jobs GROUP BY stage, status").fetchall()
+        result = {}
+        for row in rows:
+            result.setdefault(row["stage"], {})[row["status"]] = row["n"]
+        return result
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row else None
+
+    def prune(self, older_than: float = 7 * 24 * 3600) -> int:
+        """Deletes finished jobs last updated more than `older_than` seconds ago."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("month", "quarter", "year")
+
+# keyword_counts is the materialized aggregate: one row per organization,
+# time bucket and normalized keyword, kept up to date as analyses are stored.
+# `change` is count minus the keyword's count in the previous bucket of the
+# same period, maintained alongside so rising keywords are an index read too.
+# keyword_files remembers what each file contributed so that re-analysing or
+# deleting a file can take its counts back out. Files without an organization
+# are counted under "". Queries without an organization add up the counts of
+# every organization.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keyword_counts (
+    organization_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    change INTEGER NOT NULL,
+    PRIMARY KEY (organization_id, bucket, keyword)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS keyword_counts_top_idx ON keyword_counts (organization_id, bucket, count DESC);
+CREATE INDEX IF NOT EXISTS keyword_counts_rising_idx ON keyword_counts (organization_id, bucket, change DESC);
+CREATE INDEX IF NOT EXISTS keyword_counts_bucket_idx ON keyword_counts (bucket, keyword);
+CREATE TABLE IF NOT EXISTS keyword_files (
+    file_id TEXT PRIMARY KEY,
+    organization_id TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    keywords TEXT NOT NULL
+);
+"""
+
+
+def _stem(word: str) -> str:
+    # Plural and common inflection endings only; enough to fold "Acquisitions"
+    # into "acquisition" without an NLP dependency
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_keyword(keyword: str) -> str:
+    words = re.sub(r"[^\w\s&+-]", " ", str(keyword).lower()).split()
+    return " ".join(_stem(word) for word in words)
+
+
+def buckets_for(uploaded_at: str) -> List[str]:
+    """The month, quarter and year buckets an upload timestamp falls into."""
+    moment = datetime.fromisoformat(str(uploaded_at).replace("Z", "+00:00"))
+    return [
+        f"{moment.year}-{moment.month:02d}",
+        f"{moment.year}-Q{(moment.month - 1) // 3 + 1}",
+        f"{moment.year}",
+    ]
+
+
+def current_bucket(period: str, now: datetime = None) -> str:
+    return buckets_for((now or datetime.utcnow()).isoformat())[PERIODS.index(period)]
+
+
+def previous_bucket(bucket: str) -> str:
+    if "-Q" in bucket:
+        year, quarter = bucket.split("-Q")
+        year, quarter = int(year), int(quarter)
+        return f"{year - 1}-Q4" if quarter == 1 else f"{year}-Q{quarter - 1}"
+    if "-" in bucket:
+        year, month = (int(part) for part in bucket.split("-"))
+        return f"{year - 1}-12" if month == 1 else f"{year}-{month - 1:02d}"
+    return str(int(bucket) - 1)
+
+
+def next_bucket(bucket: str) -> str:
+    if "-Q" in bucket:
+        year, quarter = bucket.split("-Q")
+        year, quarter = int(year), int(quarter)
+        return f"{year + 1}-Q1" if quarter == 4 else f"{year}-Q{quarter + 1}"
+    if "-" in bucket:
+        year, month = (int(part) for part in bucket.split("-"))
+        return f"{year + 1}-01" if month == 12 else f"{year}-{month + 1:02d}"
+    return str(int(bucket) + 1)
+
+
+def parse_bucket(bucket: str) -> str:
+    """Validates a bucket such as 2026-03, 2026-Q1 or 2026."""
+    if not re.fullmatch(r"\d{4}(-(0[1-9]|1[0-2])|-Q[1-4])?", bucket or ""):
+        raise ValueError("bucket must look like 2026-03, 2026-Q1 or 2026")
+    return bucket
+
+
+class KeywordIndex:
+    def __init__(self, path: str = None):
+        self.path = path or settings.KEYWORD_INDEX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _normalized(keywords: List[str]) -> Dict[str, str]:
+        # A keyword counts once per file however often the analysis repeats it
+        normalized = {}
+        for keyword in keywords or []:
+            key = normalize_keyword(keyword)
+            if key:
+                normalized.setdefault(key, " ".join(str(keyword).split()))
+        return normalized
+
+    def _subtract(self, conn, file_id: str):
+        row = conn.execute(
+            "SELECT organization_id, uploaded_at, keywords FROM keyword_files WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        if not row:
+            return
+        rows = [(row["organization_id"], bucket, key)
+                for bucket in buckets_for(row["uploaded_at"]) for key in json.loads(row["keywords"])]
+        conn.executemany(
+            "UPDATE keyword_counts SET count = count - 1, change = change - 1 "
+            "WHERE organization_id = ? AND bucket = ? AND keyword = ?", rows
+        )
+        conn.executemany(
+            "DELETE FROM keyword_counts WHERE organization_id = ? AND bucket = ? AND keyword = ? AND count <= 0", rows
+        )
+        conn.executemany(
+            "UPDATE keyword_counts SET change = change + 1 WHERE organization_id = ? AND bucket = ? AND keyword = ?",
+            [(organization_id, next_bucket(bucket), key) for organization_id, bucket, key in rows],
+        )
+        conn.execute("DELETE FROM keyword_files WHERE file_id = ?", (file_id,))
+
+    def add_file(self, file_id: str, organization_id: Optional[str], uploaded_at: Optional[str], keywords: List[str]):
+        """Counts a file's keywords; calling it again for the same file replaces its previous contribution."""
+        organization_id = organization_id or ""
+        uploaded_at = uploaded_at or datetime.utcnow().isoformat()
+        normalized = self._normalized(keywords)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._subtract(conn, file_id)
+            rows = [(organization_id, bucket, key, label)
+                    for bucket in buckets_for(uploaded_at) for key, label in normalized.items()]
+            conn.executemany(
+                "INSERT INTO keyword_counts (organization_id, bucket, keyword, label, count, change) "
+                "VALUES (?1, ?2, ?3, ?4, 1, 1 - COALESCE((SELECT count FROM keyword_counts "
+                "WHERE organization_id = ?1 AND bucket = ?5 AND keyword = ?3), 0)) "
+                "ON CONFLICT (organization_id, bucket, keyword) DO UPDATE SET count = count + 1, change = change + 1",
+                [(org, bucket, key, label, previous_bucket(bucket)) for org, bucket, key, label in rows],
+            )
+            conn.executemany(
+                "UPDATE keyword_counts SET change = change - 1 WHERE organization_id = ? AND bucket = ? AND keyword = ?",
+                [(org, next_bucket(bucket), key) for org, bucket, key, _ in rows],
+            )
+            conn.execute(
+                "INSERT INTO keyword_files (file_id, organization_id, uploaded_at, keywords) VALUES (?, ?, ?, ?)",
+                (file_id, organization_id, uploaded_at, json.dumps(sorted(normalized))),
+            )
+            conn.execute("COMMIT")
+
+    def remove_file(self, file_id: str):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._subtract(conn, file_id)
+            conn.execute("COMMIT")
+
+    def top(self, organization_id: Optional[str], bucket: str, limit: int = 10) -> List[dict]:
+        """Keywords found in the most files of the bucket, of one organization or (None) of all of them."""
+        with self._connect() as conn:
+            if organization_id is None:
+                rows = conn.execute(
+                    "SELECT keyword, MIN(label) AS label, SUM(count) AS count FROM keyword_counts "
+                    "WHERE bucket = ? GROUP BY keyword ORDER BY count DESC LIMIT ?",
+                    (bucket, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT keyword, label, count FROM keyword_counts WHERE organization_id = ? AND bucket = ? "
+                    "ORDER BY count DESC LIMIT ?",
+                    (organization_id, bucket, limit),
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rising(self, organization_id: Optional[str], bucket: str, limit: int = 10) -> List[dict]:
+        """
+        Keywords that gained the most files compared with the previous bucket
+        of the same period (e.g. 2026-Q2 against 2026-Q1), of one organization
+        or (None) of all of them.
+        """
+        with self._connect() as conn:
+            if organization_id is None:
+                # The stored changes leave out organizations that lost a keyword
+                # entirely, so both buckets' totals are added up instead
+                rows = conn.execute(
+                    "SELECT current.keyword, current.label, current.count, COALESCE(previous.count, 0) AS previous_count, "
+                    "current.count - COALESCE(previous.count, 0) AS change "
+                    "FROM (SELECT keyword, MIN(label) AS label, SUM(count) AS count FROM keyword_counts "
+                    "      WHERE bucket = ? GROUP BY keyword) AS current "
+                    "LEFT JOIN (SELECT keyword, SUM(count) AS count FROM keyword_counts "
+                    "           WHERE bucket = ? GROUP BY keyword) AS previous USING (keyword) "
+                    "WHERE change > 0 ORDER BY change DESC LIMIT ?",
+                    (bucket, previous_bucket(bucket), limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT keyword, label, count, count - change AS previous_count, change FROM keyword_counts "
+                    "WHERE organization_id = ? AND bucket = ? AND change > 0 ORDER BY change DESC LIMIT ?",
+                    (organization_id, bucket, limit),
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_index = None
+
+
+def get_keyword_index() -> KeywordIndex:
+    global _index
+    if _index is None:
+        _index = KeywordIndex()
+    return _index
+
+
+def rebuild_from_store(store, index: KeywordIndex = None, batch_size: int = 500) -> int:
+    """
+    Counts the keywords of every stored analysis, e.g. after creating the index
+    on an existing database. Analyses are walked oldest first, so a file that
+    was re-analysed ends up counted with its newest keywords.
+    """
+    index = index or get_keyword_index()
+    counted = 0
+    after = None
+    while True:
+        analyses = store.select(
+            "ai_analysis_results", columns="id,file_id,keywords,created_at",
+            order=[("created_at", False), ("id", False)], limit=batch_size, after=after,
+        )
+        if not analyses:
+            break
+        uploads = {
+            row["id"]: row
+            for row in store.select("file_uploads", columns="id,organization_id,upload_timestamp",
+                                    filters=[("id", "in", [row["file_id"] for row in analyses])])
+        }
+        for row in analyses:
+            upload = uploads.get(row["file_id"])
+            if upload is None:
+                continue
+            index.add_file(row["file_id"], upload.get("organization_id"), upload.get("upload_timestamp"),
+                           row["keywords"] or [])
+            counted += 1
+        after = [analyses[-1]["created_at"], analyses[-1]["id"]]
+        logger.info(f"Counted keywords of {counted} files")
+    return counted
+
+
+if __name__ == "__main__":
+    from app.data_access import get_table_store
+    logging.basicConfig(level=logging.INFO)
+    print(f"Counted keywords of {rebuild_from_store(get_table_store())} files")
@@ -0,0 +1,271 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Callable, List, Optional
+
+from app.config import settings
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Every chat completion request of a process goes through one LLMScheduler.
+# It runs its own event loop on a background thread, so the analyze stage's
+# worker threads share a single OpenAI client (and its connection pool), a
+# single pair of rate limits and a single priority queue:
+#
+# - token buckets for requests/minute and tokens/minute; a request is sent
+#   once both hold enough for it (its prompt plus max_tokens, as OpenAI counts)
+# - waiting requests are granted in priority order (job_queue's PRIORITY_*,
+#   lower first), first come first served within a priority
+# - 429 and 5xx responses and connection errors are retried with jittered
+#   exponential backoff; a 429 also pauses all requests for its Retry-After
+#   and lowers the rates, which recover gradually as requests succeed
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.base_rate = per_minute / 60.0
+        self.rate = self.base_rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (at most the capacity) is available."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float, now: float):
+        # May go negative when a request used more than was estimated: later ones wait longer
+        self._refill(now)
+        self.tokens -= amount
+
+    def scale(self, factor: float):
+        self.rate = self.base_rate * factor
+
+
+class LLMScheduler:
+    def __init__(self, client_factory: Callable, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_in_flight: int = None, max_retries: int = None, retry_base_delay: float = None):
+        self.client_factory = client_factory
+        self.requests = TokenBucket(requests_per_minute or settings.OPENAI_REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(tokens_per_minute or settings.OPENAI_TOKENS_PER_MINUTE)
+        self.max_in_flight = max_in_flight or settings.OPENAI_MAX_IN_FLIGHT
+        self.max_retries = max_retries if max_retries is not None else settings.OPENAI_MAX_RETRIES
+        self.retry_base_delay = retry_base_delay if retry_base_delay is not None else settings.OPENAI_RETRY_BASE_DELAY
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._started = threading.Lock()
+        # (priority, sequence, cost, future, enqueued at)
+        self._waiting: List[tuple] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        # Share of the configured rates currently used; lowered by 429s
+        self._rate_factor = 1.0
+        self._wake: Optional[asyncio.Event] = None
+        # For stats(): recent (time, tokens) of completed requests and queue waits
+        self._token_log = deque()
+        self._waits = deque(maxlen=1000)
+
+    # --- Running coroutines on the scheduler's loop ---
+
+    def _ensure_started(self):
+        with self._started:
+            if self.loop is not None:
+                return
+            ready = threading.Event()
+
+            def run_loop():
+                self.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.loop)
+                self._wake = asyncio.Event()
+                self.loop.create_task(self._dispatch())
+                ready.set()
+                self.loop.run_forever()
+
+            threading.Thread(target=run_loop, name="llm-scheduler", daemon=True).start()
+            ready.wait()
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        """Schedules `coroutine` on the scheduler's loop from any thread."""
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine):
+        """Runs `coroutine` on the scheduler's loop and blocks the calling thread for its result."""
+        return self.submit(coroutine).result()
+
+    async def on_loop(self, coroutine):
+        """Awaits `coroutine` run on the scheduler's loop from another event loop."""
+        return await asyncio.wrap_future(self.submit(coroutine))
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    # --- Admission: priority queue and rate limits ---
+
+    async def _acquire(self, priority: int, cost: int):
+        future = self.loop.create_future()
+        enqueued = time.monotonic()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), cost, future, enqueued))
+        self._wake.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # granted just before the requester was cancelled
+            raise
+        wait = time.monotonic() - enqueued
+        self._waits.append(wait)
+        metrics.LLM_QUEUE_WAIT.observe(wait, priority=priority)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wake.set()
+
+    async def _sleep_or_wake(self, seconds: float):
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self):
+        while True:
+            while self._waiting and self._waiting[0][3].done():
+                heapq.heappop(self._waiting)  # the requester was cancelled
+            if not self._waiting or self._in_flight >= self.max_in_flight:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            now = time.monotonic()
+            priority, _, cost, future, _ = self._waiting[0]
+            delay = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(cost, now))
+            if delay > 0:
+                # Re-evaluated early if a more urgent request arrives meanwhile
+                await self._sleep_or_wake(delay)
+                continue
+            heapq.heappop(self._waiting)
+            self.requests.consume(1, now)
+            self.tokens.consume(cost, now)
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _adapt(self, factor: float):
+        self._rate_factor = min(1.0, max(0.1, factor))
+        self.requests.scale(self._rate_factor)
+        self.tokens.scale(self._rate_factor)
+
+    # --- Requests ---
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None if it must not be retried."""
+        import openai
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            status = None
+        elif isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500):
+            status = error.status_code
+        else:
+            return None
+        # Full jitter: anywhere up to the exponential backoff
+        delay = random.uniform(0, self.retry_base_delay * 2 ** attempt)
+        if status == 429:
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            now = time.monotonic()
+            if now >= self._paused_until:
+                # The first 429 of a burst; the requests already in flight tend to get one too
+                self._adapt(self._rate_factor * 0.7)
+                logger.warning(f"OpenAI rate limit hit, pausing requests for {delay:.1f}s "
+                               f"(now at {self._rate_factor:.0%} of the configured rates)")
+            self._paused_until = max(self._paused_until, now + delay)
+        return delay
+
+    async def complete(self, messages: List[dict], model: str, priority: int, prompt_tokens: int, **params):
+        """
+        Sends one chat completion once the rate limits and higher-priority
+        requests allow, retrying transient failures. Returns the response.
+        """
+        cost = prompt_tokens + params.get("max_tokens", 0)
+        attempt = 0
+        while True:
+            await self._acquire(priority, cost)
+            try:
+                with metrics.timed_step("ai_request"):
+                    response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+            except Exception as e:
+                self._release()
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    metrics.LLM_REQUESTS.inc(outcome="failed")
+                    raise
+                metrics.LLM_REQUESTS.inc(outcome="retry")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self._release()
+            metrics.LLM_REQUESTS.inc(outcome="ok")
+            self._record_usage(response, cost)
+            if self._rate_factor < 1.0:
+                self._adapt(self._rate_factor + 0.02)
+            return response
+
+    def _record_usage(self, response, estimated: int):
+        usage = getattr(response, "usage", None)
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        metrics.LLM_TOKENS.inc(prompt, kind="prompt")
+        metrics.LLM_TOKENS.inc(completion, kind="completion")
+        if usage is not None:
+            # Settle the estimate against what was actually used
+            self.tokens.consume(prompt + completion - estimated, time.monotonic())
+        now = time.monotonic()
+        self._token_log.append((now, prompt + completion))
+        metrics.LLM_TOKENS_PER_SEC.set(self._tokens_per_sec(now))
+
+    def _tokens_per_sec(self, now: float, window: float = 60.0) -> float:
+        while self._token_log and self._token_log[0][0] < now - window:
+            self._token_log.popleft()
+        if not self._token_log:
+            return 0.0
+        span = max(now - self._token_log[0][0], 1.0)
+        return sum(tokens for _, tokens in self._token_log) / span
+
+    def stats(self) -> dict:
+        """Queue and throughput figures for logs and benchmarks."""
+        if self.loop is None:
+            return self._stats()
+        return self.run(self._async_stats())
+
+    async def _async_stats(self) -> dict:
+        return self._stats()
+
+    def _stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "waiting": len(self._waiting),
+            "in_flight": self._in_flight,
+            "rate_factor": round(self._rate_factor, 3),
+            "queue_wait_p50": round(waits[len(waits) // 2], 4) if waits else 0.0,
+            "queue_wait_max": round(waits[-1], 4) if waits else 0.0,
+            "tokens_per_sec": round(self._tokens_per_sec(time.monotonic()), 1),
+        }
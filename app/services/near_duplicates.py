@@ -0,0 +1,272 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+from array import array
+from contextlib import contextmanager
+from typing import List, Optional
+
+from app.config import settings
+from app.services.analysis_cache import normalize_text
+from app.services.text_store import load_texts
+
+logger = logging.getLogger(__name__)
+
+# Near-duplicate detection over extracted text, so that a re-exported filing
+# or the final version of a draft reuses the analysis of the file it nearly
+# duplicates instead of being sent to the LLM again.
+#
+# A document's signature is a MinHash over its word SHINGLE_WORDS-grams,
+# computed by one-permutation hashing (each shingle is hashed once and lands
+# in one of NUM_HASHES bins, keeping the bin's minimum) with empty bins filled
+# by rotation, so two signatures agree in each position with probability
+# close to the Jaccard similarity of the two shingle sets. Signatures are cut
+# into bands; documents sharing any band (within one organization) are
+# candidates, and only candidates are compared in full, so a lookup reads a
+# handful of rows however many documents are indexed.
+#
+# Files that matched belong to the cluster of the file they matched, so the
+# clusters listed by GET /duplicates/clusters are the groups of files that
+# share one analysis. A cluster never spans organizations, and its id (the id
+# of the file it started with) is unique across all of them. Files without an
+# organization are indexed under "".
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    file_id TEXT PRIMARY KEY,
+    organization_id TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    cluster_id TEXT NOT NULL,
+    similarity REAL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS signatures_cluster_idx ON signatures (organization_id, cluster_id);
+CREATE INDEX IF NOT EXISTS signatures_all_clusters_idx ON signatures (cluster_id);
+CREATE TABLE IF NOT EXISTS bands (
+    band_key INTEGER NOT NULL,
+    file_id TEXT NOT NULL,
+    PRIMARY KEY (band_key, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bands_file_idx ON bands (file_id);
+"""
+
+NUM_HASHES = 128
+SHINGLE_WORDS = 5
+# Each bin's minimum is below _BIN_RANGE; a value borrowed from the bin `d`
+# places away gets d * _BIN_RANGE added, so it never equals a genuine minimum
+# and every value still fits in 64 bits.
+_BIN_RANGE = 2 ** 64 // NUM_HASHES
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def signature(text: str) -> Optional[List[int]]:
+    """MinHash signature of `text`, or None if it has fewer than NEAR_DUPLICATE_MIN_WORDS words."""
+    words = normalize_text(text).lower().split()
+    if not words or len(words) < settings.NEAR_DUPLICATE_MIN_WORDS:
+        return None
+    bins: List[Optional[int]] = [None] * NUM_HASHES
+    for i in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+        bin_index, value = divmod(_hash64(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8")), _BIN_RANGE)
+        bin_index %= NUM_HASHES
+        if bins[bin_index] is None or value < bins[bin_index]:
+            bins[bin_index] = value
+    filled = [i for i, value in enumerate(bins) if value is not None]
+    result = []
+    for i, value in enumerate(bins):
+        if value is None:
+            # Borrow from the next filled bin to the right, wrapping around
+            distance = next((j - i for j in filled if j > i), filled[0] + NUM_HASHES - i)
+            value = bins[(i + distance) % NUM_HASHES] + distance * _BIN_RANGE
+        result.append(value)
+    return result
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def band_layout(threshold: float, num_hashes: int = NUM_HASHES, recall: float = 0.95):
+    """
+    (bands, rows per band) for a similarity threshold: the most rows per band,
+    i.e. the fewest spurious candidates, that still makes a pair exactly at
+    the threshold a candidate with probability `recall`.
+    """
+    layouts = [(num_hashes // rows, rows) for rows in range(1, num_hashes + 1) if num_hashes % rows == 0]
+    suitable = [(bands, rows) for bands, rows in layouts if 1 - (1 - threshold ** rows) ** bands >= recall]
+    return max(suitable, key=lambda layout: layout[1]) if suitable else layouts[0]
+
+
+def _pack(values: List[int]) -> bytes:
+    return array("Q", values).tobytes()
+
+
+def _unpack(blob: bytes) -> List[int]:
+    values = array("Q")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class NearDuplicateIndex:
+    def __init__(self, path: str = None, threshold: float = None):
+        self.path = path or settings.NEAR_DUPLICATE_INDEX_PATH
+        self.threshold = threshold if threshold is not None else settings.NEAR_DUPLICATE_THRESHOLD
+        self.bands, self.rows = band_layout(self.threshold)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _band_keys(self, values: List[int], organization_id: Optional[str]) -> List[int]:
+        prefix = (organization_id or "").encode("utf-8") + b"\0"
+        keys = []
+        for band in range(self.bands):
+            chunk = values[band * self.rows:(band + 1) * self.rows]
+            # SQLite integers are signed
+            keys.append(_hash64(prefix + bytes([band]) + _pack(chunk)) - 2 ** 63)
+        return keys
+
+    def find(self, values: List[int], organization_id: Optional[str], exclude: str = None) -> Optional[dict]:
+        """
+        The indexed file of the organization most similar to `values`, if it
+        reaches the threshold: {"file_id", "cluster_id", "similarity"}.
+        """
+        keys = self._band_keys(values, organization_id)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT file_id, cluster_id, signature FROM signatures WHERE file_id IN "
+                f"(SELECT file_id FROM bands WHERE band_key IN ({','.join('?' * len(keys))}))",
+                keys,
+            ).fetchall()
+        best = None
+        for row in rows:
+            if row["file_id"] == exclude:
+                continue
+            score = similarity(values, _unpack(row["signature"]))
+            if score >= self.threshold and (best is None or score > best["similarity"]):
+                best = {"file_id": row["file_id"], "cluster_id": row["cluster_id"], "similarity": score}
+        return best
+
+    def add(self, file_id: str, organization_id: Optional[str], values: List[int], match: Optional[dict] = None):
+        """Indexes a file, in the cluster of the file it `match`ed (see find) or in a cluster of its own."""
+        cluster_id = match["cluster_id"] if match else file_id
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM bands WHERE file_id = ?", (file_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (file_id, organization_id, signature, cluster_id, similarity, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, organization_id or "", _pack(values), cluster_id,
+                 match["similarity"] if match else None, time.time()),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO bands (band_key, file_id) VALUES (?, ?)",
+                [(key, file_id) for key in self._band_keys(values, organization_id)],
+            )
+            conn.execute("COMMIT")
+
+    def remove(self, file_id: str):
+        # The other files of its cluster keep the cluster id
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM bands WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM signatures WHERE file_id = ?", (file_id,))
+            conn.execute("COMMIT")
+
+    def clusters(self, organization_id: Optional[str], limit: int = 100, after: str = None) -> List[dict]:
+        """
+        Clusters of two or more files of one organization, or (None) of every
+        organization, by cluster id: [{"cluster_id", "files": [{"file_id", "similarity"}]}].
+        """
+        scope, params = ("organization_id = ? AND ", [organization_id]) if organization_id is not None else ("", [])
+        with self._connect() as conn:
+            ids = [row["cluster_id"] for row in conn.execute(
+                f"SELECT cluster_id FROM signatures WHERE {scope}cluster_id > ? "
+                f"GROUP BY cluster_id HAVING COUNT(*) > 1 ORDER BY cluster_id LIMIT ?",
+                [*params, after or "", limit],
+            )]
+            if not ids:
+                return []
+            members = conn.execute(
+                f"SELECT cluster_id, file_id, similarity FROM signatures "
+                f"WHERE cluster_id IN ({','.join('?' * len(ids))}) ORDER BY added_at",
+                ids,
+            ).fetchall()
+        clusters = {cluster_id: [] for cluster_id in ids}
+        for row in members:
+            clusters[row["cluster_id"]].append({"file_id": row["file_id"], "similarity": row["similarity"]})
+        return [{"cluster_id": cluster_id, "files": files} for cluster_id, files in clusters.items()]
+
+    def cluster_of(self, file_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT organization_id, cluster_id FROM signatures WHERE file_id = ?",
+                               (file_id,)).fetchone()
+            if row is None:
+                return None
+            members = conn.execute(
+                "SELECT file_id, similarity FROM signatures WHERE organization_id = ? AND cluster_id = ? "
+                "ORDER BY added_at",
+                (row["organization_id"], row["cluster_id"]),
+            ).fetchall()
+        return {"cluster_id": row["cluster_id"], "files": [dict(member) for member in members]}
+
+
+_index = None
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex()
+    return _index
+
+
+def rebuild_from_store(store, index: NearDuplicateIndex = None, batch_size: int = 200) -> int:
+    """Indexes every existing report_content row, e.g. after creating the index on an existing database."""
+    index = index or get_near_duplicate_index()
+    indexed = 0
+    after = None
+    while True:
+        contents = store.select(
+            "report_content", columns="id,file_id,extracted_text,compression",
+            order=[("id", False)], limit=batch_size, after=after,
+        )
+        if not contents:
+            break
+        load_texts(store, contents)
+        uploads = {
+            row["id"]: row
+            for row in store.select("file_uploads", columns="id,organization_id",
+                                    filters=[("id", "in", [row["file_id"] for row in contents])])
+        }
+        for row in contents:
+            values = signature(row["extracted_text"] or "")
+            if values is None or row["file_id"] not in uploads:
+                continue
+            organization_id = uploads[row["file_id"]].get("organization_id")
+            index.add(row["file_id"], organization_id, values,
+                      index.find(values, organization_id, exclude=row["file_id"]))
+            indexed += 1
+        after = [contents[-1]["id"]]
+        logger.info(f"Indexed signatures of {indexed} documents")
+    return indexed
+
+
+if __name__ == "__main__":
+    from app.data_access import get_table_store
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed signatures of {rebuild_from_store(get_table_store())} documents")
@@ -0,0 +1,213 @@
+import os
+import logging
+from datetime import datetime
+
+from app.config import settings
+from app.data_access import get_table_store
+from app.metrics import NEAR_DUPLICATE_CHECKS, timed_step, truncate
+from app.services.document_processor import extract_pages_from_file, get_cached_pages
+from app.services.extraction_cache import join_pages
+from app.services.ai_analyzer import MODEL, PROMPT_VERSION, analyze_text_with_openai
+from app.services.job_queue import PRIORITY_INTERACTIVE
+from app.services.search_index import get_search_index
+from app.services.keyword_index import get_keyword_index
+from app.services.near_duplicates import get_near_duplicate_index, signature
+from app.services.related_index import get_related_index
+from app.services.report_engine import generate_report
+from app.services.text_store import page_spans, store_text
+from app.services import events
+
+logger = logging.getLogger(__name__)
+
+# Each uploaded file goes through these stages in order. The output of a stage
+# is merged into the job's state and handed to the next one.
+PROCESS_FILE = "process_file"
+GENERATE_REPORT = "generate_report"
+PIPELINES = {
+    PROCESS_FILE: ["extract", "analyze", "persist"],
+    GENERATE_REPORT: ["report"],
+}
+
+
+def extract_stage(payload: dict, state: dict) -> dict:
+    """CPU-bound: runs in the worker's process pool."""
+    temp_file_path = payload["temp_file_path"]
+    if not os.path.exists(temp_file_path):
+        # Uploads of the same file by different organizations share the
+        # stored file, and the first job to finish removes it; by then its
+        # extraction is cached
+        pages = get_cached_pages(payload.get("content_hash"), temp_file_path, payload["original_filename"])
+        if pages is None:
+            raise FileNotFoundError(f"Temporary file not found: {temp_file_path}")
+    else:
+        logger.info(f"Starting text extraction for file: {payload['original_filename']}")
+        with events.progress_scope("extract", payload["file_id"], payload.get("batch_id")):
+            pages = extract_pages_from_file(
+                temp_file_path, payload["original_filename"], payload.get("content_hash")
+            )
+    extracted_text, offsets = join_pages(pages)
+    logger.info(f"Text extraction completed. Extracted {len(extracted_text)} characters")
+    return {"extracted_text": extracted_text, "page_spans": page_spans(pages, offsets)}
+
+
+def _near_duplicate_analysis(payload: dict, values) -> dict:
+    """The current analysis of an already processed near-duplicate of the file, if there is one."""
+    match = get_near_duplicate_index().find(values, payload.get("organization_id"), exclude=payload["file_id"])
+    if match is None:
+        return {}
+    analyses = get_table_store().select(
+        "ai_analysis_results", columns="id,summary,keywords,prompt_version,model,created_at",
+        filters=[("file_id", "eq", match["file_id"])], order=[("created_at", False), ("id", False)],
+    )
+    if not analyses:
+        return {}
+    analysis = analyses[-1]
+    return {
+        "summary": analysis["summary"],
+        "keywords": analysis["keywords"] or [],
+        "prompt_version": analysis.get("prompt_version"),
+        "model": analysis.get("model"),
+        "near_duplicate": match,
+    }
+
+
+def analyze_stage(payload: dict, state: dict) -> dict:
+    values = None
+    if settings.NEAR_DUPLICATE_THRESHOLD > 0:
+        with timed_step("near_duplicate"):
+            values = signature(state["extracted_text"])
+            reused = _near_duplicate_analysis(payload, values) if values else {}
+        if values:
+            NEAR_DUPLICATE_CHECKS.inc(outcome="reused" if reused else "no_match")
+        if reused:
+            match = reused["near_duplicate"]
+            logger.info(f"File {payload['file_id']} is a near-duplicate of {match['file_id']} "
+                        f"(similarity {match['similarity']:.2f}), reusing its analysis")
+            return {**reused, "signature": values}
+    logger.info(f"Starting AI analysis for file_id: {payload['file_id']}")
+    ai_result = analyze_text_with_openai(state["extracted_text"], payload.get("priority", PRIORITY_INTERACTIVE))
+    if ai_result.get("error"):
+        # Raising makes the worker retry with backoff instead of storing an empty analysis
+        raise RuntimeError(f"AI analysis failed: {ai_result['error']}")
+    summary = ai_result.get("summary", "")
+    keywords = ai_result.get("keywords", [])
+    logger.info(f"AI analysis completed. Summary length: {len(summary)}, Keywords: {truncate(keywords)}")
+    return {"summary": summary, "keywords": keywords, "prompt_version": PROMPT_VERSION, "model": MODEL,
+            "signature": values}
+
+
+def _insert_once(store, table: str, row: dict):
+    # Stages may be retried after a partial failure, so never insert a file's row twice
+    if not store.select(table, columns="file_id", filters=[("file_id", "eq", row["file_id"])]):
+        store.insert(table, row)
+
+
+def persist_stage(payload: dict, state: dict) -> dict:
+    file_id = payload["file_id"]
+    store = get_table_store()
+    logger.info("Inserting AI analysis results into database...")
+    _insert_once(store, "ai_analysis_results", {
+        "file_id": file_id,
+        "summary": state["summary"],
+        "keywords": state["keywords"],
+        "prompt_version": state.get("prompt_version"),
+        "model": state.get("model"),
+        "duplicate_of": (state.get("near_duplicate") or {}).get("file_id"),
+    })
+    logger.info("Saving extracted text to report_content table...")
+    if not store.select("report_content", columns="file_id", filters=[("file_id", "eq", file_id)]):
+        with timed_step("store_text"):
+            store_text(store, file_id, state["extracted_text"], state.get("page_spans"),
+                       datetime.utcnow().isoformat())
+    with timed_step("search_index"):
+        get_search_index().index_document(
+            file_id,
+            state["extracted_text"],
+            organization_id=payload.get("organization_id"),
+            filename=payload.get("original_filename"),
+            uploaded_at=payload.get("upload_timestamp"),
+            keywords=state["keywords"],
+        )
+    with timed_step("keyword_index"):
+        get_keyword_index().add_file(
+            file_id, payload.get("organization_id"), payload.get("upload_timestamp"), state["keywords"]
+        )
+    if state.get("signature"):
+        with timed_step("near_duplicate_index"):
+            get_near_duplicate_index().add(
+                file_id, payload.get("organization_id"), state["signature"], state.get("near_duplicate")
+            )
+    with timed_step("related_index"):
+        get_related_index().add(file_id, payload.get("organization_id"), payload.get("original_filename"),
+                                state["extracted_text"], state["keywords"])
+    logger.info("Updating file status to 'processed'...")
+    store.update("file_uploads", {"status": "processed"}, [("id", "eq", file_id)])
+    return {}
+
+
+def report_stage(payload: dict, state: dict) -> dict:
+    generate_report(get_table_store(), payload["report_id"])
+    return {}
+
+
+STAGE_HANDLERS = {
+    "extract": extract_stage,
+    "analyze": analyze_stage,
+    "persist": persist_stage,
+    "report": report_stage,
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    # Unsupported or unreadable files fail the same way every time
+    return not isinstance(error, (ValueError, FileNotFoundError))
+
+
+def next_stage(kind: str, stage: str):
+    stages = PIPELINES[kind]
+    index = stages.index(stage)
+    return stages[index + 1] if index + 1 < len(stages) else None
+
+
+def _remove_temp_file(payload: dict):
+    temp_file_path = payload.get("temp_file_path")
+    try:
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+            logger.info(f"Cleaned up temporary file: {temp_file_path}")
+    except Exception as cleanup_error:
+        logger.error(f"Failed to clean up temporary file: {str(cleanup_error)}")
+
+
+def on_stage_event(kind: str, stage: str, payload: dict, state: str, attempt: int):
+    """Called by the worker when a stage starts, finishes ("done") or is to be retried ("retry")."""
+    if kind == PROCESS_FILE:
+        events.publish("stage", payload["file_id"], payload.get("batch_id"), stage=stage, state=state, attempt=attempt)
+
+
+def on_job_done(kind: str, payload: dict):
+    if kind == PROCESS_FILE:
+        _remove_temp_file(payload)
+        events.publish("status", payload["file_id"], payload.get("batch_id"), status="processed")
+        logger.info(f"=== Completed processing for file_id: {payload['file_id']} ===")
+    elif kind == GENERATE_REPORT:
+        logger.info(f"Report {payload['report_id']} generated")
+
+
+def on_job_failed(kind: str, payload: dict, error: str):
+    """Called once a job has used up all its attempts."""
+    if kind == PROCESS_FILE:
+        logger.error(f"Giving up on file_id {payload['file_id']}: {error}")
+        try:
+            get_table_store().update("file_uploads", {"status": "error"}, [("id", "eq", payload["file_id"])])
+        except Exception as db_error:
+            logger.error(f"Failed to update error status: {str(db_error)}")
+        _remove_temp_file(payload)
+        events.publish("status", payload["file_id"], payload.get("batch_id"), status="error", error=error)
+    elif kind == GENERATE_REPORT:
+        logger.error(f"Giving up on report {payload['report_id']}: {error}")
+        try:
+            get_table_store().update("reports", {"status": "failed", "error": error},
+                                     [("id", "eq", payload["report_id"])])
+        except Exception as db_error:
+            logger.error(f"Failed to update report status: {str(db_error)}")
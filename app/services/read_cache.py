@@ -0,0 +1,113 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from fastapi import Response
+
+from app.config import settings
+from app.metrics import READ_CACHE_REQUESTS, READ_CACHE_SAVED_ROUND_TRIPS
+
+# In-process read-through cache of rendered API responses for data that
+# rarely changes (organizations), so that dashboard page loads stop costing a
+# database round trip each. Entries expire after a TTL and the least recently
+# used ones are evicted beyond a size limit; the routers that write the data
+# invalidate it explicitly. Each process has its own cache, so a write made
+# through another process is seen here within the TTL.
+#
+# Cached responses carry a strong ETag (a hash of the exact body), and a
+# request whose If-None-Match names it gets a 304 straight from the cache.
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match compares weakly: W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CachedResponse:
+    """A rendered JSON response body with its ETag and extra headers."""
+
+    def __init__(self, body: bytes, headers: Dict[str, str] = None):
+        self.body = body
+        self.etag = etag_for(body)
+        self.headers = headers or {}
+
+    def response(self, if_none_match: Optional[str] = None) -> Response:
+        # no-cache: clients may keep the response but revalidate it on every use
+        headers = {**self.headers, "ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class ReadCache:
+    def __init__(self, name: str, ttl: float = None, max_entries: int = None):
+        self.name = name
+        self.ttl = ttl if ttl is not None else settings.ORGANIZATION_CACHE_TTL
+        self.max_entries = max_entries or settings.ORGANIZATION_CACHE_ENTRIES
+        # key -> (expires at, CachedResponse), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a read that started before one must not be cached
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            READ_CACHE_REQUESTS.inc(cache=self.name, outcome="miss")
+            return None
+        READ_CACHE_REQUESTS.inc(cache=self.name, outcome="hit")
+        READ_CACHE_SAVED_ROUND_TRIPS.inc(cache=self.name)
+        return entry[1]
+
+    def put(self, key: Hashable, value: CachedResponse, generation: int):
+        """Caches `value`, read from the database when the cache was at `generation`."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return  # invalidated while it was being read: it may be stale already
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """Drops the entries whose key satisfies `predicate`, or all of them."""
+        with self._lock:
+            self.generation += 1
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_organization_cache = None
+
+
+def get_organization_cache() -> ReadCache:
+    global _organization_cache
+    if _organization_cache is None:
+        _organization_cache = ReadCache("organizations")
+    return _organization_cache
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import List, Optional
+
+from app.config import settings
+from app.data_access import TableStore
+from app.metrics import truncate
+from app.services import ai_analyzer
+from app.services.job_queue import PRIORITY_BULK
+from app.services.keyword_index import get_keyword_index
+from app.services.related_index import get_related_index
+from app.services.search_index import get_search_index
+from app.services.text_store import load_texts
+
+logger = logging.getLogger(__name__)
+
+# Re-runs the AI analysis over the stored report_content after the prompt
+# (ANALYSIS_PROMPT_VERSION) or the model (OPENAI_MODEL) changed, without
+# re-uploading anything:
+#
+#   python -m app.services.reanalysis --dry-run    # requests, tokens and cost
+#   python -m app.services.reanalysis              # analyse
+#
+# Rows are walked by keyset on report_content.id. Each new analysis is added
+# to ai_analysis_results next to the old ones, tagged with its prompt version
+# and model, and becomes the file's current analysis (the newest row wins);
+# the search and keyword indexes are updated with it. Files that already have
+# an analysis for the target prompt version and model are skipped, and the
+# position reached is checkpointed after every batch, so an interrupted run
+# picks up where it stopped when started again.
+
+# Failed file ids kept in a checkpoint, so that it stays small
+MAX_FAILED_IDS = 1000
+
+
+def checkpoint_path(prompt_version: str, model: str) -> str:
+    name = re.sub(r"[^\w.-]", "_", f"{prompt_version}-{model}")
+    return os.path.join(settings.REANALYSIS_CHECKPOINT_DIR, f"{name}.json")
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written aside and renamed, so an interruption never leaves half a file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _new_checkpoint(prompt_version: str, model: str) -> dict:
+    return {
+        "prompt_version": prompt_version,
+        "model": model,
+        "after": None,
+        "scanned": 0,
+        "analysed": 0,
+        "skipped": 0,
+        "failed": 0,
+        "failed_file_ids": [],
+        "started_at": time.time(),
+        "finished_at": None,
+    }
+
+
+def _already_analysed(store: TableStore, file_ids: List[str], prompt_version: str, model: str) -> set:
+    rows = store.select(
+        "ai_analysis_results", columns="file_id",
+        filters=[("file_id", "in", file_ids), ("prompt_version", "eq", prompt_version), ("model", "eq", model)],
+    )
+    return {row["file_id"] for row in rows}
+
+
+async def _analyse_all(texts: List[str], concurrency: int) -> List[dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyse(text: str) -> dict:
+        async with semaphore:
+            try:
+                return await ai_analyzer.analyze_text_async(text, PRIORITY_BULK)
+            except Exception as e:
+                return {"summary": "", "keywords": [], "error": truncate(e, 500)}
+
+    return await asyncio.gather(*[analyse(text) for text in texts])
+
+
+def _store_analyses(store: TableStore, rows: List[dict], results: List[dict], uploads: dict,
+                    prompt_version: str, model: str) -> List[str]:
+    """
+    Updates the indexes with the successful analyses, then saves them; returns
+    the ids of the files that failed. In this order, a run interrupted in
+    between leaves the files without a current analysis, so the next run
+    analyses and indexes them again (indexing a file replaces its entries);
+    the other way round, they would keep stale index entries for good.
+    """
+    failed, analysed = [], []
+    for row, result in zip(rows, results):
+        if result.get("error") or not result.get("summary"):
+            logger.warning(f"Re-analysis of file {row['file_id']} failed: {result.get('error') or 'empty summary'}")
+            failed.append(row["file_id"])
+        else:
+            analysed.append((row, result))
+    search_index, keyword_index, related_index = get_search_index(), get_keyword_index(), get_related_index()
+    for row, result in analysed:
+        upload = uploads[row["file_id"]]
+        search_index.index_document(
+            row["file_id"],
+            row["extracted_text"],
+            organization_id=upload.get("organization_id"),
+            filename=upload.get("filename"),
+            uploaded_at=upload.get("upload_timestamp"),
+            keywords=result["keywords"],
+        )
+        keyword_index.add_file(row["file_id"], upload.get("organization_id"), upload.get("upload_timestamp"),
+                               result["keywords"])
+        related_index.add(row["file_id"], upload.get("organization_id"), upload.get("filename"),
+                          row["extracted_text"], result["keywords"])
+    if analysed:
+        store.insert("ai_analysis_results", [{
+            "file_id": row["file_id"],
+            "summary": result["summary"],
+            "keywords": result["keywords"],
+            "prompt_version": prompt_version,
+            "model": model,
+        } for row, result in analysed])
+    return failed
+
+
+def reanalyze(store: TableStore, dry_run: bool = False, batch_size: int = None, concurrency: int = None,
+              limit: Optional[int] = None, restart: bool = False, checkpoint_file: str = None) -> dict:
+    """
+    Analyses the stored documents that have no analysis for the current
+    PROMPT_VERSION and MODEL yet, at most `limit` of them. With `dry_run`,
+    nothing is analysed or written: the result has the requests, tokens and
+    cost the run would take instead. Returns the run's checkpoint.
+    """
+    batch_size = batch_size or settings.REANALYSIS_BATCH_SIZE
+    concurrency = concurrency or settings.REANALYSIS_CONCURRENCY
+    prompt_version, model = ai_analyzer.PROMPT_VERSION, ai_analyzer.MODEL
+    path = checkpoint_file or checkpoint_path(prompt_version, model)
+    checkpoint = None if restart else load_checkpoint(path)
+    if checkpoint is not None and (checkpoint["prompt_version"], checkpoint["model"]) != (prompt_version, model):
+        raise ValueError(f"Checkpoint {path} is for prompt version {checkpoint['prompt_version']} "
+                         f"and model {checkpoint['model']}")
+    if checkpoint is None:
+        checkpoint = _new_checkpoint(prompt_version, model)
+    elif checkpoint.get("finished_at"):
+        logger.info(f"Re-analysis for prompt version {prompt_version} and model {model} already finished; "
+                    f"starting over to pick up documents added since")
+        checkpoint = _new_checkpoint(prompt_version, model)
+    elif checkpoint["after"]:
+        logger.info(f"Resuming re-analysis after report_content {checkpoint['after']}")
+    if dry_run:
+        checkpoint.update({"dry_run": True, "requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    remaining = limit
+    after = [checkpoint["after"]] if checkpoint["after"] else None
+    while remaining is None or remaining > 0:
+        rows = store.select("report_content", columns="id,file_id,extracted_text,compression",
+                            order=[("id", False)], limit=batch_size, after=after)
+        if not rows:
+            checkpoint["finished_at"] = time.time()
+            break
+        file_ids = [row["file_id"] for row in rows]
+        done = _already_analysed(store, file_ids, prompt_version, model)
+        uploads = {row["id"]: row for row in store.select(
+            "file_uploads", columns="id,filename,organization_id,upload_timestamp",
+            filters=[("id", "in", file_ids)],
+        )}
+        # Documents of deleted uploads, and empty ones, have nothing to re-analyse
+        todo = load_texts(store, [row for row in rows if row["file_id"] not in done and row["file_id"] in uploads])
+        todo = [row for row in todo if (row["extracted_text"] or "").strip()]
+        if remaining is not None and len(todo) > remaining:
+            # Stop right after the last document analysed, so the next run continues from there
+            rows = rows[:rows.index(todo[remaining - 1]) + 1]
+            todo = todo[:remaining]
+        checkpoint["scanned"] += len(rows)
+        checkpoint["skipped"] += len(rows) - len(todo)
+
+        if dry_run:
+            for row in todo:
+                usage = ai_analyzer.estimate_usage(row["extracted_text"])
+                for key, value in usage.items():
+                    checkpoint[key] += value
+            checkpoint["analysed"] += len(todo)
+        elif todo:
+            results = asyncio.run(_analyse_all([row["extracted_text"] for row in todo], concurrency))
+            failed = _store_analyses(store, todo, results, uploads, prompt_version, model)
+            checkpoint["analysed"] += len(todo) - len(failed)
+            checkpoint["failed"] += len(failed)
+            checkpoint["failed_file_ids"] = (checkpoint["failed_file_ids"] + failed)[:MAX_FAILED_IDS]
+
+        checkpoint["after"] = rows[-1]["id"]
+        after = [rows[-1]["id"]]
+        if remaining is not None:
+            remaining -= len(todo)
+        if not dry_run:
+            save_checkpoint(path, checkpoint)
+        logger.info(f"Re-analysis: {checkpoint['scanned']} scanned, {checkpoint['analysed']} "
+                    f"{'to analyse' if dry_run else 'analysed'}, {checkpoint['skipped']} skipped, "
+                    f"{checkpoint['failed']} failed")
+
+    if dry_run:
+        checkpoint["estimated_cost_usd"] = round(
+            checkpoint["prompt_tokens"] / 1000 * settings.OPENAI_PROMPT_PRICE_PER_1K
+            + checkpoint["completion_tokens"] / 1000 * settings.OPENAI_COMPLETION_PRICE_PER_1K, 4
+        )
+    elif checkpoint["finished_at"]:
+        save_checkpoint(path, checkpoint)
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-analyse stored documents with the current prompt version and model."
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only estimate the requests, tokens and cost")
+    parser.add_argument("--batch-size", type=int, default=settings.REANALYSIS_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.REANALYSIS_CONCURRENCY,
+                        help="documents analysed at once")
+    parser.add_argument("--limit", type=int, help="analyse at most this many documents")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: one per prompt version and model "
+                                             "in REANALYSIS_CHECKPOINT_DIR)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    from app.data_access import get_table_store
+    result = reanalyze(get_table_store(), dry_run=args.dry_run, batch_size=args.batch_size,
+                       concurrency=args.concurrency, limit=args.limit, restart=args.restart,
+                       checkpoint_file=args.checkpoint)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+import os
+import re
+import math
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.text_store import load_texts
+
+logger = logging.getLogger(__name__)
+
+# "Related reports": each processed document is a hashed TF-IDF vector of
+# its text and analysis keywords, computed locally (no embedding service).
+# Terms are hashed into RELATED_DIMENSIONS signed buckets and the vector is
+# L2-normalised, so the dot product of two rows is their cosine similarity.
+#
+# Vectors are rows of one contiguous float32 matrix in a file next to the
+# SQLite database, memory-mapped for queries and appended to (with pwrite)
+# as documents finish processing; the database holds what each row is
+# (file, organization, filename, deleted) and the document frequency of
+# every term. A query scores the organization's rows block by block with a
+# single matrix product per block and keeps the top k with argpartition.
+#
+# IDF weights are those known when a document was added, and removed
+# documents keep counting towards document frequencies; rebuild_from_store
+# recomputes everything from scratch.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    row INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    organization_id TEXT NOT NULL,
+    filename TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS rows_file_idx ON rows (file_id);
+CREATE TABLE IF NOT EXISTS term_df (
+    term INTEGER PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Rows scored per matrix product; bounds the memory of a query
+BLOCK_ROWS = 65536
+# Terms looked up per statement (SQLite caps bound parameters)
+LOOKUP_BATCH = 500
+
+# Words of two or more letters and digits with at least one letter: "q3" counts, "2023" does not
+_TOKEN = re.compile(r"\b(?=[^\W_]*[^\W\d_])[^\W_]{2,}\b")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could for from had has have in into is it its may more not of on or
+other our over per such than that the their them then there these they this those to was were which will with
+would you your also all any
+""".split())
+
+
+def _hash64(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def term_weights(text: str, keywords: Iterable[str] = ()) -> Dict[str, float]:
+    """Sublinear term frequencies of the words of `text`, plus each analysis keyword as a term of its own."""
+    counts = Counter(token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS)
+    weights = {term: 1.0 + math.log(count) for term, count in counts.items()}
+    for keyword in keywords or []:
+        normalized = " ".join(str(keyword).lower().split())
+        if normalized:
+            weights[f"kw:{normalized}"] = settings.RELATED_KEYWORD_WEIGHT
+    return weights
+
+
+class RelatedIndex:
+    def __init__(self, path: str = None, dimensions: int = None):
+        self.path = path or settings.RELATED_INDEX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dimensions', ?)",
+                         (dimensions or settings.RELATED_DIMENSIONS,))
+            for key in ("epoch", "documents", "deletions"):
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)", (key,))
+            meta = self._meta(conn)
+        # The dimensions an index was built with stay until it is rebuilt
+        self.dimensions = meta["dimensions"]
+        self._touch(self._vectors_path(meta["epoch"]))
+        # What queries have loaded so far: refreshed when rows are added or removed
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._deletions = None
+        self._count = 0
+        self._matrix = None
+        self._file_ids: List[str] = []
+        self._filenames: List[Optional[str]] = []
+        self._organizations: Dict[str, int] = {}
+        self._organization_names: List[str] = []
+        self._organization_codes = np.zeros(0, dtype=np.int32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _meta(conn) -> dict:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _vectors_path(self, epoch: int) -> str:
+        # A rebuild writes a new file rather than truncating one that readers may have mapped
+        return f"{self.path}.{epoch}.vectors"
+
+    @staticmethod
+    def _touch(path: str):
+        if not os.path.exists(path):
+            open(path, "ab").close()
+
+    # --- Writing ---
+
+    def _count_terms(self, conn, keys: List[int]):
+        conn.executemany("INSERT INTO term_df (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                         [(key,) for key in keys])
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'documents'")
+
+    def _vector(self, conn, weights: Dict[str, float], hashes: List[int]) -> np.ndarray:
+        keys = [value - 2 ** 63 for value in hashes]
+        df = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[start:start + LOOKUP_BATCH]
+            df.update(conn.execute(
+                f"SELECT term, df FROM term_df WHERE term IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        documents = self._meta(conn)["documents"]
+        unsigned = np.array(hashes, dtype=np.uint64)
+        buckets = (unsigned % np.uint64(self.dimensions)).astype(np.intp)
+        # The top bit picks the sign, so that colliding terms cancel out on average
+        signs = np.where(unsigned >> np.uint64(63), -1.0, 1.0)
+        idf = np.array([math.log((documents + 1) / (df.get(key, 0) + 1)) + 1.0 for key in keys])
+        values = np.array(list(weights.values())) * idf * signs
+        vector = np.bincount(buckets, weights=values, minlength=self.dimensions).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self, file_id: str, organization_id: Optional[str], filename: Optional[str], text: str,
+            keywords: Iterable[str] = (), count_terms: bool = True):
+        """
+        Indexes a document, replacing its previous vector if it was indexed
+        already (e.g. after a re-analysis changed its keywords).
+        """
+        weights = term_weights(text, keywords)
+        if not weights:
+            return
+        hashes = [_hash64(term) for term in weights]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = conn.execute("UPDATE rows SET deleted = 1 WHERE file_id = ? AND deleted = 0",
+                                    (file_id,)).rowcount
+            if previous:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'deletions'")
+            elif count_terms:
+                self._count_terms(conn, [value - 2 ** 63 for value in hashes])
+            vector = self._vector(conn, weights, hashes)
+            meta = self._meta(conn)
+            row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+            # The vector is in place before its row is committed, so readers never see a row without one
+            fd = os.open(self._vectors_path(meta["epoch"]), os.O_WRONLY)
+            try:
+                os.pwrite(fd, vector.tobytes(), row * self.dimensions * 4)
+            finally:
+                os.close(fd)
+            conn.execute("INSERT INTO rows (row, file_id, organization_id, filename) VALUES (?, ?, ?, ?)",
+                         (row, file_id, organization_id or "", filename))
+            conn.execute("COMMIT")
+
+    def remove(self, file_id: str):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("UPDATE rows SET deleted = 1 WHERE file_id = ? AND deleted = 0", (file_id,)).rowcount:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'deletions'")
+            conn.execute("COMMIT")
+
+    def reset(self):
+        """Empties the index, e.g. before a rebuild."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            old_epoch = self._meta(conn)["epoch"]
+            conn.execute("DELETE FROM rows")
+            conn.execute("DELETE FROM term_df")
+            conn.execute("UPDATE meta SET value = 0 WHERE key IN ('documents', 'deletions')")
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'epoch'")
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'dimensions'", (settings.RELATED_DIMENSIONS,))
+            self._touch(self._vectors_path(old_epoch + 1))
+            conn.execute("COMMIT")
+        self.dimensions = settings.RELATED_DIMENSIONS
+        try:
+            os.remove(self._vectors_path(old_epoch))
+        except FileNotFoundError:
+            pass
+
+    # --- Querying ---
+
+    def _refresh(self):
+        """Loads the rows added, and the deletions made, since the last query (by any process)."""
+        with self._connect() as conn:
+            meta = self._meta(conn)
+            count = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+            if meta["epoch"] != self._epoch:
+                self._epoch, self._deletions, self._count = meta["epoch"], None, 0
+                self.dimensions = meta["dimensions"]
+                self._file_ids, self._filenames, self._row_of = [], [], {}
+                self._organization_codes = np.zeros(0, dtype=np.int32)
+                self._deleted = np.zeros(0, dtype=bool)
+                self._matrix = None
+            if count > self._count:
+                added = conn.execute(
+                    "SELECT row, file_id, organization_id, filename FROM rows WHERE row >= ? ORDER BY row",
+                    (self._count,),
+                ).fetchall()
+                codes = []
+                for _, file_id, organization_id, filename in added:
+                    self._file_ids.append(file_id)
+                    self._filenames.append(filename)
+                    if organization_id not in self._organizations:
+                        self._organizations[organization_id] = len(self._organization_names)
+                        self._organization_names.append(organization_id)
+                    codes.append(self._organizations[organization_id])
+                self._organization_codes = np.concatenate([self._organization_codes, np.array(codes, dtype=np.int32)])
+                self._deleted = np.concatenate([self._deleted, np.zeros(len(added), dtype=bool)])
+                self._row_of.update((file_id, row) for row, file_id, _, _ in added)
+                self._count = count
+                self._matrix = np.memmap(self._vectors_path(self._epoch), dtype=np.float32, mode="r",
+                                         shape=(count, self.dimensions))
+                # Rows added as replacements make their predecessors deleted too
+                self._deletions = None
+            if meta["deletions"] != self._deletions:
+                self._deleted[:] = False
+                deleted = [row for (row,) in conn.execute("SELECT row FROM rows WHERE deleted = 1")]
+                self._deleted[deleted] = True
+                for row in deleted:
+                    if self._row_of.get(self._file_ids[row]) == row:
+                        del self._row_of[self._file_ids[row]]
+                self._deletions = meta["deletions"]
+
+    def top_k(self, queries: np.ndarray, k: int, organization_id: Optional[str] = None) -> List[List[tuple]]:
+        """
+        Cosine top-k over the live rows (of one organization, if given) for
+        each row of `queries` (already normalised): [[(row, score), ...] per
+        query], best first.
+        """
+        with self._lock:
+            self._refresh()
+            matrix, count = self._matrix, self._count
+            valid = ~self._deleted
+            if organization_id is not None:
+                code = self._organizations.get(organization_id or "")
+                valid = valid & (self._organization_codes == code) if code is not None else np.zeros_like(valid)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if count == 0 or k <= 0:
+            return [[] for _ in queries]
+        candidates = np.flatnonzero(valid)
+        # When only a minority of the rows can match (typically one organization's),
+        # just those are read; otherwise whole blocks are, masking the others out
+        gather = len(candidates) < count // 2
+        if gather:
+            blocks = [candidates[start:start + BLOCK_ROWS] for start in range(0, len(candidates), BLOCK_ROWS)]
+        else:
+            blocks = [np.arange(start, min(start + BLOCK_ROWS, count)) for start in range(0, count, BLOCK_ROWS)]
+        if not blocks:
+            return [[] for _ in queries]
+        candidate_scores, candidate_rows = [], []
+        for rows in blocks:
+            if gather:
+                scores = queries @ matrix[rows].T
+            else:
+                scores = queries @ np.asarray(matrix[rows[0]:rows[-1] + 1]).T
+                scores[:, ~valid[rows]] = -np.inf
+            take = min(k, len(rows))
+            best = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            candidate_scores.append(np.take_along_axis(scores, best, axis=1))
+            candidate_rows.append(rows[best])
+        scores = np.concatenate(candidate_scores, axis=1)
+        rows = np.concatenate(candidate_rows, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return [
+            [(int(rows[query, i]), float(scores[query, i])) for i in order[query] if np.isfinite(scores[query, i])]
+            for query in range(len(queries))
+        ]
+
+    def related(self, file_id: str, limit: int = 10) -> Optional[List[dict]]:
+        """
+        The documents of the file's organization most similar to it, scoring
+        above RELATED_MIN_SCORE: [{"file_id", "filename", "score"}], or None
+        if it is not indexed.
+        """
+        with self._lock:
+            self._refresh()
+            row = self._row_of.get(file_id)
+            if row is None:
+                return None
+            query = np.array(self._matrix[row])
+            organization = self._organization_names[self._organization_codes[row]]
+        matches = self.top_k(query, limit + 1, organization)[0]
+        return [
+            {"file_id": self._file_ids[match], "filename": self._filenames[match], "score": round(score, 4)}
+            for match, score in matches if match != row and score > settings.RELATED_MIN_SCORE
+        ][:limit]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return int((~self._deleted).sum())
+
+
+_index = None
+
+
+def get_related_index() -> RelatedIndex:
+    global _index
+    if _index is None:
+        _index = RelatedIndex()
+    return _index
+
+
+def _documents(store, batch_size: int):
+    """Batches of (report_content row with its text, upload, newest analysis) of every stored document."""
+    after = None
+    while True:
+        contents = store.select("report_content", columns="id,file_id,extracted_text,compression",
+                                order=[("id", False)], limit=batch_size, after=after)
+        if not contents:
+            break
+        load_texts(store, contents)
+        file_ids = [row["file_id"] for row in contents]
+        uploads = {row["id"]: row for row in store.select(
+            "file_uploads", columns="id,filename,organization_id", filters=[("id", "in", file_ids)]
+        )}
+        analyses = {
+            row["file_id"]: row
+            # Oldest first, so that a file's newest analysis is the one kept
+            for row in store.select("ai_analysis_results", columns="file_id,keywords",
+                                    filters=[("file_id", "in", file_ids)], order=[("created_at", False), ("id", False)])
+        }
+        yield [(row, uploads[row["file_id"]], analyses.get(row["file_id"], {}))
+               for row in contents if row["file_id"] in uploads]
+        after = [contents[-1]["id"]]
+
+
+def rebuild_from_store(store, index: RelatedIndex = None, batch_size: int = 200) -> int:
+    """
+    Re-indexes every stored document: a first pass counts document
+    frequencies over the whole corpus, a second one writes the vectors.
+    """
+    index = index or get_related_index()
+    index.reset()
+    with index._connect() as conn:
+        for batch in _documents(store, batch_size):
+            conn.execute("BEGIN IMMEDIATE")
+            for row, _, analysis in batch:
+                weights = term_weights(row["extracted_text"] or "", analysis.get("keywords") or [])
+                if weights:
+                    index._count_terms(conn, [_hash64(term) - 2 ** 63 for term in weights])
+            conn.execute("COMMIT")
+    indexed = 0
+    for batch in _documents(store, batch_size):
+        for row, upload, analysis in batch:
+            index.add(row["file_id"], upload.get("organization_id"), upload.get("filename"),
+                      row["extracted_text"] or "", analysis.get("keywords") or [], count_terms=False)
+            indexed += 1
+        logger.info(f"Indexed vectors of {indexed} documents")
+    return indexed
+
+
+if __name__ == "__main__":
+    from app.data_access import get_table_store
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed vectors of {rebuild_from_store(get_table_store())} documents")
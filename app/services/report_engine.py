@@ -0,0 +1,232 @@
+import time
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from app.data_access import TableStore
+
+logger = logging.getLogger(__name__)
+
+# A report combines the analysed files of one organization. Every file's
+# contribution is kept as a partial aggregate keyed by a fingerprint of its
+# upload and analysis, and the report totals are adjusted by the difference
+# between old and new aggregates. Regenerating therefore only reads the
+# analysis and text of files that were added or changed since the last run;
+# no LLM calls are made at report time.
+#
+# A run deletes and inserts aggregates before it writes the new totals, so a
+# run that dies in between leaves totals that no longer match the stored
+# aggregates. Every run therefore first marks the report's content as
+# "incomplete"; the next run finding that mark rebuilds the totals from the
+# stored aggregates (which always match their fingerprints) instead of
+# adjusting them.
+BATCH_SIZE = 200
+TOP_KEYWORDS = 25
+RECENT_FILES = 10
+# A file may have several analyses (one per prompt version); the newest counts
+ANALYSIS_ORDER = [("created_at", False), ("id", False)]
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(str(keyword).split()).lower()
+
+
+def file_fingerprint(upload: dict, analysis: Optional[dict]) -> str:
+    """Changes whenever the file's content or its analysis does."""
+    if analysis is None:
+        return f"{upload.get('content_hash')}:-"
+    return f"{upload.get('content_hash')}:{analysis['id']}:{analysis.get('created_at')}"
+
+
+def file_aggregate(upload: dict, analysis: Optional[dict], content: Optional[dict]) -> dict:
+    content = content or {}
+    if content.get("text_length") is not None:
+        # Stored alongside chunked text, so the text itself is not needed
+        characters, words = content["text_length"], content.get("word_count") or 0
+    else:
+        text = content.get("extracted_text") or ""
+        characters, words = len(text), len(text.split())
+    keywords = sorted({normalize_keyword(k) for k in (analysis or {}).get("keywords") or [] if str(k).strip()})
+    return {
+        "filename": upload.get("filename"),
+        "uploaded_at": upload.get("upload_timestamp"),
+        "summary": (analysis or {}).get("summary"),
+        "keywords": keywords,
+        "characters": characters,
+        "words": words,
+    }
+
+
+def _batches(items: List, size: int = BATCH_SIZE) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _scan(store: TableStore, table: str, columns: str, filters, order) -> Iterator[dict]:
+    after = None
+    while True:
+        rows = store.select(table, columns=columns, filters=filters, order=order, limit=BATCH_SIZE, after=after)
+        yield from rows
+        if len(rows) < BATCH_SIZE:
+            break
+        after = [rows[-1][column] for column, _ in order]
+
+
+def _empty_totals() -> dict:
+    return {"file_count": 0, "characters": 0, "words": 0, "keyword_counts": {}}
+
+
+def _apply(totals: dict, aggregate: dict, sign: int):
+    totals["file_count"] += sign
+    totals["characters"] += sign * aggregate.get("characters", 0)
+    totals["words"] += sign * aggregate.get("words", 0)
+    counts = totals["keyword_counts"]
+    for keyword in aggregate.get("keywords", []):
+        counts[keyword] = counts.get(keyword, 0) + sign
+        if counts[keyword] <= 0:
+            del counts[keyword]
+
+
+def generate_report(store: TableStore, report_id: str) -> dict:
+    """
+    Brings a report up to date with its organization's processed files and
+    marks it ready. Returns the stored report row.
+    """
+    started = time.monotonic()
+    reports = store.select("reports", filters=[("id", "eq", report_id)])
+    if not reports:
+        raise ValueError(f"Report {report_id} not found")
+    report = reports[0]
+    content = report.get("content") or {}
+    store.update("reports", {
+        "status": "generating",
+        "error": None,
+        "content": {**content, "incomplete": True} if content else None,
+        "updated_at": datetime.utcnow().isoformat(),
+    }, [("id", "eq", report_id)])
+
+    # Current files: only the light upload columns, walked by keyset
+    uploads = {
+        row["id"]: row
+        for row in _scan(
+            store, "file_uploads", "id,filename,content_hash,upload_timestamp",
+            filters=[("organization_id", "eq", report["organization_id"]), ("status", "eq", "processed")],
+            order=[("id", False)],
+        )
+    }
+    analyses: Dict[str, dict] = {}
+    for batch in _batches(list(uploads)):
+        # A file has an analysis per prompt version and model: walked by keyset, or
+        # a row cap would drop the newest ones
+        for row in _scan(store, "ai_analysis_results", "id,file_id,created_at",
+                         filters=[("file_id", "in", batch)], order=ANALYSIS_ORDER):
+            analyses[row["file_id"]] = row
+    fingerprints = {file_id: file_fingerprint(upload, analyses.get(file_id)) for file_id, upload in uploads.items()}
+
+    # What the previous run aggregated
+    previous = {
+        row["file_id"]: row
+        for row in _scan(store, "report_file_aggregates", "id,file_id,fingerprint",
+                         filters=[("report_id", "eq", report_id)], order=[("id", False)])
+    }
+    changed = [file_id for file_id, fingerprint in fingerprints.items()
+               if previous.get(file_id, {}).get("fingerprint") != fingerprint]
+    removed = [file_id for file_id in previous if file_id not in fingerprints]
+
+    # Totals left by an interrupted run are not adjusted but rebuilt
+    totals = None if content.get("incomplete") else content.get("totals")
+    incremental = totals is not None
+    stale = [file_id for file_id in changed + removed if file_id in previous]
+    if not incremental:
+        # No totals to adjust (first run, reset or interrupted run): start from the aggregates that are still valid
+        totals = _empty_totals()
+        unchanged = [file_id for file_id in previous if file_id not in stale]
+        for batch in _batches(unchanged):
+            for row in store.select("report_file_aggregates", columns="aggregate",
+                                    filters=[("report_id", "eq", report_id), ("file_id", "in", batch)]):
+                _apply(totals, row["aggregate"], +1)
+    for batch in _batches(stale):
+        if incremental:
+            for row in store.select("report_file_aggregates", columns="aggregate",
+                                    filters=[("report_id", "eq", report_id), ("file_id", "in", batch)]):
+                _apply(totals, row["aggregate"], -1)
+        store.delete("report_file_aggregates", [("report_id", "eq", report_id), ("file_id", "in", batch)])
+
+    # Aggregate the new and changed files
+    for batch in _batches(changed):
+        full_analyses = {
+            row["file_id"]: row
+            for row in _scan(store, "ai_analysis_results", "id,file_id,summary,keywords,created_at",
+                             filters=[("file_id", "in", batch)], order=ANALYSIS_ORDER)
+        }
+        contents = {
+            row["file_id"]: row
+            for row in store.select("report_content", columns="file_id,extracted_text,text_length,word_count",
+                                    filters=[("file_id", "in", batch)])
+        }
+        rows = []
+        for file_id in batch:
+            aggregate = file_aggregate(uploads[file_id], full_analyses.get(file_id), contents.get(file_id))
+            _apply(totals, aggregate, +1)
+            rows.append({
+                "report_id": report_id,
+                "file_id": file_id,
+                "fingerprint": fingerprints[file_id],
+                "aggregate": aggregate,
+                "updated_at": datetime.utcnow().isoformat(),
+            })
+        store.insert("report_file_aggregates", rows)
+
+    # Most recent files, with their summaries from the stored aggregates
+    recent_ids = sorted(uploads, key=lambda file_id: (uploads[file_id].get("upload_timestamp") or "", file_id),
+                        reverse=True)[:RECENT_FILES]
+    recent_aggregates = {}
+    if recent_ids:
+        for row in store.select("report_file_aggregates", columns="file_id,aggregate",
+                                filters=[("report_id", "eq", report_id), ("file_id", "in", recent_ids)]):
+            recent_aggregates[row["file_id"]] = row["aggregate"]
+    timestamps = [upload["upload_timestamp"] for upload in uploads.values() if upload.get("upload_timestamp")]
+
+    elapsed = time.monotonic() - started
+    content = {
+        "totals": totals,
+        "file_count": totals["file_count"],
+        "total_characters": totals["characters"],
+        "total_words": totals["words"],
+        "top_keywords": [
+            {"keyword": keyword, "count": count}
+            for keyword, count in Counter(totals["keyword_counts"]).most_common(TOP_KEYWORDS)
+        ],
+        "first_upload": min(timestamps) if timestamps else None,
+        "last_upload": max(timestamps) if timestamps else None,
+        "recent_files": [
+            {"file_id": file_id, **{k: v for k, v in recent_aggregates.get(file_id, {}).items()
+                                    if k in ("filename", "uploaded_at", "summary", "keywords")}}
+            for file_id in recent_ids
+        ],
+        "last_run": {
+            "files_aggregated": len(changed),
+            "files_removed": len(removed),
+            "seconds": round(elapsed, 3),
+        },
+    }
+    now = datetime.utcnow().isoformat()
+    rows = store.update("reports", {
+        "status": "ready",
+        "content": content,
+        "error": None,
+        "generated_at": now,
+        "updated_at": now,
+    }, [("id", "eq", report_id)])
+    logger.info(
+        f"Report {report_id} ready: {totals['file_count']} files, {len(changed)} aggregated, "
+        f"{len(removed)} removed in {elapsed:.2f}s"
+    )
+    return rows[0] if rows else report
+
+
+def reset_aggregates(store: TableStore, report_id: str):
+    """Forgets every partial aggregate, e.g. when the report's organization changes."""
+    store.delete("report_file_aggregates", [("report_id", "eq", report_id)])
+    store.update("reports", {"content": None, "status": "draft"}, [("id", "eq", report_id)])
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import sqlite3
+import logging
+from contextlib import contextmanager
+from typing import List, Optional
+
+from app.config import settings
+from app.services.text_store import load_texts
+
+logger = logging.getLogger(__name__)
+
+# `documents` holds the filterable metadata; `documents_fts` is an FTS5 index
+# over the searchable text sharing its rowid. Porter stemming lets "acquisition"
+# match "acquisitions".
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    rowid INTEGER PRIMARY KEY,
+    file_id TEXT NOT NULL UNIQUE,
+    organization_id TEXT,
+    filename TEXT,
+    uploaded_at TEXT,
+    keywords TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS documents_org_date_idx ON documents (organization_id, uploaded_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    filename, keywords, body, tokenize = 'porter unicode61'
+);
+"""
+
+# Column weights for bm25(): a hit in the filename or the AI keywords counts
+# for more than one in the body text.
+BM25_WEIGHTS = (4.0, 3.0, 1.0)
+SNIPPET_TOKENS = 24
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turns free text into a safe FTS5 expression: every word or "quoted phrase"
+    must match, and a trailing * on a word makes it a prefix search. A word
+    with punctuation inside ("don't", "Q3-2024") is split where the tokenizer
+    split it when indexing, and its parts must appear in a row.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+        if phrase:
+            terms.append('"' + phrase.replace('"', "") + '"')
+            continue
+        prefix = word.endswith("*")
+        # unicode61 keeps letters and digits together and separates on everything else
+        tokens = re.findall(r"[^\W_]+", word)
+        if tokens:
+            terms.append('"' + " ".join(tokens) + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise InvalidQuery("Query has no searchable terms")
+    return " AND ".join(terms)
+
+
+class SearchIndex:
+    def __init__(self, path: str = None):
+        self.path = path or settings.SEARCH_INDEX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def index_document(self, file_id: str, text: str, organization_id: Optional[str] = None,
+                       filename: Optional[str] = None, uploaded_at: Optional[str] = None,
+                       keywords: Optional[List[str]] = None):
+        """Adds a document, or replaces it if the file was indexed before."""
+        keywords = keywords or []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT rowid FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row["rowid"],))
+                conn.execute("DELETE FROM documents WHERE rowid = ?", (row["rowid"],))
+            cursor = conn.execute(
+                "INSERT INTO documents (file_id, organization_id, filename, uploaded_at, keywords) VALUES (?, ?, ?, ?, ?)",
+                (file_id, organization_id, filename, uploaded_at, json.dumps(keywords)),
+            )
+            conn.execute(
+                "INSERT INTO documents_fts (rowid, filename, keywords, body) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, filename or "", " ; ".join(keywords), text),
+            )
+            conn.execute("COMMIT")
+
+    def remove_document(self, file_id: str):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT rowid FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row["rowid"],))
+                conn.execute("DELETE FROM documents WHERE rowid = ?", (row["rowid"],))
+            conn.execute("COMMIT")
+
+    def search(self, query: str, organization_id: Optional[str] = None, uploaded_after: Optional[str] = None,
+               uploaded_before: Optional[str] = None, keyword: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> List[dict]:
+        """
+        Ranks matching documents by BM25 (best first) and returns each with a
+        snippet of the body and the filename with matches wrapped in <mark>.
+        """
+        match = build_match_query(query)
+        if keyword:
+            match = f"({match}) AND keywords : ({build_match_query(keyword)})"
+        conditions = ["documents_fts MATCH ?"]
+        params = [match]
+        if organization_id:
+            conditions.append("d.organization_id = ?")
+            params.append(organization_id)
+        if uploaded_after:
+            conditions.append("d.uploaded_at >= ?")
+            params.append(uploaded_after)
+        if uploaded_before:
+            conditions.append("d.uploaded_at < ?")
+            params.append(uploaded_before)
+        sql = (
+            "SELECT d.file_id, d.organization_id, d.filename, d.uploaded_at, d.keywords, "
+            f"bm25(documents_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS rank, "
+            f"snippet(documents_fts, 2, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet, "
+            "highlight(documents_fts, 0, '<mark>', '</mark>') AS filename_highlight "
+            "FROM documents_fts JOIN documents d ON d.rowid = documents_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ? OFFSET ?"
+        )
+        params += [limit, offset]
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise InvalidQuery(str(e))
+        return [
+            {
+                "file_id": row["file_id"],
+                "organization_id": row["organization_id"],
+                "filename": row["filename"],
+                "uploaded_at": row["uploaded_at"],
+                "keywords": json.loads(row["keywords"]),
+                # bm25() is lower-is-better; expose a higher-is-better score
+                "score": -row["rank"],
+                "snippet": row["snippet"],
+                "filename_highlight": row["filename_highlight"],
+            }
+            for row in rows
+        ]
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+_index = None
+
+
+def get_search_index() -> SearchIndex:
+    global _index
+    if _index is None:
+        _index = SearchIndex()
+    return _index
+
+
+def rebuild_from_store(store, index: SearchIndex = None, batch_size: int = 200) -> int:
+    """Indexes every existing report_content row, e.g. after creating the index on an existing database."""
+    index = index or get_search_index()
+    indexed = 0
+    after = None
+    while True:
+        contents = store.select(
+            "report_content", columns="id,file_id,extracted_text,compression",
+            order=[("id", False)], limit=batch_size, after=after,
+        )
+        if not contents:
+            break
+        load_texts(store, contents)
+        file_ids = [row["file_id"] for row in contents]
+        uploads = {row["id"]: row for row in store.select("file_uploads", filters=[("id", "in", file_ids)])}
+        analyses = {
+            row["file_id"]: row
+            # Oldest first, so that a file's newest analysis is the one kept
+            for row in store.select("ai_analysis_results", columns="file_id,keywords", filters=[("file_id", "in", file_ids)],
+                                    order=[("created_at", False), ("id", False)])
+        }
+        for row in contents:
+            upload = uploads.get(row["file_id"], {})
+            index.index_document(
+                row["file_id"],
+                row["extracted_text"] or "",
+                organization_id=upload.get("organization_id"),
+                filename=upload.get("filename"),
+                uploaded_at=upload.get("upload_timestamp"),
+                keywords=analyses.get(row["file_id"], {}).get("keywords") or [],
+            )
+            indexed += 1
+        after = [contents[-1]["id"]]
+        logger.info(f"Indexed {indexed} documents")
+    return indexed
+
+
+if __name__ == "__main__":
+    from app.data_access import get_table_store
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {rebuild_from_store(get_table_store())} documents")
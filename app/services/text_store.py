@@ -0,0 +1,198 @@
+import zlib
+import base64
+import logging
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.data_access import TableStore
+
+logger = logging.getLogger(__name__)
+
+# Extracted text is stored compressed, in chunks of a fixed number of
+# characters (report_content_chunks), rather than as one report_content
+# column value. Large documents then make small inserts and small rows, and
+# a character or page range is read by fetching and decompressing only the
+# chunks it overlaps: chunk i holds characters [i * chunk_chars,
+# (i + 1) * chunk_chars). The report_content row keeps what is needed to
+# locate a range without touching the chunks (length, chunk size, page
+# spans) and the word count, so aggregates need no text at all.
+#
+# Rows written before this scheme keep their text inline in extracted_text
+# (compression is null) and are read transparently;
+#
+#   python -m app.services.text_store
+#
+# converts them.
+#
+# Chunks are zlib streams, base64-encoded so that they travel as text through
+# every TableStore (PostgREST has no binary JSON representation).
+
+COMPRESSION = "zlib"
+# Chunk rows per insert, and per select when reading whole documents back
+CHUNK_BATCH_SIZE = 200
+
+CONTENT_COLUMNS = "id,file_id,extracted_text,text_length,word_count,page_spans,chunk_chars,compression"
+
+
+def _compress(text: str) -> str:
+    return base64.b64encode(zlib.compress(text.encode("utf-8"), settings.TEXT_COMPRESSION_LEVEL)).decode("ascii")
+
+
+def _decompress(data: str) -> str:
+    return zlib.decompress(base64.b64decode(data)).decode("utf-8")
+
+
+def page_spans(pages: Sequence[str], offsets: Sequence[int]) -> List[List[int]]:
+    """[start, end) character span of each page in text joined by extraction_cache.join_pages."""
+    return [[start, start + len(page)] for page, start in zip(pages, offsets)]
+
+
+def _batches(items: List, size: int = CHUNK_BATCH_SIZE) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _write_chunks(store: TableStore, file_id: str, text: str, chunk_chars: int) -> int:
+    """Replaces the chunks of a file. Returns their compressed size."""
+    # Chunks of an interrupted earlier attempt would otherwise be read twice
+    store.delete("report_content_chunks", [("file_id", "eq", file_id)])
+    rows = [{
+        "file_id": file_id,
+        "chunk_index": index,
+        "char_start": start,
+        "char_count": len(text[start:start + chunk_chars]),
+        "data": _compress(text[start:start + chunk_chars]),
+    } for index, start in enumerate(range(0, len(text), chunk_chars))]
+    for batch in _batches(rows):
+        store.insert("report_content_chunks", batch)
+    return sum(len(row["data"]) for row in rows)
+
+
+def _text_columns(text: str, chunk_chars: int) -> dict:
+    return {
+        "extracted_text": None,
+        "text_length": len(text),
+        "word_count": len(text.split()),
+        "chunk_chars": chunk_chars,
+        "compression": COMPRESSION,
+    }
+
+
+def store_text(store: TableStore, file_id: str, text: str, spans: Optional[List[List[int]]] = None,
+               extraction_date: str = None) -> dict:
+    """
+    Writes the extracted text of a file: its chunks first, then its
+    report_content row, so that a row with a compression always has all of
+    its chunks. Returns the row.
+    """
+    chunk_chars = settings.TEXT_CHUNK_CHARS
+    _write_chunks(store, file_id, text, chunk_chars)
+    row = {"file_id": file_id, "page_spans": spans, "extraction_date": extraction_date,
+           **_text_columns(text, chunk_chars)}
+    return store.insert("report_content", row)[0]
+
+
+def get_content(store: TableStore, file_id: str) -> Optional[dict]:
+    """The report_content row of a file, or None if its text has not been stored."""
+    rows = store.select("report_content", columns=CONTENT_COLUMNS, filters=[("file_id", "eq", file_id)])
+    return rows[0] if rows else None
+
+
+def text_length(content: dict) -> int:
+    if content.get("compression") is None:
+        return len(content.get("extracted_text") or "")
+    return content["text_length"]
+
+
+def read_range(store: TableStore, content: dict, start: int, end: int) -> str:
+    """Characters [start, end) of a file's text, decompressing only the chunks they fall in."""
+    if content.get("compression") is None:
+        return (content.get("extracted_text") or "")[start:end]
+    end = min(end, content["text_length"])
+    if start >= end:
+        return ""
+    size = content["chunk_chars"]
+    first, last = start // size, (end - 1) // size
+    chunks = store.select(
+        "report_content_chunks", columns="chunk_index,data",
+        filters=[("file_id", "eq", content["file_id"]), ("chunk_index", "gte", first), ("chunk_index", "lte", last)],
+        order=[("chunk_index", False)],
+    )
+    text = "".join(_decompress(chunk["data"]) for chunk in chunks)
+    return text[start - first * size:end - first * size]
+
+
+def page_range(content: dict, first_page: int, last_page: int) -> Tuple[int, int]:
+    """
+    Character span of pages first_page..last_page (1-based, inclusive).
+    Raises ValueError if the pages are out of range or their spans were not
+    stored (text stored before page spans were kept).
+    """
+    spans = content.get("page_spans")
+    if not spans:
+        raise ValueError("Page boundaries are not stored for this file")
+    if not 1 <= first_page <= last_page <= len(spans):
+        raise ValueError(f"Pages must be within 1..{len(spans)}")
+    return spans[first_page - 1][0], spans[last_page - 1][1]
+
+
+def load_texts(store: TableStore, contents: List[dict]) -> List[dict]:
+    """
+    Fills in extracted_text of report_content rows whose text is stored in
+    chunks (the rows need file_id, extracted_text and compression). Returns
+    the rows.
+    """
+    chunked = [row["file_id"] for row in contents if row.get("compression") is not None]
+    if not chunked:
+        return contents
+    parts = {file_id: [] for file_id in chunked}
+    after = None
+    while True:
+        chunks = store.select(
+            "report_content_chunks", columns="file_id,chunk_index,data", filters=[("file_id", "in", chunked)],
+            order=[("file_id", False), ("chunk_index", False)], limit=CHUNK_BATCH_SIZE, after=after,
+        )
+        for chunk in chunks:
+            parts[chunk["file_id"]].append(_decompress(chunk["data"]))
+        if len(chunks) < CHUNK_BATCH_SIZE:
+            break
+        after = [chunks[-1]["file_id"], chunks[-1]["chunk_index"]]
+    for row in contents:
+        if row.get("compression") is not None:
+            row["extracted_text"] = "".join(parts[row["file_id"]])
+    return contents
+
+
+def migrate(store: TableStore, batch_size: int = 50) -> dict:
+    """
+    Converts report_content rows that still hold their text inline to
+    compressed chunks. Safe to interrupt and run again: a row is only
+    updated once all of its chunks are written.
+    """
+    stats = {"converted": 0, "bytes_before": 0, "bytes_after": 0}
+    chunk_chars = settings.TEXT_CHUNK_CHARS
+    after = None
+    while True:
+        contents = store.select("report_content", columns="id,file_id,extracted_text,compression",
+                                order=[("id", False)], limit=batch_size, after=after)
+        if not contents:
+            break
+        for row in contents:
+            if row["compression"] is not None or row["extracted_text"] is None:
+                continue
+            text = row["extracted_text"]
+            stats["bytes_before"] += len(text.encode("utf-8"))
+            stats["bytes_after"] += _write_chunks(store, row["file_id"], text, chunk_chars)
+            store.update("report_content", _text_columns(text, chunk_chars), [("id", "eq", row["id"])])
+            stats["converted"] += 1
+        after = [contents[-1]["id"]]
+        logger.info(f"Converted the text of {stats['converted']} documents")
+    return stats
+
+
+if __name__ == "__main__":
+    from app.data_access import get_table_store
+    logging.basicConfig(level=logging.INFO)
+    result = migrate(get_table_store())
+    print(f"Converted the text of {result['converted']} documents: "
+          f"{result['bytes_before']} bytes inline, {result['bytes_after']} bytes compressed")
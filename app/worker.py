@@ -0,0 +1,249 @@
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import settings
+from app import metrics
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.extraction_cache import get_extraction_cache
+from app.services.events import get_event_log
+from app.services.document_processor import EXTRACTOR_VERSIONS
+from app.services import pipeline
+
+logger = logging.getLogger(__name__)
+
+# Stages that are CPU-bound run in separate processes so that PDF parsing and
+# OCR never compete with request handling for the GIL; the network-bound
+# stages only wait on OpenAI / Supabase and are fine on threads.
+PROCESS_POOL_STAGES = {"extract"}
+
+
+def _run_stage(stage: str, payload: dict, state: dict):
+    """Returns the stage's output and, when run in a child process, the step timings taken meanwhile."""
+    with metrics.capture_steps() as steps:
+        output = pipeline.STAGE_HANDLERS[stage](payload, state)
+    return output, steps
+
+
+def default_concurrency() -> dict:
+    return {
+        "extract": settings.EXTRACT_CONCURRENCY,
+        "analyze": settings.ANALYZE_CONCURRENCY,
+        "persist": settings.PERSIST_CONCURRENCY,
+        "report": settings.REPORT_CONCURRENCY,
+    }
+
+
+class Worker:
+    """
+    Drains the job queue: claims as many jobs per stage as that stage has free
+    slots, runs them on the stage's pool and moves each job on to its next
+    stage, a retry, or its final state.
+    """
+
+    def __init__(self, queue: JobQueue = None, concurrency: dict = None, poll_interval: float = None):
+        self.queue = queue or get_job_queue()
+        self.concurrency = concurrency or default_concurrency()
+        self.poll_interval = poll_interval if poll_interval is not None else settings.WORKER_POLL_INTERVAL
+        self._executors = {}
+        self._in_flight = {stage: {} for stage in self.concurrency}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _executor(self, stage: str):
+        if stage not in self._executors:
+            workers = self.concurrency[stage]
+            if stage in PROCESS_POOL_STAGES:
+                # spawn, not fork: the parent may be a multi-threaded API process
+                self._executors[stage] = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executors[stage] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-worker")
+        return self._executors[stage]
+
+    def start(self):
+        """Runs the worker loop on a background thread."""
+        self._thread = threading.Thread(target=self.run, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info(f"Re-queued {recovered} interrupted job(s)")
+        purged = get_extraction_cache().purge_stale(EXTRACTOR_VERSIONS)
+        if purged:
+            logger.info(f"Purged {purged} cached extraction(s) made by outdated extractors")
+        logger.info(f"Worker started with concurrency {self.concurrency}")
+        next_prune = 0.0
+        next_lease_check = time.monotonic() + settings.JOB_LEASE_RENEW_INTERVAL
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_prune:
+                self._prune_events()
+                next_prune = time.monotonic() + 3600
+            if time.monotonic() >= next_lease_check:
+                self._check_leases()
+                next_lease_check = time.monotonic() + settings.JOB_LEASE_RENEW_INTERVAL
+            try:
+                claimed = self.poll_once()
+            except Exception as e:
+                logger.error(f"Error while polling the job queue: {str(e)}", exc_info=True)
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _check_leases(self):
+        # Renew the leases of this worker's jobs first, so that they are never
+        # taken for abandoned however long they run; then re-queue the jobs of
+        # workers that died since startup
+        with self._lock:
+            job_ids = [job_id for jobs in self._in_flight.values() for job_id in jobs]
+        try:
+            self.queue.renew(job_ids)
+            recovered = self.queue.recover()
+            if recovered:
+                logger.info(f"Re-queued {recovered} interrupted job(s)")
+        except Exception as e:
+            logger.warning(f"Could not renew job leases: {e}")
+
+    def _prune_events(self):
+        try:
+            pruned = get_event_log().prune()
+            if pruned:
+                logger.info(f"Pruned {pruned} old processing event(s)")
+        except Exception as e:
+            logger.warning(f"Could not prune processing events: {e}")
+
+    def poll_once(self) -> int:
+        claimed = 0
+        for stage, limit in self.concurrency.items():
+            with self._lock:
+                free = limit - len(self._in_flight[stage])
+            for job in self.queue.claim(stage, free):
+                pipeline.on_stage_event(job.kind, job.stage, job.payload, "started", job.attempts)
+                # The job's priority travels with it, so the analyze stage's requests queue at the same level
+                payload = {**job.payload, "priority": job.priority}
+                future = self._executor(stage).submit(_run_stage, job.stage, payload, job.state)
+                with self._lock:
+                    self._in_flight[stage][job.id] = future
+                    metrics.IN_FLIGHT.set(len(self._in_flight[stage]), stage=stage)
+                future.add_done_callback(partial(self._finish, job, time.perf_counter()))
+                claimed += 1
+        return claimed
+
+    def _finish(self, job, started, future):
+        seconds = time.perf_counter() - started
+        try:
+            output, steps = future.result()
+        except CancelledError:
+            self.queue.release(job.id)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._reset_executor(job.stage)
+            error = metrics.truncate(f"{type(e).__name__}: {e}", settings.LOG_MAX_MESSAGE_CHARS)
+            retry = self.queue.fail(job, error, pipeline.is_retryable(e))
+            outcome = "retry" if retry else "failed"
+            metrics.STAGE_SECONDS.observe(seconds, stage=job.stage, outcome=outcome)
+            metrics.JOBS_TOTAL.inc(stage=job.stage, outcome=outcome)
+            if retry:
+                pipeline.on_stage_event(job.kind, job.stage, job.payload, "retry", job.attempts)
+                logger.warning(f"Job {job.id} failed at stage '{job.stage}' (attempt {job.attempts}), will retry: {error}")
+            else:
+                logger.error(f"Job {job.id} failed at stage '{job.stage}' after {job.attempts} attempts: {error}")
+                pipeline.on_job_failed(job.kind, job.payload, error)
+        else:
+            metrics.observe_steps(steps)
+            metrics.STAGE_SECONDS.observe(seconds, stage=job.stage, outcome="done")
+            metrics.JOBS_TOTAL.inc(stage=job.stage, outcome="done")
+            pipeline.on_stage_event(job.kind, job.stage, job.payload, "done", job.attempts)
+            state = {**job.state, **(output or {})}
+            following = pipeline.next_stage(job.kind, job.stage)
+            if following:
+                self.queue.advance(job.id, following, state)
+            else:
+                self.queue.complete(job.id)
+                pipeline.on_job_done(job.kind, job.payload)
+        finally:
+            with self._lock:
+                self._in_flight[job.stage].pop(job.id, None)
+                metrics.IN_FLIGHT.set(len(self._in_flight[job.stage]), stage=job.stage)
+            self._wake.set()
+
+    def _reset_executor(self, stage: str):
+        # A pool whose child died (e.g. OOM-killed during OCR) rejects all further work
+        with self._lock:
+            executor = self._executors.pop(stage, None)
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(jobs) for jobs in self._in_flight.values())
+
+    def stop(self, drain: bool = True, timeout: float = None):
+        """
+        Stops claiming new jobs. With `drain`, waits for in-flight jobs to
+        finish; otherwise they are put back in the queue for the next start.
+        """
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        for executor in list(self._executors.values()):
+            executor.shutdown(wait=drain, cancel_futures=not drain)
+        logger.info("Worker stopped")
+
+
+def serve_metrics(port: int):
+    """Serves GET /metrics for a standalone worker on a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving worker metrics on port {port}")
+    return server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    metrics.install_log_bounds()
+    worker = Worker()
+    if settings.WORKER_METRICS_PORT:
+        serve_metrics(settings.WORKER_METRICS_PORT)
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, draining in-flight jobs...")
+        worker._stopping.set()
+        worker._wake.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run()
+    worker.stop(drain=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares two result files from bench.run metric by metric.
+
+    python -m bench.compare baseline.json candidate.json [--threshold 0.10]
+
+Exits with status 1 if any metric got worse by more than the threshold.
+"""
+import sys
+import json
+import argparse
+
+# Suffixes of metrics where a bigger number is better; any other timing is
+# better when smaller. Counts and sizes are shown but never judged.
+HIGHER_IS_BETTER = ("per_sec",)
+LOWER_IS_BETTER = ("seconds", "p50", "p95", "max", "_mb")
+IGNORED = ("files", "pages", "bytes", "characters", "concurrency", "requests", "processed")
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(metric: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if not judged."""
+    last = metric.rsplit(".", 1)[-1]
+    if last.endswith(HIGHER_IS_BETTER):
+        return 1
+    if last in IGNORED or last.endswith("_requests") or last in ("errors", "timed_out"):
+        return 0
+    if last.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    old, new = flatten(baseline["results"]), flatten(candidate["results"])
+    rows, regressions = [], []
+    for metric in sorted(set(old) | set(new)):
+        before, after = old.get(metric), new.get(metric)
+        if before is None or after is None:
+            rows.append((metric, before, after, "", ""))
+            continue
+        change = (after - before) / before if before else 0.0
+        sense = direction(metric)
+        verdict = ""
+        if sense and abs(change) > threshold:
+            worse = change * sense < 0
+            verdict = "REGRESSION" if worse else "improved"
+            if worse:
+                regressions.append(metric)
+        rows.append((metric, before, after, f"{change:+.1%}", verdict))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts (default 0.10)")
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"{baseline['meta']['commit']} -> {candidate['meta']['commit']}")
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    for metric, before, after, change, verdict in rows:
+        print(f"{metric:<{width}}  {before!s:>12}  {after!s:>12}  {change:>8}  {verdict}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Synthetic documents for the benchmarks: text-layer PDFs, scanned (image-only)
+PDFs and DOCX files of configurable size. Generation is seeded, so the same
+arguments always produce byte-identical files with distinct text per file.
+"""
+import os
+import random
+from typing import List
+
+VOCABULARY = (
+    "market revenue growth margin customer segment strategy competitor acquisition pricing forecast "
+    "quarter demand supply chain risk regulation investment portfolio product launch channel retail "
+    "digital platform cloud analytics subscription churn retention brand share expansion region europe "
+    "asia america partnership innovation cost efficiency operating profit guidance outlook inflation "
+    "consumer enterprise software hardware logistics sustainability energy capital expenditure dividend"
+).split()
+
+LINE_CHARS = 90
+LINES_PER_PAGE = 48
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, words: int) -> str:
+    parts = []
+    count = 0
+    while count < words:
+        parts.append(sentence(rng))
+        count += len(parts[-1].split())
+    return " ".join(parts)
+
+
+def _wrap(text: str, width: int = LINE_CHARS) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _page_lines(rng: random.Random, pages: int) -> List[List[str]]:
+    return [
+        _wrap(paragraph(rng, LINES_PER_PAGE * LINE_CHARS // 7))[:LINES_PER_PAGE]
+        for _ in range(pages)
+    ]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, pages: int, seed: int = 0):
+    """A PDF whose pages carry a real text layer (Helvetica), like an exported report."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in _page_lines(rng, pages):
+        body = "BT /F1 11 Tf 14 TL 50 760 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % content_number
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def write_scanned_pdf(path: str, pages: int, seed: int = 0, dpi: int = 150):
+    """A PDF of page images with no text layer, like a scanned report; needs OCR."""
+    from PIL import Image, ImageDraw, ImageFont
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=max(12, dpi // 7))
+    images = []
+    for lines in _page_lines(rng, pages):
+        image = Image.new("L", (int(8.5 * dpi), int(11 * dpi)), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        for line in lines:
+            draw.text((dpi // 2, y), line, fill=0, font=font)
+            y += int(dpi * 0.2)
+        images.append(image)
+    images[0].save(path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    for image in images:
+        image.close()
+
+
+def write_docx(path: str, paragraphs: int, seed: int = 0, table_rows: int = 10):
+    from docx import Document
+    rng = random.Random(seed)
+    document = Document()
+    document.add_heading(sentence(rng), level=1)
+    for _ in range(paragraphs):
+        document.add_paragraph(paragraph(rng, 120))
+    if table_rows:
+        table = document.add_table(rows=table_rows, cols=3)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = f"{rng.choice(VOCABULARY)} {rng.randint(1, 9999)}"
+    document.save(path)
+
+
+def generate_corpus(directory: str, count: int = 10, formats=("text_pdf", "docx"),
+                    pages: int = 10, seed: int = 0) -> List[dict]:
+    """
+    Writes `count` documents per format into `directory`; a DOCX gets about
+    as much text as a PDF of `pages` pages. Returns one dict per file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    writers = {
+        "text_pdf": (".pdf", lambda path, s: write_text_pdf(path, pages, s)),
+        "scanned_pdf": (".pdf", lambda path, s: write_scanned_pdf(path, pages, s)),
+        "docx": (".docx", lambda path, s: write_docx(path, pages * 5, s)),
+    }
+    documents = []
+    for format_index, name in enumerate(formats):
+        extension, write = writers[name]
+        for i in range(count):
+            path = os.path.join(directory, f"{name}_{i:04d}{extension}")
+            write(path, seed * 1_000_003 + format_index * 10_007 + i)
+            documents.append({
+                "path": path,
+                "format": name,
+                "pages": pages,
+                "bytes": os.path.getsize(path),
+            })
+    return documents
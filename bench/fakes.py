@@ -0,0 +1,269 @@
+"""
+In-process stand-ins for the external services, so the pipeline can be
+measured without network access or API keys:
+
+- FakeSupabaseClient implements the part of the supabase-py / postgrest
+  query builder that app.data_access.SupabaseStore uses, over in-memory
+  tables, with an optional per-request latency.
+- FakeAsyncOpenAI answers chat completions after a configurable latency,
+  with replies in the JSON format the analyzer asks for (packed requests
+  included), and can answer a share of requests with 429 rate-limit errors.
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List
+
+import httpx
+
+from bench.corpus import VOCABULARY
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+}
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def _parse_logic(expression: str):
+    """Parses a PostgREST `or=(...)` / `and(...)` expression into a row predicate."""
+    expression = expression.strip()
+    for keyword, combine in (("or(", any), ("and(", all), ("(", any)):
+        if expression.startswith(keyword) and expression.endswith(")"):
+            terms = [_parse_logic(part) for part in _split_top_level(expression[len(keyword):-1])]
+            return lambda row: combine(term(row) for term in terms)
+    column, op, value = expression.split(".", 2)
+    if value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    return lambda row: _OPERATORS[op](_comparable(row.get(column)), value)
+
+
+def _comparable(stored):
+    # Values in a logic expression arrive as query-string text
+    return stored if stored is None or isinstance(stored, str) else str(stored)
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client: "FakeSupabaseClient", table: str):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.values = None
+        self.predicates = []
+        self.ordering = []
+        self.row_limit = None
+        self.params = httpx.QueryParams()
+
+    def select(self, columns: str = "*", **kwargs):
+        self.operation, self.columns = "select", columns
+        return self
+
+    def insert(self, values, **kwargs):
+        self.operation, self.values = "insert", values
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation, self.values = "update", values
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self.predicates.append(lambda row: _OPERATORS[op](row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column, values):
+        values = set(values)
+        self.predicates.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc: bool = False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self.row_limit = size
+        return self
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {name.strip(): row.get(name.strip()) for name in self.columns.split(",")}
+
+    def execute(self) -> _Response:
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        predicates = list(self.predicates)
+        for key, value in self.params.multi_items():
+            if key == "or":
+                predicates.append(_parse_logic(value))
+        with self.client.lock:
+            self.client.requests += 1
+            rows = self.client.tables.setdefault(self.table, [])
+            matching = [row for row in rows if all(p(row) for p in predicates)]
+            if self.operation == "select":
+                for column, desc in reversed(self.ordering):
+                    matching.sort(key=lambda row: (row.get(column) is None, row.get(column) or ""), reverse=desc)
+                if self.row_limit is not None:
+                    matching = matching[:self.row_limit]
+                return _Response([self._project(row) for row in matching])
+            if self.operation == "insert":
+                inserted = []
+                for values in self.values if isinstance(self.values, list) else [self.values]:
+                    row = {"id": str(uuid.uuid4()), "created_at": datetime.utcnow().isoformat(), **values}
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return _Response(inserted)
+            if self.operation == "update":
+                for row in matching:
+                    row.update(self.values)
+                return _Response([dict(row) for row in matching])
+            for row in matching:
+                rows.remove(row)
+            return _Response([dict(row) for row in matching])
+
+
+class _Bucket:
+    def remove(self, paths):
+        return []
+
+
+class FakeSupabaseClient:
+    """Thread-safe in-memory tables behind the supabase-py `client.table(...)` API."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.storage = SimpleNamespace(from_=lambda bucket: _Bucket())
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+
+class FakeAsyncOpenAI:
+    """
+    Drop-in for the openai.AsyncOpenAI client made by app.services.ai_analyzer. Each completion
+    takes `latency` seconds plus `per_token` seconds per prompt token (roughly
+    4 characters), with +/- `jitter` relative noise. A `rate_limited` share of
+    requests fails straight away with a 429 carrying `retry_after`.
+    """
+
+    calls = 0
+    rate_limited_calls = 0
+    concurrent = 0
+    peak_concurrent = 0
+
+    def __init__(self, latency: float = 0.5, per_token: float = 0.0, jitter: float = 0.1, seed: int = 0,
+                 rate_limited: float = 0.0, retry_after: float = 0.1, **kwargs):
+        self.latency = latency
+        self.per_token = per_token
+        self.jitter = jitter
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @classmethod
+    def reset_counters(cls):
+        cls.calls = cls.rate_limited_calls = cls.concurrent = cls.peak_concurrent = 0
+
+    def _rate_limit_error(self):
+        import openai
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        response = httpx.Response(429, request=request, headers={"retry-after": str(self.retry_after)})
+        return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+    @staticmethod
+    def _analysis(text: str) -> dict:
+        words = text.split()
+        keywords = sorted({word.strip(".,").lower() for word in words if word.strip(".,").lower() in VOCABULARY})
+        return {"summary": " ".join(words[-40:]), "keywords": keywords[:7]}
+
+    async def _create(self, model: str, messages: list, **kwargs):
+        cls = type(self)
+        cls.calls += 1
+        if self.rate_limited and self.rng.random() < self.rate_limited:
+            cls.rate_limited_calls += 1
+            raise self._rate_limit_error()
+        cls.concurrent += 1
+        cls.peak_concurrent = max(cls.peak_concurrent, cls.concurrent)
+        try:
+            prompt = "".join(message["content"] for message in messages)
+            delay = self.latency + self.per_token * len(prompt) / 4
+            await asyncio.sleep(max(0.0, delay * (1 + self.rng.uniform(-self.jitter, self.jitter))))
+            documents = prompt.split("\n### Document ")[1:]
+            if documents:
+                reply = json.dumps({"results": [
+                    {"document": int(document.split("\n", 1)[0]), **self._analysis(document.split("\n", 1)[1])}
+                    for document in documents
+                ]})
+            else:
+                reply = json.dumps(self._analysis(prompt))
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+                usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(reply) // 4),
+            )
+        finally:
+            cls.concurrent -= 1
+
+    async def close(self):
+        pass
+
+
+def fake_openai_factory(**options):
+    """Returns a replacement for ai_analyzer.create_client with the given latency options."""
+    return lambda *args, **kwargs: FakeAsyncOpenAI(**options)
@@ -0,0 +1,418 @@
+"""
+Offline benchmarks for the ingestion pipeline.
+
+    python -m bench.run                       # writes bench/results/<time>-<commit>.json
+    python -m bench.run --docs 20 --pages 30 --openai-latency 0.8
+    python -m bench.compare old.json new.json
+
+Everything runs in this process against a synthetic corpus, the in-memory
+Supabase fake and the latency-injecting OpenAI fake from bench.fakes; all
+state lives in a temporary directory.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+from bench.corpus import generate_corpus, paragraph
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def configure_environment(workdir: str, args):
+    """Points every piece of local state at `workdir`. Must run before any app module is imported."""
+    os.environ.update({
+        "SUPABASE_URL": "http://supabase.invalid",
+        "SUPABASE_SERVICE_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "DATA_BACKEND": "supabase",
+        "WORKER_MODE": "external",
+        "QUEUE_MAX_BACKLOG": "1000000",
+        # The fake API has no limits; the scheduler's own are measured in bench_llm_scheduler
+        "OPENAI_REQUESTS_PER_MINUTE": "1000000",
+        "OPENAI_TOKENS_PER_MINUTE": "100000000",
+        "WORKER_POLL_INTERVAL": "0.05",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.db"),
+        "EXTRACTION_CACHE_PATH": os.path.join(workdir, "extraction_cache.db"),
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, "analysis_cache.db"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search.db"),
+        "KEYWORD_INDEX_PATH": os.path.join(workdir, "keywords.db"),
+        "EVENTS_PATH": os.path.join(workdir, "events.db"),
+        "NEAR_DUPLICATE_INDEX_PATH": os.path.join(workdir, "near_duplicates.db"),
+        "RELATED_INDEX_PATH": os.path.join(workdir, "related_index.db"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'app.db')}",
+    })
+    os.chdir(workdir)  # temp_uploads/ is relative to the working directory
+
+
+def install_fakes(args):
+    from bench.fakes import FakeSupabaseClient, fake_openai_factory
+    import app.database
+    import app.data_access
+    import app.services.ai_analyzer as ai_analyzer
+    client = FakeSupabaseClient(latency=args.supabase_latency)
+    app.database.get_supabase = lambda: client
+    app.data_access.get_table_store.cache_clear()
+    ai_analyzer.create_client = fake_openai_factory(
+        latency=args.openai_latency, per_token=args.openai_per_token, jitter=args.openai_jitter
+    )
+    return client
+
+
+def ocr_available() -> bool:
+    return bool(shutil.which("tesseract") and shutil.which("pdftoppm"))
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "p50": round(statistics.median(ordered), 4),
+        "p95": round(pick(0.95), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def bench_extraction(documents):
+    """Pages per second of each extractor, uncached, on this thread."""
+    from app.services.document_processor import extract_pages_from_file
+    results = {}
+    for name in sorted({doc["format"] for doc in documents}):
+        docs = [doc for doc in documents if doc["format"] == name]
+        pages = characters = 0
+        started = time.perf_counter()
+        for doc in docs:
+            extracted = extract_pages_from_file(doc["path"], os.path.basename(doc["path"]))
+            pages += doc["pages"]
+            characters += sum(len(page) for page in extracted)
+        seconds = time.perf_counter() - started
+        results[name] = {
+            "files": len(docs),
+            "pages": pages,
+            "characters": characters,
+            "seconds": round(seconds, 4),
+            "pages_per_sec": round(pages / seconds, 2),
+        }
+    return results
+
+
+def bench_ai(word_counts, seed: int = 0):
+    """Wall time of the analyze stage for documents of several sizes."""
+    import random
+    from bench.fakes import FakeAsyncOpenAI
+    from app.services.ai_analyzer import analyze_text_with_openai, get_scheduler
+    rng = random.Random(seed)
+    results = {}
+    for words in word_counts:
+        text = paragraph(rng, words)
+        FakeAsyncOpenAI.reset_counters()
+        started = time.perf_counter()
+        result = analyze_text_with_openai(text)
+        seconds = time.perf_counter() - started
+        if result.get("error"):
+            raise RuntimeError(f"Analysis failed: {result['error']}")
+        results[f"{words}_words"] = {
+            "seconds": round(seconds, 4),
+            "requests": FakeAsyncOpenAI.calls,
+            "peak_concurrent_requests": FakeAsyncOpenAI.peak_concurrent,
+            "tokens_per_sec": get_scheduler().stats()["tokens_per_sec"],
+        }
+    return results
+
+
+def bench_llm_scheduler(args, documents: int = 200, words: int = 150, threads: int = 16):
+    """
+    Many short documents analysed at once from `threads` worker threads, as
+    the analyze stage does: one request each, packed several to a request,
+    and with one request in ten answered by a 429.
+    """
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    from bench.fakes import FakeAsyncOpenAI, fake_openai_factory
+    import app.services.ai_analyzer as ai_analyzer
+    from app.config import settings
+    from app.services.job_queue import PRIORITY_BULK
+    original = (ai_analyzer.create_client, settings.OPENAI_PACK_MAX_DOCUMENTS)
+    runs = {"unpacked": (1, 0.0), "packed": (original[1], 0.0), "packed_rate_limited": (original[1], 0.1)}
+    results = {}
+    try:
+        for offset, (name, (pack, rate_limited)) in enumerate(runs.items()):
+            # Fresh texts and a fresh scheduler for each run, so neither the cache nor earlier 429s interfere
+            rng = random.Random(args.seed + 100 + offset)
+            texts = [paragraph(rng, words) for _ in range(documents)]
+            settings.OPENAI_PACK_MAX_DOCUMENTS = pack
+            ai_analyzer.create_client = fake_openai_factory(
+                latency=args.openai_latency, per_token=args.openai_per_token, jitter=args.openai_jitter,
+                rate_limited=rate_limited,
+            )
+            ai_analyzer._scheduler = None
+            FakeAsyncOpenAI.reset_counters()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                analysed = list(pool.map(lambda text: ai_analyzer.analyze_text_with_openai(text, PRIORITY_BULK), texts))
+            seconds = time.perf_counter() - started
+            failed = sum(1 for result in analysed if result.get("error") or not result.get("summary"))
+            stats = ai_analyzer.get_scheduler().stats()
+            results[name] = {
+                "seconds": round(seconds, 4),
+                "documents_per_sec": round(documents / seconds, 2),
+                "requests": FakeAsyncOpenAI.calls,
+                "rate_limited_requests": FakeAsyncOpenAI.rate_limited_calls,
+                "failed_documents": failed,
+                "tokens_per_sec": stats["tokens_per_sec"],
+                "queue_wait_p50": stats["queue_wait_p50"],
+                "queue_wait_max": stats["queue_wait_max"],
+            }
+    finally:
+        ai_analyzer.create_client, settings.OPENAI_PACK_MAX_DOCUMENTS = original
+        ai_analyzer._scheduler = None
+    return results
+
+
+async def _upload_all(documents, concurrency: int):
+    import httpx
+    from app.main import app
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    uploaded = {}
+
+    async def upload(client, doc):
+        with open(doc["path"], "rb") as f:
+            content = f.read()
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/v1/uploads/", files={"file": (os.path.basename(doc["path"]), content)}
+            )
+            latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        uploaded[response.json()["id"]] = time.perf_counter()
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await asyncio.gather(*[upload(client, doc) for doc in documents])
+    return latencies, uploaded
+
+
+def bench_upload(documents, concurrency: int):
+    """Requests per second through POST /uploads (hashing, spooling, insert, enqueue); no processing."""
+    started = time.perf_counter()
+    latencies, _ = asyncio.run(_upload_all(documents, concurrency))
+    seconds = time.perf_counter() - started
+    total_bytes = sum(doc["bytes"] for doc in documents)
+    return {
+        "files": len(documents),
+        "bytes": total_bytes,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 4),
+        "files_per_sec": round(len(documents) / seconds, 2),
+        "mb_per_sec": round(total_bytes / seconds / 1e6, 2),
+        "latency_seconds": percentiles(latencies),
+    }
+
+
+def bench_batch_upload(documents, archive_path: str):
+    """One POST /uploads/batch with every document in a ZIP: streaming out, bulk insert, bulk enqueue."""
+    import zipfile
+    import httpx
+    from app.main import app
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for doc in documents:
+            archive.write(doc["path"], os.path.basename(doc["path"]))
+    with open(archive_path, "rb") as f:
+        content = f.read()
+
+    async def upload():
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+            response = await client.post(
+                "/api/v1/uploads/batch", files=[("files", (os.path.basename(archive_path), content, "application/zip"))]
+            )
+            response.raise_for_status()
+            return response.json()
+
+    started = time.perf_counter()
+    result = asyncio.run(upload())
+    seconds = time.perf_counter() - started
+    return {
+        "files": result["file_count"],
+        "bytes": len(content),
+        "seconds": round(seconds, 4),
+        "files_per_sec": round(result["file_count"] / seconds, 2),
+    }
+
+
+def bench_end_to_end(documents, concurrency: int, timeout: float):
+    """Time from upload response to status 'processed', with the worker running in-process."""
+    from app.data_access import get_table_store
+    from app.worker import Worker
+    worker = Worker()
+    worker.start()
+    try:
+        started = time.perf_counter()
+        _, uploaded = asyncio.run(_upload_all(documents, concurrency))
+        store = get_table_store()
+        finished = {}
+        deadline = time.perf_counter() + timeout
+        while len(finished) < len(uploaded) and time.perf_counter() < deadline:
+            for row in store.select("file_uploads", columns="id,status", filters=[("id", "in", list(uploaded))]):
+                if row["status"] in ("processed", "error") and row["id"] not in finished:
+                    finished[row["id"]] = (time.perf_counter(), row["status"])
+            time.sleep(0.02)
+        seconds = time.perf_counter() - started
+    finally:
+        worker.stop(drain=False)
+    processed = [file_id for file_id, (_, status) in finished.items() if status == "processed"]
+    return {
+        "files": len(documents),
+        "processed": len(processed),
+        "errors": len(finished) - len(processed),
+        "timed_out": len(uploaded) - len(finished),
+        "seconds": round(seconds, 4),
+        "files_per_sec": round(len(processed) / seconds, 2) if processed else 0.0,
+        "time_to_processed_seconds": percentiles([finished[i][0] - uploaded[i] for i in processed]),
+    }
+
+
+_STARTUP_PROBE = """
+import sys, json, time, asyncio, httpx
+started = time.perf_counter()
+if sys.argv[1] == "api":
+    from app.main import app
+    imported = time.perf_counter()
+    async def first_request():
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            (await client.get("/")).raise_for_status()
+    asyncio.run(first_request())
+else:
+    import app.worker
+    imported = time.perf_counter()
+responded = time.perf_counter()
+with open("/proc/self/status") as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+print(json.dumps({"import": imported - started, "first_request": responded - imported, "rss": rss * 1024}))
+"""
+
+
+def bench_startup(runs: int = 5):
+    """Cold start of a fresh API / job worker process: import time, first request and resident memory."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": root}
+    results = {}
+    for role in ("api", "worker"):
+        samples = [
+            json.loads(subprocess.run(
+                [sys.executable, "-c", _STARTUP_PROBE, role], env=env, capture_output=True, text=True, check=True,
+            ).stdout.splitlines()[-1])
+            for _ in range(runs)
+        ]
+        results[role] = {
+            "import_seconds": round(statistics.median(s["import"] for s in samples), 4),
+            "rss_mb": round(statistics.median(s["rss"] for s in samples) / 1e6, 1),
+        }
+        if role == "api":
+            results[role]["first_request_seconds"] = round(statistics.median(s["first_request"] for s in samples), 4)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR),
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=8, help="documents per format")
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--upload-concurrency", type=int, default=8)
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="seconds per completion")
+    parser.add_argument("--openai-per-token", type=float, default=0.0, help="extra seconds per prompt token")
+    parser.add_argument("--openai-jitter", type=float, default=0.1)
+    parser.add_argument("--supabase-latency", type=float, default=0.0, help="seconds per table request")
+    parser.add_argument("--ai-words", default="500,5000,50000", help="document sizes for the AI benchmark")
+    parser.add_argument("--timeout", type=float, default=600, help="end-to-end time limit in seconds")
+    parser.add_argument("--only", default="startup,extraction,ai,llm_scheduler,end_to_end,upload,batch_upload", help="benchmarks to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="result file (default: bench/results/<time>-<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    out = os.path.abspath(args.out) if args.out else None
+    only = set(args.only.split(","))
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    configure_environment(workdir, args)
+    install_fakes(args)
+
+    formats = ["text_pdf", "docx"]
+    skipped = {}
+    if ocr_available():
+        formats.append("scanned_pdf")
+    else:
+        skipped["scanned_pdf"] = "tesseract or poppler (pdftoppm) not installed"
+
+    results = {}
+    try:
+        if "startup" in only:
+            results["startup"] = bench_startup()
+        if "extraction" in only:
+            documents = generate_corpus(os.path.join(workdir, "corpus-extraction"), args.docs, formats,
+                                        args.pages, args.seed)
+            results["extraction"] = bench_extraction(documents)
+        if "ai" in only:
+            results["ai"] = bench_ai([int(words) for words in args.ai_words.split(",")], args.seed)
+        if "llm_scheduler" in only:
+            results["llm_scheduler"] = bench_llm_scheduler(args)
+        # End to end runs before the upload benchmark so that its worker does not also drain those jobs
+        if "end_to_end" in only:
+            documents = generate_corpus(os.path.join(workdir, "corpus-e2e"), args.docs, formats,
+                                        args.pages, args.seed + 1)
+            results["end_to_end"] = bench_end_to_end(documents, args.upload_concurrency, args.timeout)
+        if "upload" in only:
+            documents = generate_corpus(os.path.join(workdir, "corpus-upload"), args.docs, formats,
+                                        args.pages, args.seed + 2)
+            results["upload"] = bench_upload(documents, args.upload_concurrency)
+        if "batch_upload" in only:
+            documents = generate_corpus(os.path.join(workdir, "corpus-batch"), args.docs, formats,
+                                        args.pages, args.seed + 3)
+            results["batch_upload"] = bench_batch_upload(documents, os.path.join(workdir, "batch.zip"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "parameters": {**vars(args), "formats": formats, "skipped": skipped},
+        "results": results,
+    }
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['commit']}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
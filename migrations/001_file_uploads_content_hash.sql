@@ -0,0 +1,4 @@
+-- Uploads are stored under their SHA-256 so byte-identical re-uploads can
+-- reuse the existing file_uploads / report_content rows.
+alter table file_uploads add column if not exists content_hash text;
+create index if not exists file_uploads_content_hash_idx on file_uploads (content_hash);
@@ -0,0 +1,5 @@
+-- Keyset pagination of the list endpoints walks these orderings.
+create index if not exists file_uploads_upload_timestamp_id_idx on file_uploads (upload_timestamp desc, id desc);
+create index if not exists file_uploads_status_idx on file_uploads (status);
+create index if not exists file_uploads_user_id_idx on file_uploads (user_id);
+create index if not exists organizations_created_at_id_idx on organizations (created_at, id);
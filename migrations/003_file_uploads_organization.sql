@@ -0,0 +1,4 @@
+-- Uploads can belong to an organization; search, reports and keyword
+-- statistics are scoped by it.
+alter table file_uploads add column if not exists organization_id uuid references organizations (id) on delete set null;
+create index if not exists file_uploads_organization_id_idx on file_uploads (organization_id, upload_timestamp desc);
@@ -0,0 +1,25 @@
+-- Reports and the per-file partial aggregates that make regenerating them
+-- incremental: only files whose fingerprint changed are aggregated again.
+create table if not exists reports (
+    id uuid primary key default gen_random_uuid(),
+    title text not null,
+    description text,
+    organization_id uuid references organizations (id) on delete cascade,
+    status text not null default 'draft',
+    content jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    generated_at timestamptz
+);
+create index if not exists reports_organization_id_idx on reports (organization_id, created_at);
+
+create table if not exists report_file_aggregates (
+    id uuid primary key default gen_random_uuid(),
+    report_id uuid not null references reports (id) on delete cascade,
+    file_id uuid not null references file_uploads (id) on delete cascade,
+    fingerprint text not null,
+    aggregate jsonb not null,
+    updated_at timestamptz not null default now(),
+    unique (report_id, file_id)
+);
@@ -0,0 +1,14 @@
+-- Batch uploads (POST /uploads/batch): one row per batch, and the batch each
+-- upload arrived in, so a batch's progress is a count over its uploads.
+create table if not exists upload_batches (
+    id uuid primary key default gen_random_uuid(),
+    organization_id uuid references organizations (id) on delete set null,
+    user_id text,
+    file_count integer not null default 0,
+    duplicate_count integer not null default 0,
+    skipped jsonb,
+    created_at timestamptz not null default now()
+);
+
+alter table file_uploads add column if not exists batch_id uuid references upload_batches (id) on delete set null;
+create index if not exists file_uploads_batch_id_idx on file_uploads (batch_id, id);
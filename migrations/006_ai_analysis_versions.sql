@@ -0,0 +1,7 @@
+-- A file can have several analyses, one per prompt version and model it was
+-- analysed with (see app/services/reanalysis.py); the newest one is current.
+-- Rows from before this migration keep null in both columns.
+alter table ai_analysis_results add column if not exists prompt_version text;
+alter table ai_analysis_results add column if not exists model text;
+create index if not exists ai_analysis_results_file_id_created_at_idx on ai_analysis_results (file_id, created_at);
+create index if not exists ai_analysis_results_created_at_id_idx on ai_analysis_results (created_at, id);
@@ -0,0 +1,3 @@
+-- An analysis reused from a near-duplicate file (app/services/near_duplicates.py)
+-- records the file it was taken from.
+alter table ai_analysis_results add column if not exists duplicate_of uuid references file_uploads (id) on delete set null;
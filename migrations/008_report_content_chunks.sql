@@ -0,0 +1,22 @@
+-- Extracted text stored as zlib-compressed chunks of a fixed number of
+-- characters (see app/services/text_store.py). report_content keeps the
+-- length, chunk size and page spans needed to read a range, and its
+-- extracted_text becomes null; existing rows keep their text inline until
+-- converted with `python -m app.services.text_store`.
+alter table report_content add column if not exists text_length integer;
+alter table report_content add column if not exists word_count integer;
+alter table report_content add column if not exists page_spans jsonb;
+alter table report_content add column if not exists chunk_chars integer;
+alter table report_content add column if not exists compression text;
+alter table report_content alter column extracted_text drop not null;
+
+create table if not exists report_content_chunks (
+    id uuid primary key default gen_random_uuid(),
+    file_id uuid not null references file_uploads (id) on delete cascade,
+    chunk_index integer not null,
+    char_start integer not null,
+    char_count integer not null,
+    -- base64 of the compressed chunk
+    data text not null,
+    unique (file_id, chunk_index)
+);
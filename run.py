@@ -1,4 +1,114 @@
+"""
+    python run.py                      # development server with auto-reload
+    python run.py --prod [--workers N] # production: N API workers plus one job worker
+
+In production mode the API processes run with WORKER_MODE=external and a
+single `python -m app.worker` process drains the job queue. Gunicorn (with
+uvicorn workers and the app preloaded) is used when it is installed,
+otherwise uvicorn's own process manager. On SIGTERM / Ctrl-C the API stops
+accepting connections, finishes in-flight requests, and the job worker
+finishes its in-flight jobs, each within SHUTDOWN_TIMEOUT seconds.
+"""
+import os
+import sys
+import signal
+import argparse
+import importlib.util
+import subprocess
+
 import uvicorn
 
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def start_job_worker() -> subprocess.Popen:
+    # Same working directory as the API (temp_uploads/ is relative to it), so
+    # the project root goes on the worker's path explicitly
+    root = os.path.dirname(os.path.abspath(__file__))
+    path = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))
+    return subprocess.Popen([sys.executable, "-m", "app.worker"], env={**os.environ, "PYTHONPATH": path})
+
+
+def stop_job_worker(process: subprocess.Popen, timeout: float):
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        print(f"Job worker still busy after {timeout:.0f}s, killing it", file=sys.stderr)
+        process.kill()
+        process.wait()
+
+
+def serve_gunicorn(args, timeout: float):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("graceful_timeout", timeout)
+
+        def load(self):
+            from app.main import app
+            return app
+
+    Application().run()
+
+
+def serve_uvicorn(args, timeout: float):
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if _available("uvloop") else "auto",
+        http="httptools" if _available("httptools") else "auto",
+        timeout_graceful_shutdown=timeout,
+        proxy_headers=True,
+    )
+
+
+def run_production(args):
+    # Settings reads the environment when app.config is first imported, so
+    # this goes before any app import (gunicorn preloads the app in this
+    # process) and is passed on to uvicorn's worker processes
+    os.environ["WORKER_MODE"] = "external"
+    from app.config import settings
+    # In case app.config was imported already
+    settings.WORKER_MODE = "external"
+    worker = start_job_worker() if not args.no_job_worker else None
+    try:
+        if _available("gunicorn") and not args.uvicorn:
+            serve_gunicorn(args, settings.SHUTDOWN_TIMEOUT)
+        else:
+            serve_uvicorn(args, settings.SHUTDOWN_TIMEOUT)
+    finally:
+        if worker is not None:
+            stop_job_worker(worker, settings.SHUTDOWN_TIMEOUT)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", help="run the production server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, help="API worker processes (default: WEB_CONCURRENCY)")
+    parser.add_argument("--uvicorn", action="store_true", help="use uvicorn's process manager even if gunicorn is installed")
+    parser.add_argument("--no-job-worker", action="store_true", help="do not start `python -m app.worker`")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    args = parse_args()
+    if args.prod:
+        if args.workers is None:
+            # Not through app.config: importing it here would fix WORKER_MODE before run_production sets it
+            args.workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+        run_production(args)
+    else:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
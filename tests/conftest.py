@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when app.config is first imported, so the test
+# environment goes in place before any test module imports the app: the
+# SQLite stand-in for Supabase and every local file under a temporary
+# directory. Fixtures below still give each test its own files.
+_DATA_DIR = tempfile.mkdtemp(prefix="app-tests-")
+for _name, _value in {
+    "DATA_BACKEND": "sqlite",
+    "DATABASE_URL": f"sqlite:///{_DATA_DIR}/app.db",
+    "JOB_QUEUE_PATH": f"{_DATA_DIR}/jobs.db",
+    "EXTRACTION_CACHE_PATH": f"{_DATA_DIR}/extraction_cache.db",
+    "ANALYSIS_CACHE_PATH": f"{_DATA_DIR}/analysis_cache.db",
+    "SEARCH_INDEX_PATH": f"{_DATA_DIR}/search_index.db",
+    "KEYWORD_INDEX_PATH": f"{_DATA_DIR}/keyword_index.db",
+    "NEAR_DUPLICATE_INDEX_PATH": f"{_DATA_DIR}/near_duplicates.db",
+    "RELATED_INDEX_PATH": f"{_DATA_DIR}/related_index.db",
+    "EVENTS_PATH": f"{_DATA_DIR}/events.db",
+    "WORKER_MODE": "external",
+    "OPENAI_API_KEY": "test",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A TableStore on a fresh SQLite database."""
+    from sqlalchemy import create_engine
+    from app.data_access import SQLiteStore
+    engine = create_engine(f"sqlite:///{tmp_path}/app.db", connect_args={"check_same_thread": False})
+    yield SQLiteStore(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def client(store):
+    """A TestClient for the API, on the `store` database."""
+    from fastapi.testclient import TestClient
+    from app.data_access import AsyncStore, get_store
+    from app.main import app
+    from app.services.read_cache import get_organization_cache
+    app.dependency_overrides[get_store] = lambda: AsyncStore(store)
+    get_organization_cache().invalidate()
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -0,0 +1,189 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services import ai_analyzer
+from app.services.analysis_cache import AnalysisCache
+from app.services.llm_scheduler import LLMScheduler
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = AnalysisCache(str(tmp_path / "analysis_cache.db"))
+    monkeypatch.setattr(ai_analyzer, "get_analysis_cache", lambda: cache)
+    # The token estimate, without fetching tiktoken's vocabulary
+    monkeypatch.setattr(ai_analyzer, "_get_encoding", lambda: None)
+    return cache
+
+
+class PackingClient:
+    """
+    Summarises each document as "summary of <its text>". Packed replies list
+    the documents in reverse order, and leave out any document in `skip`.
+    """
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, **params):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        documents = prompt.split("\n### Document ")[1:]
+        if documents:
+            results = []
+            for document in reversed(documents):
+                number, text = document.split("\n", 1)
+                if text.strip() not in self.skip:
+                    results.append({"document": int(number), "summary": f"summary of {text.strip()}",
+                                    "keywords": [text.split()[0]]})
+            reply = {"results": results}
+        else:
+            text = prompt.split("Text to analyze:\n", 1)[1]
+            reply = {"summary": f"summary of {text.strip()}", "keywords": [text.split()[0]]}
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(reply)))],
+                               usage=None)
+
+
+@pytest.fixture
+def client(cache, monkeypatch):
+    client = PackingClient(skip={"gamma text"})
+    monkeypatch.setattr(ai_analyzer, "_scheduler", LLMScheduler(client_factory=lambda: client))
+    monkeypatch.setattr(ai_analyzer, "_packer", None)
+    monkeypatch.setattr(settings, "OPENAI_PACK_WINDOW", 0.2)
+    return client
+
+
+def _analyze_all(texts):
+    async def run():
+        return await asyncio.gather(*[ai_analyzer.analyze_text_async(text) for text in texts])
+    return asyncio.run(run())
+
+
+def test_packed_replies_reach_their_own_callers(client, cache):
+    texts = ["alpha text", "beta text", "gamma text", "delta text"]
+    results = _analyze_all(texts)
+    assert [result["summary"] for result in results] == [f"summary of {text}" for text in texts]
+    assert [result["keywords"] for result in results] == [[text.split()[0]] for text in texts]
+    # One packed request, and one for the text its reply left out
+    packed = [prompt for prompt in client.prompts if "### Document" in prompt]
+    assert len(packed) == 1 and len(client.prompts) == 2
+    assert all(f"### Document {number}\n" in packed[0] for number in range(1, 5))
+    # Cached apart: analysing again sends nothing
+    assert _analyze_all(texts) == results and len(client.prompts) == 2
+
+
+def test_packer_splits_groups_by_priority(client):
+    async def run():
+        return await asyncio.gather(
+            ai_analyzer.analyze_text_async("alpha text", priority=0),
+            ai_analyzer.analyze_text_async("beta text", priority=10),
+            ai_analyzer.analyze_text_async("delta text", priority=0),
+        )
+    results = asyncio.run(run())
+    assert [result["summary"] for result in results] == ["summary of alpha text", "summary of beta text",
+                                                         "summary of delta text"]
+    # alpha and delta share a request; beta, alone at its priority, goes by itself
+    assert len(client.prompts) == 2
+
+
+# --- Map-reduce ---
+
+def test_chunks_stay_within_the_token_limit(cache):
+    paragraphs = ["a" * 16, "b" * 20, "c" * 8, "d" * 100, "e" * 4]  # 4, 5, 2, 25 and 1 tokens
+    chunks = ai_analyzer.chunk_text("\n\n".join(paragraphs) + "\n\n  \n\n", max_tokens=10)
+    assert all(ai_analyzer.count_tokens(chunk.replace("\n\n", "")) <= 10 for chunk in chunks)
+    # Paragraphs are kept whole and packed greedily; only the oversized one is cut
+    assert chunks == ["a" * 16 + "\n\n" + "b" * 20, "c" * 8, "d" * 40, "d" * 40, "d" * 20 + "\n\n" + "e" * 4]
+    assert ai_analyzer.chunk_text("") == []
+
+
+@pytest.fixture
+def completions(cache, monkeypatch):
+    """Replaces _complete: records (step, body) and answers with a fixed-size summary."""
+    calls = []
+
+    async def complete(semaphore, step, instructions, body, priority):
+        calls.append((step, body))
+        return {"summary": f"{step}-{len(calls):03d}", "keywords": [f"k{len(calls) % 3}"]}, False
+
+    monkeypatch.setattr(ai_analyzer, "_complete", complete)
+    return calls
+
+
+def test_combine_reduces_level_by_level(completions, monkeypatch):
+    # Summaries of 3 tokens: two fit in one reduce request
+    monkeypatch.setattr(ai_analyzer, "CHUNK_TOKENS", 6)
+    summaries = [f"chunk-{i:03d}" for i in range(5)]
+    summary = asyncio.run(ai_analyzer._combine_summaries(asyncio.Semaphore(2), summaries, 0))
+    groups = [body.split("\n\n") for _, body in completions]
+    assert groups == [summaries[0:2], summaries[2:4], summaries[4:5],
+                      ["combine-001", "combine-002"], ["combine-003"],
+                      ["combine-004", "combine-005"]]
+    assert summary == "combine-006"
+
+
+def test_combine_pairs_summaries_too_long_to_group(completions, monkeypatch):
+    monkeypatch.setattr(ai_analyzer, "CHUNK_TOKENS", 2)
+    summaries = [f"chunk-{i:03d}" for i in range(4)]
+    asyncio.run(ai_analyzer._combine_summaries(asyncio.Semaphore(2), summaries, 0))
+    assert [body.split("\n\n") for _, body in completions] == [
+        summaries[0:2], summaries[2:4], ["combine-001", "combine-002"],
+    ]
+
+
+def test_document_combines_chunk_results(completions, cache):
+    text = "\n\n".join(["word " * 800] * 3)  # 1000 tokens a paragraph: two chunks
+    result = asyncio.run(ai_analyzer.analyze_text_async(text))
+    assert [step for step, _ in completions] == ["chunk", "chunk", "combine"]
+    assert result == {"summary": "combine-003", "keywords": ["k1", "k2"]}
+    # Cached as a whole
+    assert asyncio.run(ai_analyzer.analyze_text_async(text)) == result and len(completions) == 3
+
+
+def test_document_made_of_packed_replies_is_not_cached_as_a_whole(cache, monkeypatch):
+    calls = []
+
+    async def complete(semaphore, step, instructions, body, priority):
+        calls.append(body)
+        return {"summary": "short", "keywords": []}, True
+
+    monkeypatch.setattr(ai_analyzer, "_complete", complete)
+    asyncio.run(ai_analyzer.analyze_text_async("a short text"))
+    asyncio.run(ai_analyzer.analyze_text_async("a short text"))
+    assert len(calls) == 2
+
+
+class _Scheduler:
+    async def on_loop(self, coroutine):
+        return await coroutine
+
+
+def test_packed_results_are_cached_under_their_own_key(cache, monkeypatch):
+    replies = []
+
+    async def analyze_packed(body, tokens, priority):
+        return replies.pop(0)
+
+    monkeypatch.setattr(ai_analyzer, "get_scheduler", lambda: _Scheduler())
+    monkeypatch.setattr(ai_analyzer, "_analyze_packed", analyze_packed)
+    plain_key = ai_analyzer.cache_key("short", ai_analyzer.MODEL, ai_analyzer.PROMPT_VERSION,
+                                      {"step": "chunk", **ai_analyzer.REQUEST_PARAMS})
+
+    def complete(body):
+        return asyncio.run(ai_analyzer._complete(asyncio.Semaphore(1), "chunk", "", body, 0))
+
+    replies.append(({"summary": "packed", "keywords": []}, True))
+    assert complete("short") == ({"summary": "packed", "keywords": []}, True)
+    assert cache.get(plain_key) is None
+    # Served from the packed entry, still marked as packed
+    assert complete("short") == ({"summary": "packed", "keywords": []}, True) and not replies
+    # A text the packer analysed on its own is cached as any other reply
+    replies.append(({"summary": "alone", "keywords": []}, False))
+    assert complete("other") == ({"summary": "alone", "keywords": []}, False)
+    assert complete("other") == ({"summary": "alone", "keywords": []}, False) and not replies
@@ -0,0 +1,46 @@
+import json
+import sqlite3
+
+from app.services.analysis_cache import AnalysisCache
+
+
+def _summed(cache):
+    with cache._connect() as conn:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+
+
+def test_running_size_follows_puts_and_deletes(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache.db"), memory_entries=10, max_bytes=10_000)
+    cache.put("a", "v1", {"text": "x" * 100})
+    cache.put("b", "v2", {"text": "y" * 50})
+    # Replacing an entry counts its new size only
+    cache.put("a", "v1", {"text": "x" * 10})
+    assert cache.size() == _summed(cache) == len(json.dumps({"text": "x" * 10})) + len(json.dumps({"text": "y" * 50}))
+    assert cache.invalidate_prompt_version("v1") == 1
+    assert cache.size() == _summed(cache)
+    assert AnalysisCache(cache.path).size() == cache.size()
+
+
+def test_eviction_uses_the_running_size(tmp_path):
+    entry = len(json.dumps({"text": "x" * 90}))
+    cache = AnalysisCache(str(tmp_path / "cache.db"), memory_entries=0, max_bytes=entry * 5)
+    for i in range(6):
+        cache.put(f"k{i}", "v", {"text": "x" * 90})
+    # Over the limit: freed down to 90% of it, least recently used first
+    assert cache.stats()["evictions"] == 2
+    assert cache.get("k0") is None and cache.get("k1") is None and cache.get("k5") is not None
+    assert cache.size() == _summed(cache) == entry * 4
+
+
+def test_size_is_seeded_for_existing_files(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE analysis_cache (key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, "
+                 "value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+    conn.execute("INSERT INTO analysis_cache VALUES ('old', 'v', '{}', 700, 0, 0)")
+    conn.commit()
+    conn.close()
+    cache = AnalysisCache(path)
+    assert cache.size() == 700
+    cache.put("new", "v", {})
+    assert cache.size() == 702
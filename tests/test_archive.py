@@ -0,0 +1,113 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.routers import uploads
+from app.services.archive import ArchiveError, iter_archive
+
+
+def _zip(entries: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar(entries: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "TEMP_UPLOAD_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _post(client, *files):
+    return client.post("/api/v1/uploads/batch", params={"organization_id": "org"},
+                       files=[("files", file) for file in files])
+
+
+def _read(name, data, max_entries=10, max_expanded_size=1000):
+    return [(entry, stream and stream.read())
+            for entry, stream in iter_archive(io.BytesIO(data), name, max_entries, max_expanded_size)]
+
+
+@pytest.mark.parametrize("name, pack", [("a.zip", _zip), ("a.tar.gz", _tar)])
+def test_iter_archive_skips_metadata(name, pack):
+    data = pack({"docs/a.txt": b"a", "__MACOSX/._a.txt": b"x", "docs/.DS_Store": b"x", "b.md": b"b"})
+    assert _read(name, data) == [("docs/a.txt", b"a"), ("b.md", b"b")]
+
+
+@pytest.mark.parametrize("name, pack", [("a.zip", _zip), ("a.tar.gz", _tar)])
+def test_iter_archive_limits(name, pack):
+    with pytest.raises(ArchiveError, match="more than 2 files"):
+        _read(name, pack({f"{i}.txt": b"x" for i in range(3)}), max_entries=2)
+    # Counted on the bytes read, not on the sizes the headers claim
+    with pytest.raises(ArchiveError, match="expands to more than 100 bytes"):
+        _read(name, pack({"a.txt": b"x" * 60, "b.txt": b"x" * 60}), max_expanded_size=100)
+
+
+@pytest.mark.parametrize("name, data", [
+    ("a.zip", b"PK\x03\x04 not really a zip"),
+    ("a.tar.gz", _tar({"a.txt": b"x" * 1000})[:40]),
+    ("a.tar", b"\x00" * 10 + b"garbage" * 100),
+])
+def test_iter_archive_malformed(name, data):
+    with pytest.raises(ArchiveError, match="Could not read archive"):
+        _read(name, data)
+
+
+def test_batch_skips_malformed_archives(client, temp_dir):
+    response = _post(client, ("broken.zip", b"not a zip"), ("cut.tgz", _tar({"a.txt": b"x" * 1000})[:40]),
+                     ("ok.txt", b"fine"))
+    assert response.status_code == 202, response.text
+    body = response.json()
+    assert [file["filename"] for file in body["files"]] == ["ok.txt"]
+    assert [(item["name"], item["reason"].split(":")[0]) for item in body["skipped"]] == [
+        ("broken.zip", "Could not read archive 'broken.zip'"), ("cut.tgz", "Could not read archive 'cut.tgz'"),
+    ]
+
+
+def test_batch_keeps_entries_read_before_a_damaged_one(client, temp_dir):
+    data = bytearray(_zip({"a.txt": b"first", "b.txt": b"second " * 50, "c.txt": b"third"}))
+    # Corrupt the compressed data of b.txt: its CRC no longer matches
+    offset = data.index(b"b.txt") + len(b"b.txt") + 5
+    data[offset:offset + 5] = b"\xff" * 5
+    body = _post(client, ("docs.zip", bytes(data))).json()
+    assert sorted(file["filename"] for file in body["files"]) == ["a.txt", "c.txt"]
+    assert [item["name"] for item in body["skipped"]] == ["docs.zip/b.txt"]
+    assert body["skipped"][0]["reason"].startswith("Could not read")
+
+
+def test_batch_skips_oversized_archives_and_entries(client, temp_dir, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 100)
+    monkeypatch.setattr(settings, "MAX_ARCHIVE_EXPANDED_SIZE", 150)
+    monkeypatch.setattr(settings, "MAX_BATCH_FILES", 3)
+    body = _post(
+        client,
+        ("big.zip", _zip({"small.txt": b"s", "large.txt": b"l" * 101, "bomb.txt": b"b" * 120})),
+        ("many.tar.gz", _tar({f"{i}.txt": str(i).encode() for i in range(5)})),
+        ("photo.png", b"\x89PNG"),
+    ).json()
+    assert [file["filename"] for file in body["files"]] == ["small.txt", "0.txt", "1.txt"]
+    assert body["file_count"] == 3
+    assert {item["name"]: item["reason"] for item in body["skipped"]} == {
+        "big.zip/large.txt": "File exceeds the maximum size of 100 bytes",
+        "big.zip": "Archive expands to more than 150 bytes",
+        "many.tar.gz/2.txt": "Batch has more than 3 files",
+        "many.tar.gz": "Archive has more than 3 files",
+        "photo.png": "Unsupported file type",
+    }
+    # Only the stored files are left behind
+    assert sorted(path.suffix for path in temp_dir.iterdir() if path.suffix != ".db") == [".txt"] * 3
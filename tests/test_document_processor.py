@@ -0,0 +1,59 @@
+import resource
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import document_processor
+
+
+def _ocr_page(file_path, page_number):
+    if page_number == 2:
+        raise RuntimeError("tesseract crashed")
+    return f"page {page_number}", 10.0
+
+
+def test_ocr_keeps_going_after_a_failed_page(monkeypatch):
+    monkeypatch.setattr(document_processor, "_ocr_page", _ocr_page)
+    texts, stats = document_processor._ocr_pdf_pages("doc.pdf", [1, 2, 3])
+    assert texts == {1: "page 1", 3: "page 3"}
+    assert stats["pages"] == 2 and stats["failed_pages"] == [2]
+
+
+@pytest.mark.parametrize("platform, maxrss, expected", [("linux", 2048, 2.0), ("darwin", 2 * 1024 * 1024, 2.0)])
+def test_maxrss_units(monkeypatch, platform, maxrss, expected):
+    monkeypatch.setattr(document_processor.sys, "platform", platform)
+    monkeypatch.setattr(document_processor.resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=maxrss))
+    assert document_processor._maxrss_mb(resource.RUSAGE_SELF) == expected
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path, monkeypatch):
+    from app.services.extraction_cache import ExtractionCache
+    cache = ExtractionCache(str(tmp_path / "extractions.db"))
+    monkeypatch.setattr(document_processor, "get_extraction_cache", lambda: cache)
+    # Page 1 has a usable text layer, page 2 needs OCR
+    layer = ["A text layer with plenty of words on it, " * 3, ""]
+    monkeypatch.setattr(document_processor, "_extract_pdf_text_layer", lambda file_path: list(layer))
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4\n")
+    return str(path), cache
+
+
+def test_pdf_with_failed_ocr_is_not_cached(scanned_pdf, monkeypatch):
+    path, cache = scanned_pdf
+    monkeypatch.setattr(document_processor, "_ocr_page", _ocr_page)
+    pages = document_processor.extract_pages_from_file(path, "scan.pdf", "hash")
+    assert pages[0].startswith("A text layer") and pages[1] == ""
+    assert document_processor.get_cached_pages("hash", path, "scan.pdf") is None
+    # Once OCR works, the complete extraction is cached
+    monkeypatch.setattr(document_processor, "_ocr_page", lambda file_path, number: (f"page {number}", 10.0))
+    assert document_processor.extract_pages_from_file(path, "scan.pdf", "hash")[1] == "page 2"
+    assert document_processor.get_cached_pages("hash", path, "scan.pdf")[1] == "page 2"
+
+
+def test_pdf_cut_short_by_the_ocr_budget_is_not_cached(scanned_pdf, monkeypatch):
+    path, cache = scanned_pdf
+    monkeypatch.setattr(document_processor.settings, "OCR_TIME_BUDGET", 1e-9)
+    monkeypatch.setattr(document_processor, "_ocr_page", lambda file_path, number: (f"page {number}", 10.0))
+    assert document_processor.extract_pages_from_file(path, "scan.pdf", "hash")[1] == ""
+    assert document_processor.get_cached_pages("hash", path, "scan.pdf") is None
@@ -0,0 +1,118 @@
+import json
+import asyncio
+import threading
+
+import pytest
+
+from app.config import settings
+from app.routers import events as events_router
+from app.services.events import EventBroker, EventLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    return EventLog(str(tmp_path / "events.db"))
+
+
+@pytest.fixture
+def broker(log):
+    return EventBroker(log, poll_interval=0.01)
+
+
+async def _drain(subscription, count, timeout=2.0):
+    return [await asyncio.wait_for(subscription.queue.get(), timeout) for _ in range(count)]
+
+
+def test_broker_delivers_matching_events_published_after_subscribing(log, broker):
+    async def run():
+        log.publish("status", "f1", status="pending")
+        by_file = broker.subscribe(file_id="f1")
+        by_batch = broker.subscribe(batch_id="b1")
+        log.publish("stage", "f1", "b1", stage="extract", state="started", attempt=1)
+        log.publish("stage", "f2", "b1", stage="extract", state="started", attempt=1)
+        log.publish("status", "f1", "b1", status="processed")
+        file_events = await _drain(by_file, 2)
+        batch_events = await _drain(by_batch, 3)
+        assert [(event["type"], event["file_id"]) for event in file_events] == [("stage", "f1"), ("status", "f1")]
+        assert [event["file_id"] for event in batch_events] == ["f1", "f2", "f1"]
+        assert file_events[1]["data"] == {"status": "processed"}
+        broker.unsubscribe(by_file)
+        broker.unsubscribe(by_batch)
+        assert broker.subscriber_count() == 0
+    asyncio.run(run())
+
+
+def test_subscription_overflows_instead_of_blocking(log, broker, monkeypatch):
+    monkeypatch.setattr(settings, "EVENTS_SUBSCRIBER_QUEUE", 2)
+
+    async def run():
+        subscription = broker.subscribe(file_id="f1")
+        for i in range(5):
+            log.publish("progress", "f1", stage="extract", step="ocr", done=i, total=5)
+        while broker.poll_once() or subscription.queue.qsize() < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        assert subscription.overflowed and subscription.queue.qsize() == 2
+        assert [event["data"]["done"] for event in await _drain(subscription, 2)] == [0, 1]
+        broker.unsubscribe(subscription)
+    asyncio.run(run())
+
+
+# --- Streams ---
+
+@pytest.fixture
+def stream(client, store, log, broker, monkeypatch):
+    monkeypatch.setattr(events_router, "get_event_log", lambda: log)
+    monkeypatch.setattr(events_router, "get_event_broker", lambda: broker)
+
+    def read(path, headers=None):
+        with client.stream("GET", path, headers=headers or {}) as response:
+            assert response.status_code == 200
+            body = "".join(response.iter_text())
+        messages = []
+        for block in body.split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+            if "event" in fields:
+                messages.append((fields["event"], json.loads(fields["data"]), fields.get("id")))
+        return messages
+    return read
+
+
+def test_file_stream_sends_snapshot_live_events_then_end(stream, store, log, broker):
+    store.insert("file_uploads", {"id": "f1", "filename": "a.pdf", "status": "pending"})
+
+    def publish_when_subscribed():
+        while not broker.subscriber_count():
+            threading.Event().wait(0.01)
+        log.publish("stage", "f1", stage="extract", state="done", attempt=1)
+        log.publish("status", "f1", status="processed")
+
+    threading.Thread(target=publish_when_subscribed).start()
+    messages = stream("/api/v1/events/files/f1")
+    assert [(event, data.get("status") or data.get("state")) for event, data, _ in messages] == [
+        ("snapshot", "pending"), ("stage", "done"), ("status", "processed"), ("end", None),
+    ]
+    assert messages[0][2] is None and int(messages[1][2]) < int(messages[2][2])
+    assert broker.subscriber_count() == 0
+
+
+def test_file_stream_resumes_from_last_event_id(stream, store, log):
+    store.insert("file_uploads", {"id": "f1", "filename": "a.pdf", "status": "processed"})
+    first = log.publish("progress", "f1", stage="extract", step="ocr", done=0, total=1500)
+    rows = []
+    for done in range(1, 1500):
+        rows.append(("f1", json.dumps({"stage": "extract", "step": "ocr", "done": done, "total": 1500})))
+        if done % 2:
+            rows.append(("f2", json.dumps({"stage": "extract", "step": "ocr", "done": done, "total": 1500})))
+    with log._connect() as conn:
+        conn.executemany("INSERT INTO events (type, file_id, data, created_at) VALUES ('progress', ?, ?, 0)", rows)
+    messages = stream("/api/v1/events/files/f1", headers={"Last-Event-ID": str(first)})
+    # Everything after the last event seen, across history pages of 1000
+    assert [data["done"] for event, data, _ in messages if event == "progress"] == list(range(1, 1500))
+    assert [event for event, _, _ in messages[-2:]] == ["snapshot", "end"]
+
+
+def test_unknown_file_is_404(client, broker, monkeypatch):
+    monkeypatch.setattr(events_router, "get_event_broker", lambda: broker)
+    assert client.get("/api/v1/events/files/missing").status_code == 404
+    assert broker.subscriber_count() == 0
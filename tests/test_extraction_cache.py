@@ -0,0 +1,68 @@
+import pytest
+
+from app.services import document_processor
+from app.services.extraction_cache import ExtractionCache, join_pages
+from app.services.pipeline import extract_stage
+
+PAGES = ["First page.", "", "Third page, after an empty one.", "Fourth."]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(str(tmp_path / "extractions.db"))
+
+
+def test_join_pages_skips_empty_pages():
+    text, offsets = join_pages(PAGES)
+    assert text == "First page.\nThird page, after an empty one.\nFourth."
+    assert offsets == [0, 11, 12, 44]
+    assert all(text[offset:offset + len(page)] == page for page, offset in zip(PAGES, offsets))
+    assert join_pages([]) == ("", [])
+
+
+def test_put_and_get(cache):
+    assert cache.get_pages("hash", "pdf", 1) is None
+    cache.put_pages("hash", "pdf", 1, PAGES)
+    assert cache.get_pages("hash", "pdf", 1) == PAGES
+    assert cache.get_offsets("hash", "pdf", 1) == join_pages(PAGES)[1]
+    assert cache.get_page_range("hash", "pdf", 1, 2, 3) == {2: "", 3: PAGES[2]}
+    # Pages past the end are simply absent
+    assert cache.get_page_range("hash", "pdf", 1, 4, 9) == {4: "Fourth."}
+    assert cache.get_page_range("other", "pdf", 1, 1, 1) is None
+    # Putting again replaces every page
+    cache.put_pages("hash", "pdf", 1, ["Only page."])
+    assert cache.get_pages("hash", "pdf", 1) == ["Only page."]
+    assert cache.get_page_range("hash", "pdf", 1, 1, 4) == {1: "Only page."}
+
+
+def test_document_without_pages_is_cached(cache):
+    cache.put_pages("empty", "txt", 1, [])
+    assert cache.get_pages("empty", "txt", 1) == []
+    assert cache.get_page_range("empty", "txt", 1, 1, 1) == {}
+    assert cache.get_offsets("empty", "txt", 1) is None
+
+
+def test_versions_are_kept_apart_and_purged(cache):
+    cache.put_pages("hash", "pdf", 1, ["old"])
+    cache.put_pages("hash", "pdf", 2, ["new"])
+    cache.put_pages("hash", "docx", 1, ["word"])
+    assert cache.get_pages("hash", "pdf", 1) == ["old"] and cache.get_pages("hash", "pdf", 2) == ["new"]
+    assert cache.purge_stale({"pdf": 2, "docx": 1}) == 1
+    assert cache.get_pages("hash", "pdf", 1) is None
+    assert cache.get_pages("hash", "pdf", 2) == ["new"] and cache.get_pages("hash", "docx", 1) == ["word"]
+    assert cache.purge_stale({"pdf": 2, "docx": 1}) == 0
+
+
+def test_extract_stage_falls_back_to_the_cache_once_the_file_is_gone(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(document_processor, "get_extraction_cache", lambda: cache)
+    path = tmp_path / "shared.txt"
+    path.write_text("Shared upload text.")
+    payload = {"file_id": "f1", "temp_file_path": str(path), "content_hash": "hash",
+               "original_filename": "notes.txt"}
+    first = extract_stage(payload, {})
+    assert first["extracted_text"] == "Shared upload text."
+    # Another organization's job for the same file, after the first removed it
+    path.unlink()
+    assert extract_stage({**payload, "file_id": "f2"}, {}) == first
+    with pytest.raises(FileNotFoundError):
+        extract_stage({**payload, "file_id": "f3", "content_hash": "unknown"}, {})
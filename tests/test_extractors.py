@@ -0,0 +1,33 @@
+import zipfile
+
+from app.services.extractors import _column_index, iter_xlsx_units
+
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _xlsx(path, rows: str):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("xl/workbook.xml", f'<workbook xmlns="{MAIN}" xmlns:r="{RELS}"><sheets>'
+                                            f'<sheet name="Data" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr("xl/_rels/workbook.xml.rels",
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         f'<Relationship Id="rId1" Type="{RELS}/worksheet" Target="worksheets/sheet1.xml"/>'
+                         '</Relationships>')
+        archive.writestr("xl/sharedStrings.xml", f'<sst xmlns="{MAIN}"><si><t>Name</t></si><si><t>Total</t></si></sst>')
+        archive.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{MAIN}"><sheetData>{rows}</sheetData></worksheet>')
+    return str(path)
+
+
+def test_column_index():
+    assert [_column_index(ref) for ref in ("A1", "C7", "Z3", "AA10", "XFD1", None, "")] == [0, 2, 25, 26, 16383, None, None]
+
+
+def test_xlsx_keeps_empty_cells_in_their_column(tmp_path):
+    path = _xlsx(tmp_path / "book.xlsx",
+                 '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="D1" t="s"><v>1</v></c></row>'
+                 '<row r="2"><c r="B2"><v>5</v></c><c r="D2"><v>7</v></c></row>'
+                 # Without references cells follow one another
+                 '<row r="3"><c t="inlineStr"><is><t>x</t></is></c><c><v>1</v></c></row>'
+                 '<row r="4"><c r="ZZZZZZ4"><v>9</v></c></row>')
+    assert list(iter_xlsx_units(path)) == ["Sheet: Data\nName\t\t\tTotal\n\t5\t\t7\nx\t1\n9"]
@@ -0,0 +1,160 @@
+import time
+
+import pytest
+
+from app.services.job_queue import PRIORITY_BULK, PRIORITY_INTERACTIVE, JobQueue, worker_identity
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_claim_takes_interactive_jobs_first(queue):
+    bulk = queue.enqueue("process_file", "extract", {"n": 1}, PRIORITY_BULK)
+    interactive = queue.enqueue("process_file", "extract", {"n": 2}, PRIORITY_INTERACTIVE)
+    jobs = queue.claim("extract", 1)
+    assert [job.id for job in jobs] == [interactive]
+    assert jobs[0].status == "running" and jobs[0].attempts == 1
+    assert [job.id for job in queue.claim("extract", 5)] == [bulk]
+    assert queue.claim("extract", 5) == []
+
+
+def test_claim_only_takes_its_stage(queue):
+    queue.enqueue("process_file", "extract", {})
+    assert queue.claim("analyze", 5) == []
+    assert queue.claim("extract", 0) == []
+    assert len(queue.claim("extract", 5)) == 1
+
+
+def test_advance_keeps_state_and_resets_attempts(queue):
+    job_id = queue.enqueue("process_file", "extract", {"file_id": "f"})
+    queue.claim("extract", 1)
+    queue.advance(job_id, "analyze", {"extracted_text": "text"})
+    job = queue.get(job_id)
+    assert (job.stage, job.status, job.attempts) == ("analyze", "queued", 0)
+    assert job.state == {"extracted_text": "text"}
+    assert job.payload == {"file_id": "f"}
+    queue.claim("analyze", 1)
+    queue.complete(job_id)
+    job = queue.get(job_id)
+    assert job.status == "done" and job.state == {}
+
+
+def test_fail_retries_with_backoff_then_gives_up(queue, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 60)
+    job_id = queue.enqueue("process_file", "extract", {}, max_attempts=2)
+    job = queue.claim("extract", 1)[0]
+    assert queue.fail(job, "boom") is True
+    assert queue.get(job_id).status == "queued"
+    assert queue.get(job_id).last_error == "boom"
+    # Not claimable before its retry delay
+    assert queue.claim("extract", 1) == []
+
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+    job = queue.claim("extract", 1)[0]
+    assert job.attempts == 2
+    assert queue.fail(job, "boom again") is False
+    assert queue.get(job_id).status == "failed"
+
+
+def test_fail_without_retry(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    job = queue.claim("extract", 1)[0]
+    assert queue.fail(job, "unsupported file", retryable=False) is False
+    assert queue.get(job_id).status == "failed"
+
+
+def test_release_does_not_count_the_attempt(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    queue.release(job_id)
+    job = queue.get(job_id)
+    assert (job.status, job.attempts) == ("queued", 0)
+
+
+def test_recover_requeues_expired_leases(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    assert queue.recover(lease_timeout=3600) == 0
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET locked_at = ? WHERE id = ?", (time.time() - 7200, job_id))
+    assert queue.recover(lease_timeout=3600) == 1
+    job = queue.get(job_id)
+    assert job.status == "queued"
+    assert len(queue.claim("extract", 1)) == 1
+
+
+def test_recover_requeues_jobs_of_dead_local_workers(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    host = worker_identity().rpartition(":")[0]
+    with queue._connect() as conn:
+        # A pid far above any pid_max
+        conn.execute("UPDATE jobs SET locked_by = ? WHERE id = ?", (f"{host}:999999999", job_id))
+    assert queue.recover(lease_timeout=3600) == 1
+    assert queue.get(job_id).status == "queued"
+
+
+def test_renew_keeps_long_running_jobs_leased(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET locked_at = ? WHERE id = ?", (time.time() - 7200, job_id))
+    assert queue.renew([job_id]) == 1
+    assert queue.recover(lease_timeout=3600) == 0
+    assert queue.get(job_id).status == "running"
+
+
+def test_renew_ignores_jobs_of_other_workers(queue):
+    job_id = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET locked_by = 'elsewhere:1' WHERE id = ?", (job_id,))
+    assert queue.renew([job_id]) == 0
+    assert queue.renew([]) == 0
+
+
+def test_backlog_and_stats(queue):
+    queue.enqueue_many("process_file", "extract", [{}, {}], PRIORITY_BULK)
+    queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 1)
+    assert queue.backlog() == 3
+    assert queue.backlog(PRIORITY_BULK) == 2
+    assert queue.stats() == {"extract": {"queued": 2, "running": 1}}
+
+
+def test_worker_renews_leases_of_its_jobs_and_recovers_others(queue):
+    from app.worker import Worker
+    mine = queue.enqueue("process_file", "extract", {})
+    abandoned = queue.enqueue("process_file", "extract", {})
+    queue.claim("extract", 2)
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET locked_at = 0")
+    worker = Worker(queue=queue, concurrency={"extract": 2})
+    worker._in_flight["extract"][mine] = None
+    worker._check_leases()
+    assert queue.get(mine).status == "running"
+    assert queue.get(abandoned).status == "queued"
+
+
+def test_embedded_worker_runs_for_the_lifetime_of_the_app(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main, worker
+    from app.config import settings
+    calls = []
+
+    class FakeWorker:
+        def start(self):
+            calls.append("start")
+
+        def stop(self, drain=False):
+            calls.append(("stop", drain))
+
+    monkeypatch.setattr(settings, "WORKER_MODE", "embedded")
+    monkeypatch.setattr(worker, "Worker", FakeWorker)
+    with TestClient(main.app):
+        assert calls == ["start"] and isinstance(main.worker, FakeWorker)
+    assert calls == ["start", ("stop", True)] and main.worker is None
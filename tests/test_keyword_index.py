@@ -0,0 +1,93 @@
+import pytest
+
+from app.services.keyword_index import KeywordIndex, normalize_keyword, previous_bucket, next_bucket
+
+
+@pytest.fixture
+def index(tmp_path):
+    return KeywordIndex(str(tmp_path / "keywords.db"))
+
+
+def counts(rows):
+    return {row["keyword"]: row["count"] for row in rows}
+
+
+def test_normalize_keyword():
+    assert normalize_keyword("  Acquisitions!") == "acquisition"
+    assert normalize_keyword("M&A Companies") == "m&a company"
+
+
+def test_bucket_arithmetic():
+    assert previous_bucket("2026-Q1") == "2025-Q4" and next_bucket("2025-Q4") == "2026-Q1"
+    assert previous_bucket("2026-01") == "2025-12" and next_bucket("2026-12") == "2027-01"
+    assert previous_bucket("2026") == "2025"
+
+
+def test_add_counts_each_keyword_once_per_file(index):
+    index.add_file("f1", "org", "2026-02-10T00:00:00", ["Growth", "growth ", "Risk"])
+    index.add_file("f2", "org", "2026-03-01T00:00:00", ["Growth"])
+    assert counts(index.top("org", "2026-Q1")) == {"growth": 2, "risk": 1}
+    assert counts(index.top("org", "2026-02")) == {"growth": 1, "risk": 1}
+    assert counts(index.top("org", "2026")) == {"growth": 2, "risk": 1}
+    assert index.top("org", "2026-Q1")[0]["label"] == "Growth"
+
+
+def test_add_again_replaces_the_previous_contribution(index):
+    index.add_file("f1", "org", "2026-02-10T00:00:00", ["Growth", "Risk"])
+    index.add_file("f1", "org", "2026-02-10T00:00:00", ["Growth", "Merger"])
+    assert counts(index.top("org", "2026-Q1")) == {"growth": 1, "merger": 1}
+
+
+def test_remove_takes_the_counts_back_out(index):
+    index.add_file("f1", "org", "2026-02-10T00:00:00", ["Growth"])
+    index.add_file("f2", "org", "2026-02-11T00:00:00", ["Growth", "Risk"])
+    index.remove_file("f2")
+    assert counts(index.top("org", "2026-Q1")) == {"growth": 1}
+    index.remove_file("f1")
+    index.remove_file("unknown")
+    assert index.top("org", "2026-Q1") == []
+
+
+def test_rising_compares_with_the_previous_bucket(index):
+    index.add_file("f1", "org", "2025-11-01T00:00:00", ["Growth", "Risk"])
+    index.add_file("f2", "org", "2026-01-05T00:00:00", ["Growth", "AI"])
+    index.add_file("f3", "org", "2026-02-05T00:00:00", ["AI"])
+    rising = {row["keyword"]: (row["previous_count"], row["count"], row["change"])
+              for row in index.rising("org", "2026-Q1")}
+    assert rising == {"ai": (0, 2, 2)}
+    # Removing a file of the previous bucket raises the change of the next one
+    index.remove_file("f1")
+    rising = {row["keyword"]: row["change"] for row in index.rising("org", "2026-Q1")}
+    assert rising == {"ai": 2, "growth": 1}
+
+
+def test_organizations_are_counted_apart_and_together(index):
+    index.add_file("f1", "a", "2026-02-10T00:00:00", ["Growth"])
+    index.add_file("f2", "b", "2026-02-10T00:00:00", ["Growth", "Risk"])
+    index.add_file("f3", None, "2026-02-10T00:00:00", ["Risk"])
+    assert counts(index.top("a", "2026-Q1")) == {"growth": 1}
+    assert counts(index.top("", "2026-Q1")) == {"risk": 1}
+    assert counts(index.top(None, "2026-Q1")) == {"growth": 2, "risk": 2}
+
+
+def test_rising_across_organizations_counts_keywords_an_organization_lost(index):
+    index.add_file("f1", "a", "2025-11-01T00:00:00", ["Growth"])
+    index.add_file("f2", "b", "2026-02-01T00:00:00", ["Growth"])
+    # Organization a lost "growth" in 2026-Q1 and b gained it: no net change
+    assert index.rising(None, "2026-Q1") == []
+    index.add_file("f3", "b", "2026-02-02T00:00:00", ["Growth"])
+    assert [(row["keyword"], row["previous_count"], row["count"], row["change"])
+            for row in index.rising(None, "2026-Q1")] == [("growth", 1, 2, 1)]
+
+
+def test_endpoints(client, monkeypatch, index):
+    import app.routers.keywords as keywords
+    monkeypatch.setattr(keywords, "get_keyword_index", lambda: index)
+    index.add_file("f1", "a", "2026-02-10T00:00:00", ["Growth"])
+    index.add_file("f2", "b", "2026-02-10T00:00:00", ["Growth"])
+    params = {"period": "quarter", "bucket": "2026-Q1"}
+    assert client.get("/api/v1/keywords/top", params=params).json()[0]["count"] == 2
+    assert client.get("/api/v1/keywords/top", params={**params, "organization_id": "a"}).json()[0]["count"] == 1
+    assert client.get("/api/v1/keywords/rising", params=params).json()[0]["change"] == 2
+    assert client.get("/api/v1/keywords/top", params={"period": "week"}).status_code == 400
+    assert client.get("/api/v1/keywords/top", params={"bucket": "2026-Q5"}).status_code == 400
@@ -0,0 +1,98 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler
+
+
+def _status_error(status: int, retry_after: str = None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(status, request=request, headers=headers)
+    if status == 429:
+        return openai.RateLimitError("Rate limit reached", response=response, body=None)
+    return openai.APIStatusError("Error", response=response, body=None)
+
+
+class FakeClient:
+    """Answers each request with its own prompt, after raising the queued errors first."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, **params):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=prompt))],
+                               usage=SimpleNamespace(prompt_tokens=1, completion_tokens=1))
+
+
+def _scheduler(client, **options):
+    options = {"requests_per_minute": 6000, "tokens_per_minute": 10 ** 7, "max_in_flight": 4,
+               "max_retries": 3, "retry_base_delay": 0.01, **options}
+    return LLMScheduler(client_factory=lambda: client, **options)
+
+
+def _ask(scheduler, prompt, priority=0):
+    return scheduler.complete([{"role": "user", "content": prompt}], "model", priority, 1)
+
+
+def test_saturated_bucket_grants_in_priority_order():
+    client = FakeClient()
+    # 20 requests a second once the bucket is empty: one request at a time is waiting for it
+    scheduler = _scheduler(client, requests_per_minute=1200)
+    requests = [("bulk-1", 10), ("bulk-2", 10), ("interactive-1", 0), ("bulk-3", 10), ("interactive-2", 0)]
+
+    async def burst():
+        scheduler.requests.tokens = 0
+        return await asyncio.gather(*[_ask(scheduler, prompt, priority) for prompt, priority in requests])
+
+    replies = scheduler.run(burst())
+    assert [reply.choices[0].message.content for reply in replies] == [prompt for prompt, _ in requests]
+    assert client.prompts == ["interactive-1", "interactive-2", "bulk-1", "bulk-2", "bulk-3"]
+    assert scheduler.stats()["waiting"] == 0
+
+
+def test_rate_limit_pauses_and_lowers_the_rates():
+    client = FakeClient([_status_error(429, retry_after="0.2")])
+    scheduler = _scheduler(client)
+    started = time.monotonic()
+    reply = scheduler.run(_ask(scheduler, "hello"))
+    assert reply.choices[0].message.content == "hello"
+    assert time.monotonic() - started >= 0.2
+    assert client.prompts == ["hello", "hello"]
+    # Lowered to 70% by the 429, then recovering by 2% per success
+    assert scheduler.stats()["rate_factor"] == 0.72
+    assert scheduler.requests.rate == pytest.approx(scheduler.requests.base_rate * 0.72)
+
+
+def test_retries_give_up():
+    client = FakeClient([_status_error(503)] * 3)
+    scheduler = _scheduler(client, max_retries=2)
+    with pytest.raises(openai.APIStatusError):
+        scheduler.run(_ask(scheduler, "hello"))
+    assert len(client.prompts) == 3
+    # Not retried at all
+    client = FakeClient([_status_error(400)])
+    scheduler = _scheduler(client)
+    with pytest.raises(openai.APIStatusError):
+        scheduler.run(_ask(scheduler, "hello"))
+    assert len(client.prompts) == 1
+
+
+def test_retry_delay_is_jittered_within_the_backoff():
+    scheduler = _scheduler(FakeClient(), retry_base_delay=1.0)
+    for attempt in range(4):
+        delays = {scheduler._retry_delay(_status_error(500), attempt) for _ in range(50)}
+        assert all(0 <= delay <= 2 ** attempt for delay in delays) and len(delays) > 1
+    assert scheduler._retry_delay(_status_error(400), 0) is None
+    assert scheduler._retry_delay(ValueError("bug"), 0) is None
+    assert scheduler._retry_delay(_status_error(429, retry_after="5"), 0) >= 5
@@ -0,0 +1,53 @@
+import os
+import logging
+
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture
+def counter():
+    counter = metrics.Counter("test_events_total", "Test events", ["kind"])
+    yield counter
+    metrics._registry.remove(counter)
+
+
+def test_metric_needs_samples():
+    with pytest.raises(TypeError):
+        metrics.Metric("test_metric", "No samples")
+
+
+def test_samples_carry_the_worker(counter):
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    worker = f'worker="{metrics._hostname}:{os.getpid()}"'
+    assert counter.render().splitlines() == [
+        "# HELP test_events_total Test events",
+        "# TYPE test_events_total counter",
+        f'test_events_total{{kind="a",{worker}}} 3',
+    ]
+    assert f'test_events_total{{kind="a",{worker}}} 3' in metrics.render()
+
+
+@pytest.fixture
+def bounded_logging():
+    factory = logging.getLogRecordFactory()
+    # Importing app.main installs the default bound already
+    logging.setLogRecordFactory(logging.LogRecord)
+    metrics.install_log_bounds(50)
+    yield
+    logging.setLogRecordFactory(factory)
+
+
+def _record(msg, *args):
+    return logging.getLogRecordFactory()("test", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_log_bounds_cover_formatted_arguments(bounded_logging):
+    record = _record("Text: %s", "x" * 500)
+    assert record.getMessage() == f"Text: {'x' * 44}... [456 more chars]"
+    assert _record("y" * 60).getMessage() == f"{'y' * 50}... [10 more chars]"
+    assert _record("Short %s", "text").getMessage() == "Short text"
+    # Left to the handler to report, as without the bound
+    assert _record("%d", "not a number").args == ("not a number",)
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from app.services.near_duplicates import NearDuplicateIndex, signature, similarity
+
+
+def _text(seed, words=400):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+
+def _edited(text, every=100):
+    # One word in `every` replaced
+    words = text.split()
+    return " ".join("changed" if i % every == 0 else word for i, word in enumerate(words))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return NearDuplicateIndex(str(tmp_path / "near_duplicates.db"), threshold=0.8)
+
+
+def test_signature_similarity():
+    text = _text(1)
+    assert similarity(signature(text), signature(text)) == 1.0
+    assert similarity(signature(text), signature(_edited(text))) > 0.8
+    assert similarity(signature(text), signature(_text(2))) < 0.1
+    assert signature("too short") is None
+
+
+def test_find_matches_within_the_organization_only(index):
+    original = signature(_text(1))
+    index.add("f1", "org", original)
+    edited = signature(_edited(_text(1)))
+    match = index.find(edited, "org")
+    assert match["file_id"] == "f1" and match["cluster_id"] == "f1" and match["similarity"] > 0.8
+    assert index.find(edited, "other") is None
+    assert index.find(signature(_text(2)), "org") is None
+    assert index.find(original, "org", exclude="f1") is None
+
+
+def test_matches_join_the_cluster_of_their_match(index):
+    index.add("f1", "org", signature(_text(1)))
+    edited = signature(_edited(_text(1)))
+    index.add("f2", "org", edited, index.find(edited, "org"))
+    index.add("f3", "org", signature(_text(2)))
+    assert index.clusters("org") == [{"cluster_id": "f1", "files": [
+        {"file_id": "f1", "similarity": None},
+        {"file_id": "f2", "similarity": pytest.approx(similarity(signature(_text(1)), edited))},
+    ]}]
+    assert [file["file_id"] for file in index.cluster_of("f2")["files"]] == ["f1", "f2"]
+    assert index.cluster_of("f3")["files"] == [{"file_id": "f3", "similarity": None}]
+    assert index.cluster_of("unknown") is None
+
+
+def test_remove_keeps_the_rest_of_the_cluster(index):
+    for number, file_id in enumerate(["f1", "f2", "f3"]):
+        values = signature(_edited(_text(1), every=100 + number))
+        index.add(file_id, "org", values, index.find(values, "org"))
+    index.remove("f1")
+    assert [file["file_id"] for file in index.clusters("org")[0]["files"]] == ["f2", "f3"]
+    assert index.find(signature(_text(1)), "org")["file_id"] in ("f2", "f3")
+    index.remove("f2")
+    assert index.clusters("org") == []
+
+
+def test_clusters_of_one_or_every_organization(index):
+    for organization_id, seed in [("a", 1), ("b", 2), (None, 3)]:
+        values = signature(_text(seed))
+        index.add(f"{organization_id}-1", organization_id, values)
+        index.add(f"{organization_id}-2", organization_id, values, index.find(values, organization_id))
+    assert [cluster["cluster_id"] for cluster in index.clusters("a")] == ["a-1"]
+    assert [cluster["cluster_id"] for cluster in index.clusters("")] == ["None-1"]
+    everything = index.clusters(None)
+    assert [cluster["cluster_id"] for cluster in everything] == ["None-1", "a-1", "b-1"]
+    assert all(len(cluster["files"]) == 2 for cluster in everything)
+    # Keyset pages
+    assert [cluster["cluster_id"] for cluster in index.clusters(None, limit=2, after="None-1")] == ["a-1", "b-1"]
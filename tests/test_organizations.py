@@ -0,0 +1,23 @@
+def test_list_renders_like_the_detail_endpoint(client, store):
+    # As PostgREST returns timestamptz values
+    store.insert("organizations", {"id": "org-1", "name": "Acme", "created_at": "2026-01-01 10:00:00.5+00:00"})
+    listed = client.get("/api/v1/organizations/").json()
+    assert listed == [client.get("/api/v1/organizations/org-1").json()]
+    assert listed[0]["created_at"] == "2026-01-01T10:00:00.500000Z"
+
+
+def test_list_projection(client):
+    client.post("/api/v1/organizations/", json={"name": "Acme"})
+    listed = client.get("/api/v1/organizations/", params={"fields": "name,created_at"}).json()
+    assert listed[0]["name"] == "Acme" and set(listed[0]) == {"name", "created_at"}
+    assert client.get("/api/v1/organizations/", params={"fields": "secret"}).status_code == 400
+
+
+def test_list_is_cached_with_etags_and_invalidated_by_writes(client):
+    client.post("/api/v1/organizations/", json={"name": "Acme"})
+    first = client.get("/api/v1/organizations/")
+    etag = first.headers["ETag"]
+    assert client.get("/api/v1/organizations/", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/v1/organizations/", json={"name": "Globex"})
+    second = client.get("/api/v1/organizations/", headers={"If-None-Match": etag})
+    assert second.status_code == 200 and len(second.json()) == 2
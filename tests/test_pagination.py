@@ -0,0 +1,112 @@
+import json
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.data_access import AsyncStore
+from app.models.schemas import FileUploadResponse
+from app.pagination import KeysetQuery, decode_cursor, encode_cursor, parse_fields
+
+
+def test_cursor_round_trip():
+    values = ["2026-01-01T00:00:00", "id-1", 3, None]
+    assert decode_cursor(encode_cursor(values)) == values
+    assert "=" not in encode_cursor(values)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1])[:-2] + "@@", "eyJhIjogMX0"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_parse_fields_defaults_to_the_model_fields():
+    assert parse_fields(None, ["id", "name"]) == ["id", "name"]
+    assert parse_fields(" name ,id", ["id", "name"]) == ["name", "id"]
+    with pytest.raises(HTTPException):
+        parse_fields("id,password", ["id", "name"])
+
+
+def _uploads(store, count):
+    # Pairs of rows share a timestamp, so the id has to break ties
+    store.insert("file_uploads", [
+        {"id": f"file-{i:03d}", "filename": f"f{i}.txt", "status": "processed", "file_size": 10,
+         "content_type": "text/plain",
+         "upload_timestamp": f"2026-01-01T00:00:{i // 2:02d}", "upload_path": "uploads/secret"}
+        for i in range(count)
+    ])
+
+
+def _pages(query, limit):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = asyncio.run(query.page(limit, cursor))
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 25])
+def test_pages_cover_every_row_once_in_order(store, limit):
+    _uploads(store, 25)
+    query = KeysetQuery(AsyncStore(store), "file_uploads", FileUploadResponse, order=[("upload_timestamp", True), ("id", True)],
+                        fields=["id"])
+    rows, pages = _pages(query, limit)
+    assert [row["id"] for row in rows] == [f"file-{i:03d}" for i in reversed(range(25))]
+    assert pages == -(-25 // limit)
+
+
+def test_projection_keeps_only_the_requested_fields(store):
+    _uploads(store, 3)
+    query = KeysetQuery(AsyncStore(store), "file_uploads", FileUploadResponse, order=[("upload_timestamp", True), ("id", True)],
+                        fields=["filename"])
+    rows, cursor = asyncio.run(query.page(2))
+    assert rows == [{"filename": "f2.txt"}, {"filename": "f1.txt"}]
+    # The cursor still carries the ordering columns
+    assert decode_cursor(cursor) == ["2026-01-01T00:00:00", "file-001"]
+
+
+def test_cursor_of_another_ordering_is_rejected(store):
+    query = KeysetQuery(AsyncStore(store), "file_uploads", FileUploadResponse, order=[("upload_timestamp", True), ("id", True)])
+    with pytest.raises(HTTPException):
+        asyncio.run(query.page(10, encode_cursor(["only-one"])))
+
+
+def test_list_endpoint_pages_and_hides_unexposed_columns(client, store):
+    _uploads(store, 5)
+    response = client.get("/api/v1/uploads/", params={"limit": 2})
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first) == 2
+    assert "upload_path" not in first[0] and "file_type" not in first[0]
+    cursor = response.headers["X-Next-Cursor"]
+    second = client.get("/api/v1/uploads/", params={"limit": 2, "cursor": cursor}).json()
+    assert {row["id"] for row in first}.isdisjoint(row["id"] for row in second)
+
+
+def test_list_endpoint_streams_ndjson(client, store):
+    _uploads(store, 5)
+    response = client.get("/api/v1/uploads/", params={"format": "ndjson", "fields": "id"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 5 and set(rows[0]) == {"id"}
+    assert client.get("/api/v1/uploads/", params={"format": "xml"}).status_code == 400
+    assert client.get("/api/v1/uploads/", params={"fields": "upload_path"}).status_code == 400
+
+
+def test_list_endpoints_render_through_their_models(client, store):
+    # As PostgREST returns them: timestamps with a space and an offset
+    store.insert("file_uploads", {"id": "f1", "filename": "a.txt", "status": "processed", "file_size": 10,
+                                  "content_type": "text/plain", "upload_timestamp": "2026-01-01 10:00:00.5+00:00"})
+    store.insert("reports", {"id": "r1", "title": "t", "organization_id": "org",
+                             "created_at": "2026-01-01 10:00:00.5+00:00"})
+    for path, column in [("/api/v1/uploads/", "upload_timestamp"), ("/api/v1/reports", "created_at")]:
+        page = client.get(path).json()
+        streamed = [json.loads(line) for line in client.get(path, params={"format": "ndjson"}).text.splitlines()]
+        assert page == streamed
+        assert page[0][column] == "2026-01-01T10:00:00.500000Z"
+    assert client.get("/api/v1/uploads/").json()[0]["file_size"] == 10
+    assert client.get("/api/v1/reports", params={"fields": "id,status"}).json() == [{"id": "r1", "status": "draft"}]
@@ -0,0 +1,52 @@
+import pytest
+
+from app.services import reanalysis
+from app.services.keyword_index import KeywordIndex
+from app.services.related_index import RelatedIndex
+from app.services.search_index import SearchIndex
+
+
+@pytest.fixture
+def indexes(tmp_path, monkeypatch):
+    keyword_index = KeywordIndex(str(tmp_path / "keywords.db"))
+    search_index = SearchIndex(str(tmp_path / "search.db"))
+    related_index = RelatedIndex(str(tmp_path / "related"))
+    monkeypatch.setattr(reanalysis, "get_keyword_index", lambda: keyword_index)
+    monkeypatch.setattr(reanalysis, "get_search_index", lambda: search_index)
+    monkeypatch.setattr(reanalysis, "get_related_index", lambda: related_index)
+    return keyword_index, search_index, related_index
+
+
+ROWS = [{"file_id": "f1", "extracted_text": "merger talks between two banks"},
+        {"file_id": "f2", "extracted_text": "quarterly growth figures"}]
+UPLOADS = {"f1": {"organization_id": "org", "filename": "a.pdf", "upload_timestamp": "2026-02-10T00:00:00"},
+           "f2": {"organization_id": "org", "filename": "b.pdf", "upload_timestamp": "2026-02-11T00:00:00"}}
+RESULTS = [{"summary": "Banks", "keywords": ["Merger"]}, {"error": "rate limited"}]
+
+
+def test_store_analyses_saves_successes(store, indexes):
+    keyword_index, search_index, related_index = indexes
+    assert reanalysis._store_analyses(store, ROWS, RESULTS, UPLOADS, "v2", "model") == ["f2"]
+    assert [(row["file_id"], row["prompt_version"]) for row in store.select("ai_analysis_results")] == [("f1", "v2")]
+    assert {row["keyword"] for row in keyword_index.top("org", "2026-Q1")} == {"merger"}
+    assert [hit["file_id"] for hit in search_index.search("banks")] == ["f1"]
+    assert len(related_index) == 1
+
+
+def test_indexes_are_updated_before_the_analysis_is_saved(store, indexes, monkeypatch):
+    keyword_index, search_index, _ = indexes
+    insert = store.insert
+
+    def failing_insert(table, rows):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(store, "insert", failing_insert)
+    with pytest.raises(RuntimeError):
+        reanalysis._store_analyses(store, ROWS, RESULTS, UPLOADS, "v2", "model")
+    # The file keeps no current analysis, so the next run redoes both
+    assert {row["keyword"] for row in keyword_index.top("org", "2026-Q1")} == {"merger"}
+    monkeypatch.setattr(store, "insert", insert)
+    reanalysis._store_analyses(store, ROWS, RESULTS, UPLOADS, "v2", "model")
+    assert keyword_index.top("org", "2026-Q1")[0]["count"] == 1
+    assert [hit["file_id"] for hit in search_index.search("banks")] == ["f1"]
+    assert len(store.select("ai_analysis_results")) == 1
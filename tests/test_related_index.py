@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.related_index import RelatedIndex, term_weights
+
+OIL = "crude oil prices refinery output barrels pipeline drilling opec supply"
+CHIPS = "semiconductor wafer fabrication lithography chips foundry yield transistor"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RelatedIndex(str(tmp_path / "related.db"), dimensions=256)
+
+
+def ids(related):
+    return [match["file_id"] for match in related]
+
+
+def test_term_weights():
+    weights = term_weights("The oil, the OIL and q3 2023 oil", ["Crude  Oil"])
+    assert set(weights) == {"oil", "q3", "kw:crude oil"}
+    assert weights["oil"] > weights["q3"] == 1.0
+    assert weights["kw:crude oil"] == settings.RELATED_KEYWORD_WEIGHT
+
+
+def test_related_ranks_by_similarity_within_the_organization(index):
+    index.add("oil-1", "org", "a.pdf", OIL + " exports")
+    index.add("oil-2", "org", "b.pdf", OIL + " imports", ["oil"])
+    index.add("chips-1", "org", "c.pdf", CHIPS)
+    index.add("oil-other", "other", "d.pdf", OIL + " exports")
+    related = index.related("oil-1")
+    assert ids(related) == ["oil-2"]
+    assert related[0]["filename"] == "b.pdf" and 0 < related[0]["score"] <= 1
+    assert index.related("unknown") is None
+    assert len(index) == 4
+
+
+def test_related_leaves_out_unrelated_documents(index, monkeypatch):
+    index.add("oil-1", "org", None, OIL)
+    index.add("chips-1", "org", None, CHIPS)
+    assert index.related("oil-1") == []
+    index.add("oil-2", "org", None, OIL + " tanker")
+    monkeypatch.setattr(settings, "RELATED_MIN_SCORE", 0.99)
+    assert index.related("oil-1") == []
+
+
+def test_add_again_replaces_and_remove_hides(index):
+    index.add("a", "org", None, OIL)
+    index.add("b", "org", None, OIL + " shipping")
+    index.add("b", "org", None, CHIPS)
+    assert index.related("a") == []
+    assert ids(index.related("b")) == []
+    index.add("c", "org", None, OIL + " tanker")
+    assert ids(index.related("a")) == ["c"]
+    index.remove("c")
+    assert index.related("c") is None
+    assert index.related("a") == []
+    assert len(index) == 2
+
+
+def test_other_instances_see_changes(index, tmp_path):
+    reader = RelatedIndex(str(tmp_path / "related.db"))
+    index.add("a", "org", None, OIL)
+    assert reader.related("a") == []
+    index.add("b", "org", None, OIL + " tanker")
+    assert ids(reader.related("a")) == ["b"]
+    index.remove("b")
+    assert reader.related("a") == []
+
+
+def test_reset_empties_the_index(index):
+    index.add("a", "org", None, OIL)
+    index.reset()
+    assert len(index) == 0 and index.related("a") is None
+    index.add("b", "org", None, OIL)
+    assert index.related("b") == []
+
+
+@pytest.mark.parametrize("organizations", [1, 4])
+def test_top_k_agrees_with_brute_force(index, monkeypatch, organizations):
+    # Small blocks, so that both the gathered and the blockwise paths span several
+    monkeypatch.setattr("app.services.related_index.BLOCK_ROWS", 7)
+    rng = np.random.default_rng(0)
+    words = [f"term{i}" for i in range(300)]
+    for i in range(60):
+        index.add(f"f{i}", f"org{i % organizations}", None, " ".join(rng.choice(words, 40)))
+    index.remove("f3")
+    assert len(index) == 59  # and loads the rows
+    matrix = np.array(index._matrix)
+    live = np.array([not deleted for deleted in index._deleted])
+    query = matrix[index._row_of["f0"]]
+    for organization_id in [None, "org0"]:
+        valid = live.copy()
+        if organization_id is not None:
+            valid &= np.array([index._organization_names[code] == organization_id
+                               for code in index._organization_codes])
+        scores = np.where(valid, matrix @ query, -np.inf)
+        expected = [row for row in np.argsort(-scores, kind="stable")[:5] if np.isfinite(scores[row])]
+        assert [row for row, _ in index.top_k(query, 5, organization_id)[0]] == expected
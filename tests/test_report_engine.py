@@ -0,0 +1,134 @@
+import pytest
+
+from app.services.report_engine import generate_report, reset_aggregates
+from app.services.text_store import store_text
+
+
+def _add_files(store, organization_id, count, keywords, start=0):
+    file_ids = [f"{organization_id}-{start + i}" for i in range(count)]
+    store.insert("file_uploads", [
+        {"id": file_id, "filename": f"{file_id}.pdf", "status": "processed", "organization_id": organization_id,
+         "content_hash": file_id, "upload_timestamp": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+        for i, file_id in enumerate(file_ids, start)
+    ])
+    store.insert("ai_analysis_results", [
+        {"id": f"analysis-{file_id}", "file_id": file_id, "summary": f"about {file_id}", "keywords": keywords,
+         "created_at": "2026-01-02T00:00:00"}
+        for file_id in file_ids
+    ])
+    for i, file_id in enumerate(file_ids):
+        if i % 2:
+            store_text(store, file_id, "word " * 10)
+        else:
+            store.insert("report_content", {"file_id": file_id, "extracted_text": "word " * 10})
+    return file_ids
+
+
+def _report(store, organization_id="org"):
+    return store.insert("reports", {"title": "t", "organization_id": organization_id, "status": "draft"})[0]["id"]
+
+
+def _rebuilt(store, report_id):
+    # The same report generated from scratch
+    store.update("reports", {"content": None}, [("id", "eq", report_id)])
+    return generate_report(store, report_id)["content"]
+
+
+def test_first_run_aggregates_every_processed_file(store):
+    _add_files(store, "org", 5, ["Growth", " growth", "Risk"])
+    _add_files(store, "other", 3, ["Other"])
+    store.insert("file_uploads", {"id": "pending", "organization_id": "org", "status": "pending"})
+    content = generate_report(store, _report(store))["content"]
+    assert (content["file_count"], content["total_words"], content["total_characters"]) == (5, 50, 250)
+    assert content["top_keywords"] == [{"keyword": "growth", "count": 5}, {"keyword": "risk", "count": 5}]
+    assert content["last_run"]["files_aggregated"] == 5
+    assert content["recent_files"][0] == {"file_id": "org-4", "filename": "org-4.pdf",
+                                          "uploaded_at": "2026-01-01T00:00:04", "summary": "about org-4",
+                                          "keywords": ["growth", "risk"]}
+    assert "incomplete" not in content
+
+
+def test_incremental_run_matches_a_full_rebuild(store):
+    file_ids = _add_files(store, "org", 6, ["Growth"])
+    report_id = _report(store)
+    generate_report(store, report_id)
+    # A new file, a re-analysed one, a failed one and a deleted one
+    _add_files(store, "org", 2, ["AI"], start=6)
+    store.insert("ai_analysis_results", {"id": "analysis-new", "file_id": file_ids[0], "summary": "s",
+                                         "keywords": ["Merger"], "created_at": "2026-02-01T00:00:00"})
+    store.update("file_uploads", {"status": "error"}, [("id", "eq", file_ids[1])])
+    store.delete("file_uploads", [("id", "eq", file_ids[2])])
+    content = generate_report(store, report_id)["content"]
+    assert content["last_run"] == {**content["last_run"], "files_aggregated": 3, "files_removed": 2}
+    assert content["totals"] == _rebuilt(store, report_id)["totals"]
+    assert content["file_count"] == 6
+    assert {row["keyword"]: row["count"] for row in content["top_keywords"]} == {"growth": 3, "ai": 2, "merger": 1}
+    # Nothing changed: nothing is aggregated again
+    assert generate_report(store, report_id)["content"]["last_run"]["files_aggregated"] == 0
+
+
+def test_retry_after_an_interrupted_run_rebuilds_the_totals(store, monkeypatch):
+    _add_files(store, "org", 4, ["Growth"])
+    report_id = _report(store)
+    generate_report(store, report_id)
+    _add_files(store, "org", 3, ["AI"], start=4)
+    update = store.update
+
+    def fail_when_ready(table, values, filters):
+        if table == "reports" and values.get("status") == "ready":
+            raise RuntimeError("connection lost")
+        return update(table, values, filters)
+
+    # The new aggregates are stored, the new totals are not
+    monkeypatch.setattr(store, "update", fail_when_ready)
+    with pytest.raises(RuntimeError):
+        generate_report(store, report_id)
+    monkeypatch.setattr(store, "update", update)
+    assert store.select("reports", filters=[("id", "eq", report_id)])[0]["content"]["incomplete"] is True
+
+    content = generate_report(store, report_id)["content"]
+    assert content["file_count"] == 7
+    assert content["totals"] == _rebuilt(store, report_id)["totals"]
+    assert "incomplete" not in content
+
+
+def test_reset_aggregates_starts_over(store):
+    _add_files(store, "org", 2, ["Growth"])
+    _add_files(store, "other", 3, ["Other"])
+    report_id = _report(store)
+    generate_report(store, report_id)
+    store.update("reports", {"organization_id": "other"}, [("id", "eq", report_id)])
+    reset_aggregates(store, report_id)
+    content = generate_report(store, report_id)["content"]
+    assert content["file_count"] == 3
+    assert content["top_keywords"] == [{"keyword": "other", "count": 3}]
+
+
+def test_generate_endpoint(client, store):
+    report_id = _report(store)
+    response = client.post(f"/api/v1/reports/{report_id}/generate")
+    assert response.status_code == 202 and response.json()["status"] == "generating"
+    assert client.post("/api/v1/reports/missing/generate").status_code == 404
+
+
+def test_every_analysis_is_read_past_the_row_cap(store, monkeypatch):
+    from app.services import report_engine
+    file_ids = _add_files(store, "org", 3, ["Old"])
+    # Two newer analyses per file, the newest with other keywords
+    for version, keywords in [(2, ["Older"]), (3, ["Newest"])]:
+        store.insert("ai_analysis_results", [
+            {"id": f"analysis-{file_id}-{version}", "file_id": file_id, "summary": "s", "keywords": keywords,
+             "created_at": f"2026-01-0{version}T00:00:00"}
+            for file_id in file_ids
+        ])
+    select = store.select
+
+    def capped_select(table, **kwargs):
+        # Like PostgREST's max-rows: never more than 4 rows per request
+        rows = select(table, **kwargs)
+        return rows[:4]
+
+    monkeypatch.setattr(report_engine, "BATCH_SIZE", 4)
+    monkeypatch.setattr(store, "select", capped_select)
+    content = generate_report(store, _report(store))["content"]
+    assert content["top_keywords"] == [{"keyword": "newest", "count": 3}]
@@ -0,0 +1,78 @@
+import pytest
+
+from app.services.search_index import InvalidQuery, SearchIndex, build_match_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    index.index_document("f1", "The merger was approved. Revenue grew in Q3-2024 and we don't expect losses.",
+                         organization_id="org", filename="merger-review.pdf", uploaded_at="2026-01-10T00:00:00",
+                         keywords=["Acquisitions"])
+    index.index_document("f2", "Quarterly revenue figures. " * 5 + "A merger is mentioned once.",
+                         organization_id="org", filename="figures.xlsx", uploaded_at="2026-02-10T00:00:00")
+    index.index_document("f3", "Another merger, another organization.",
+                         organization_id="other", filename="other.docx", uploaded_at="2026-01-20T00:00:00")
+    return index
+
+
+def ids(results):
+    return [result["file_id"] for result in results]
+
+
+def test_build_match_query():
+    assert build_match_query('merger "revenue grew" acqui*') == '"merger" AND "revenue grew" AND "acqui"*'
+    assert build_match_query("don't Q3-2024 (loss)") == '"don t" AND "Q3 2024" AND "loss"'
+    with pytest.raises(InvalidQuery):
+        build_match_query("-- ?")
+
+
+def test_bm25_ranks_filename_and_keyword_hits_first(index):
+    assert ids(index.search("merger")) == ["f1", "f3", "f2"]
+    assert ids(index.search("revenue")) == ["f2", "f1"]
+    results = index.search("merger")
+    assert results[0]["score"] > results[1]["score"] > 0
+
+
+def test_filters(index):
+    assert ids(index.search("merger", organization_id="org")) == ["f1", "f2"]
+    assert ids(index.search("merger", uploaded_after="2026-01-15")) == ["f3", "f2"]
+    assert ids(index.search("merger", uploaded_before="2026-01-20T00:00:00")) == ["f1"]
+    assert ids(index.search("merger", keyword="acquisition")) == ["f1"]
+    assert ids(index.search("merger", limit=1, offset=1)) == ["f3"]
+
+
+def test_prefix_and_stemming(index):
+    assert ids(index.search("quart*")) == ["f2"]
+    assert ids(index.search("approve")) == ["f1"]
+    assert index.search("quart") == []
+
+
+def test_punctuation_in_queries(index):
+    assert ids(index.search("don't")) == ["f1"]
+    assert ids(index.search("Q3-2024")) == ["f1"]
+    assert ids(index.search("Q3-20*")) == ["f1"]
+    assert ids(index.search('"revenue grew"')) == ["f1"]
+    assert index.search("2024-Q3") == []
+
+
+def test_snippet_and_highlight(index):
+    result = index.search("merger", organization_id="org")[0]
+    assert "<mark>merger</mark>" in result["snippet"]
+    assert result["filename_highlight"] == "<mark>merger</mark>-review.pdf"
+    assert result["keywords"] == ["Acquisitions"]
+
+
+def test_replace_and_remove(index):
+    index.index_document("f1", "Nothing relevant.", organization_id="org")
+    assert ids(index.search("merger")) == ["f3", "f2"]
+    index.remove_document("f2")
+    assert ids(index.search("merger")) == ["f3"] and index.count() == 2
+
+
+def test_search_endpoint(client, index, monkeypatch):
+    from app.routers import search
+    monkeypatch.setattr(search, "get_search_index", lambda: index)
+    response = client.get("/api/v1/search/", params={"q": "Q3-2024", "organization_id": "org"})
+    assert response.status_code == 200 and ids(response.json()) == ["f1"]
+    assert client.get("/api/v1/search/", params={"q": "!!"}).status_code == 400
@@ -0,0 +1,88 @@
+import pytest
+
+from app.config import settings
+from app.services import text_store
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Small chunks, so that short texts span several of them
+    monkeypatch.setattr(settings, "TEXT_CHUNK_CHARS", 10)
+
+
+TEXT = "".join(f"{i:02d}-abcdef\n" for i in range(20))  # 200 characters, 20 chunks
+
+
+def test_store_text_writes_chunks_and_metadata(store):
+    row = text_store.store_text(store, "file-1", TEXT)
+    assert row["extracted_text"] is None
+    assert (row["text_length"], row["word_count"], row["chunk_chars"]) == (200, 20, 10)
+    chunks = store.select("report_content_chunks", filters=[("file_id", "eq", "file-1")])
+    assert len(chunks) == 20
+
+
+@pytest.mark.parametrize("start,end", [(0, 200), (0, 10), (9, 11), (10, 20), (15, 95), (199, 200), (195, 500),
+                                       (50, 50), (60, 40), (250, 300)])
+def test_read_range_across_chunk_boundaries(store, start, end):
+    text_store.store_text(store, "file-1", TEXT)
+    content = text_store.get_content(store, "file-1")
+    assert text_store.read_range(store, content, start, end) == TEXT[start:end]
+
+
+def test_read_range_of_inline_text(store):
+    store.insert("report_content", {"file_id": "legacy", "extracted_text": TEXT})
+    content = text_store.get_content(store, "legacy")
+    assert text_store.text_length(content) == 200
+    assert text_store.read_range(store, content, 15, 95) == TEXT[15:95]
+
+
+def test_page_range(store):
+    pages = ["first page", "second", "third page text"]
+    text = "\n\n".join(pages)
+    offsets = [0, 12, 20]
+    text_store.store_text(store, "file-1", text, text_store.page_spans(pages, offsets))
+    content = text_store.get_content(store, "file-1")
+    start, end = text_store.page_range(content, 2, 3)
+    assert text_store.read_range(store, content, start, end) == "second\n\nthird page text"
+    start, end = text_store.page_range(content, 1, 1)
+    assert text_store.read_range(store, content, start, end) == "first page"
+    for first, last in [(0, 1), (2, 1), (1, 4)]:
+        with pytest.raises(ValueError):
+            text_store.page_range(content, first, last)
+
+
+def test_page_range_without_stored_pages(store):
+    text_store.store_text(store, "file-1", TEXT)
+    with pytest.raises(ValueError):
+        text_store.page_range(text_store.get_content(store, "file-1"), 1, 1)
+
+
+def test_load_texts_mixes_chunked_and_inline_rows(store, monkeypatch):
+    monkeypatch.setattr(text_store, "CHUNK_BATCH_SIZE", 7)
+    text_store.store_text(store, "file-1", TEXT)
+    text_store.store_text(store, "file-2", TEXT[::-1])
+    store.insert("report_content", {"file_id": "legacy", "extracted_text": "inline"})
+    contents = store.select("report_content", columns="file_id,extracted_text,compression")
+    texts = {row["file_id"]: row["extracted_text"] for row in text_store.load_texts(store, contents)}
+    assert texts == {"file-1": TEXT, "file-2": TEXT[::-1], "legacy": "inline"}
+
+
+def test_migrate_is_idempotent(store):
+    store.insert("report_content", [{"file_id": f"legacy-{i}", "extracted_text": TEXT} for i in range(3)])
+    assert text_store.migrate(store, batch_size=2)["converted"] == 3
+    assert text_store.migrate(store, batch_size=2)["converted"] == 0
+    content = text_store.get_content(store, "legacy-1")
+    assert content["extracted_text"] is None
+    assert text_store.read_range(store, content, 0, 200) == TEXT
+
+
+def test_text_endpoint(client, store):
+    pages = ["first page", "second"]
+    text_store.store_text(store, "file-1", "first page\n\nsecond", text_store.page_spans(pages, [0, 12]))
+    body = client.get("/api/v1/uploads/file-1/text", params={"start": 6, "end": 14}).json()
+    assert (body["text"], body["start"], body["end"], body["text_length"], body["page_count"]) == \
+        ("page\n\nse", 6, 14, 18, 2)
+    assert client.get("/api/v1/uploads/file-1/text", params={"first_page": 2}).json()["text"] == "second"
+    assert client.get("/api/v1/uploads/file-1/text", params={"first_page": 3}).status_code == 400
+    assert client.get("/api/v1/uploads/file-1/text", params={"last_page": 2}).status_code == 400
+    assert client.get("/api/v1/uploads/missing/text").status_code == 404